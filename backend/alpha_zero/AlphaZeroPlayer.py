@@ -6,6 +6,8 @@ Alpha Zero AIプレイヤー
 
 import sys
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 
 # パス設定
@@ -28,7 +30,7 @@ class AlphaZeroPlayer:
     学習済みモデルを使って手を選択
     """
     
-    def __init__(self, model_path=None, num_mcts_sims=50, board_size=9):
+    def __init__(self, model_path=None, num_mcts_sims=50, board_size=9, mcts_batch_size=8):
         """
         初期化
         
@@ -36,10 +38,17 @@ class AlphaZeroPlayer:
             model_path: 学習済みモデルのパス（Noneの場合は自動検索/ダウンロード）
             num_mcts_sims: MCTSシミュレーション回数（多いほど強いが遅い）
             board_size: 盤面サイズ
+            mcts_batch_size: MCTSの葉をまとめてニューラルネットで評価する数
+                （GPUでは大きいほど速いが、同時に探索する分だけ探索の質はわずかに落ちる）
         """
         self.board_size = board_size
         self.num_mcts_sims = num_mcts_sims
         
+        # モデルの検索・ダウンロードは別スレッドで先に始め、ネットワークの作成（CUDAの初期化）と重ねる
+        loader = ThreadPoolExecutor(max_workers=1)
+        model_future = loader.submit(ModelLoader.load_model_path, model_path)
+        loader.shutdown(wait=False)
+        
         # ゲームラッパーの作成
         self.game_wrapper = GameWrapper(board_size=board_size)
         
@@ -53,15 +62,22 @@ class AlphaZeroPlayer:
             'num_channels': 96,         # 学習時の設定に合わせる（64→96）
             'num_res_blocks': 6,        # 学習時の設定に合わせる（4→6）
             'cuda': True,  # GPUを使用
+            'fp16_inference': True,  # 対戦では推論のみなのでFP16で計算する
+            'channels_last': True,  # FP16の畳み込みはNHWCの配置の方が速い
             'checkpoint': './alpha_zero/models/',
         })
         
+        # 環境変数 ALPHAZERO_INT8=1 なら、INT8に量子化したモデルでCPU推論する
+        use_int8 = os.getenv('ALPHAZERO_INT8') == '1'
+        if use_int8:
+            args.cuda = False
+        
         # ニューラルネットの作成とモデル読み込み
         self.nnet = NNet(self.game_wrapper, args)
         
         try:
-            # モデルローダーを使ってパスを取得（自動ダウンロード対応）
-            resolved_path = ModelLoader.load_model_path(model_path)
+            # モデルローダーでパスを取得（自動ダウンロード対応、ダウンロード中なら終わるまで待つ）
+            resolved_path = model_future.result()
             
             # 絶対パスに変換
             if not os.path.isabs(resolved_path):
@@ -70,7 +86,10 @@ class AlphaZeroPlayer:
             folder = os.path.dirname(resolved_path)
             filename = os.path.basename(resolved_path)
             
-            self.nnet.load_checkpoint(folder=folder, filename=filename)
+            if use_int8:
+                self.nnet.load_int8_checkpoint(folder=folder, filename=filename)
+            else:
+                self.nnet.load_checkpoint(folder=folder, filename=filename, inference=True)
             print(f"[OK] Alpha Zeroモデル読み込み成功: {resolved_path}")
         except Exception as e:
             print(f"[WARNING] モデル読み込み失敗: {e}")
@@ -81,12 +100,17 @@ class AlphaZeroPlayer:
             'numMCTSSims': num_mcts_sims,
             'cpuct': 1.0,
             'max_depth': 30,
+            'mcts_batch_size': mcts_batch_size,
         })
         
+        # 推論入力のバッファを先に確保しておく（手を選ぶたびにテンソルを作らない）
+        self.nnet.prealloc_eval_buffer(mcts_batch_size)
+        
         self.mcts = DepthLimitedMCTS(self.game_wrapper, self.nnet, mcts_args)
         
         print(f"[OK] Alpha Zero AIプレイヤー作成完了")
         print(f"   MCTSシミュレーション回数: {num_mcts_sims}")
+        print(f"   MCTSバッチサイズ: {mcts_batch_size}")
         print(f"   盤面サイズ: {board_size}x{board_size}")
     
     def get_move(self, game: WataruToGame) -> Move:
@@ -114,6 +138,8 @@ class AlphaZeroPlayer:
         
         # アクションをMoveオブジェクトに変換
         move = self.game_wrapper._action_to_move(action, game)
+        if move is not None:
+            move.timestamp = time.time()
         
         # デバッグ情報
         stats = self.mcts.get_stats()
@@ -5,22 +5,171 @@ alpha-zero-generalのCoachを拡張して、DepthLimitedMCTSを使用
 """
 
 import os
-import sys
 import numpy as np
 import logging
-from collections import deque
-from random import shuffle
-from pickle import Pickler, Unpickler
+import multiprocessing
+import pickle
+
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
 
 # alpha-zero-generalをパスに追加
-sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'alpha-zero-general'))
+import alpha_zero._paths
 
 from Coach import Coach
-from DepthLimitedMCTS import DepthLimitedMCTS
+from alpha_zero.DepthLimitedMCTS import DepthLimitedMCTS
 
 log = logging.getLogger(__name__)
 
 
+def play_episode(game, mcts, args):
+    """
+    1エピソードの自己対戦を実行
+    
+    Coachの外（自己対戦のワーカープロセス）からも呼べるように関数にしている
+    
+    Args:
+        game: ゲームオブジェクト
+        mcts: DepthLimitedMCTS（エピソードをまたいで使い回してよい）
+        args: ハイパーパラメータ
+    
+    Returns:
+        (X, Pi, V): 学習用データの配列
+            X: 盤面テンソル (N, 6, size, size)
+            Pi: 方策 (N, action_size)
+            V: 価値 (N,)
+    """
+    boards = []
+    pis = []
+    players = []
+    board = game.getInitBoard()
+    curPlayer = 1
+    episodeStep = 0
+    
+    # エピソード開始時に統計をリセット
+    mcts.reset_stats()
+
+    while True:
+        episodeStep += 1
+        canonicalBoard = game.getCanonicalForm(board, curPlayer)
+        temp = int(episodeStep < args.tempThreshold)
+
+        pi = mcts.getActionProb(canonicalBoard, temp=temp)
+        
+        # デバッグ: piのサイズチェック（最初の手のみ）
+        if episodeStep == 1:
+            print(f"   デバッグ: pi shape = {len(pi)}, 期待値 = {game.getActionSize()}")
+        
+        sym = game.getSymmetries(canonicalBoard, pi)
+        for b, p in sym:
+            boards.append(b)
+            pis.append(p)
+            players.append(curPlayer)
+
+        action = np.random.choice(len(pi), p=pi)
+        board, curPlayer = game.getNextState(board, curPlayer, action)
+
+        r = game.getGameEnded(board, curPlayer)
+
+        if r != 0:
+            # エピソード終了
+            # 統計情報を表示
+            stats = mcts.get_stats()
+            print(f"   エピソード終了: {episodeStep}手")
+            print(f"   最大探索深さ: {stats['max_depth_reached']}")
+            print(f"   深さ制限到達回数: {stats['depth_limit_hits']}")
+            print(f"   探索状態数: {stats['total_states']}")
+            
+            # 手番のプレイヤーから見た結果（同じプレイヤーなら r、相手なら -r）
+            vs = np.where(np.array(players) == curPlayer, r, -r)
+            return _episode_arrays(boards, pis, vs)
+        
+        # 安全のため、最大手数制限
+        if episodeStep > 200:
+            print(f"   ⚠️ 最大手数到達（200手）、引き分けとして終了")
+            return _episode_arrays(boards, pis, np.zeros(len(boards)))
+
+
+def _episode_arrays(boards, pis, vs):
+    """
+    1エピソード分の学習データを (X, Pi, V) のfloat32配列にまとめる
+    
+    Args:
+        boards: 盤面テンソルのリスト
+        pis: 方策のリスト
+        vs: 価値の配列
+    
+    Returns:
+        (X, Pi, V): 学習用データの配列
+    """
+    return (np.stack(boards).astype(np.float32, copy=False),
+            np.asarray(pis, dtype=np.float32),
+            np.asarray(vs, dtype=np.float32))
+
+
+# 自己対戦ワーカープロセスの状態（プロセスごとに _init_selfplay_worker() で作る）
+_worker = {}
+
+
+def _distributed():
+    """
+    torchrunで起動した複数プロセスの学習中ならtorch.distributedを返す
+    
+    Returns:
+        プロセスグループが初期化済みならtorch.distributed、そうでなければNone
+    """
+    try:
+        import torch.distributed as dist
+    except ImportError:
+        return None
+    return dist if dist.is_available() and dist.is_initialized() else None
+
+
+def _init_selfplay_worker(game, nnet_class, nnet_args, state_dict, args, device=None):
+    """
+    自己対戦ワーカーの初期化（Poolのinitializer）
+    
+    親プロセスの最新の重みでネットワークを作り、木はワーカー内のエピソード間で使い回す
+    
+    Args:
+        game: ゲームオブジェクト
+        nnet_class: ニューラルネットワークのラッパークラス
+        nnet_args: ラッパーのハイパーパラメータ
+        state_dict: ネットワークの重み（CPU上のテンソル）
+        args: Coachのハイパーパラメータ
+        device: 親プロセスと同じGPUの番号（CPUならNone）
+    """
+    import torch
+    
+    # ワーカーごとに全コアを使うと取り合いになるので、1スレッドにする
+    torch.set_num_threads(1)
+    
+    # spawnしたプロセスは cuda:0 から始まるので、ネットワークを作る前に親と同じGPUを選ぶ
+    if device is not None:
+        torch.cuda.set_device(device)
+    
+    nnet = nnet_class(game, nnet_args)
+    nnet.nnet.load_state_dict(state_dict)
+    nnet.prealloc_eval_buffer(args.get('mcts_batch_size', 1))
+    if nnet_args.get('int8_inference'):
+        nnet.quantize_for_inference()  # このワーカーでは学習しないので、推論は量子化したモデルで行う
+    
+    _worker['game'] = game
+    _worker['args'] = args
+    _worker['mcts'] = DepthLimitedMCTS(game, nnet, args)
+
+
+def _run_episode(_):
+    """ワーカープロセスで1エピソードの自己対戦を実行（Poolのタスク）"""
+    mcts = _worker['mcts']
+    mcts.trim(_worker['args'].get('mcts_max_states', 500000))
+    mcts.reset_visits()  # 使い回すのはニューラルネットの評価結果だけ
+    return play_episode(_worker['game'], mcts, _worker['args'])
+
+
 class DepthLimitedCoach(Coach):
     """
     深さ制限付きMCTSを使用するCoachクラス
@@ -52,13 +201,11 @@ class DepthLimitedCoach(Coach):
         1エピソードの自己対戦を実行
         
         Returns:
-            trainExamples: 学習用データ [(board, pi, v), ...]
+            (X, Pi, V): 学習用データの配列
+                X: 盤面テンソル (N, 6, size, size)
+                Pi: 方策 (N, action_size)
+                V: 価値 (N,)
         """
-        trainExamples = []
-        board = self.game.getInitBoard()
-        self.curPlayer = 1
-        episodeStep = 0
-        
         # MCTSが正しい型か確認
         if not isinstance(self.mcts, DepthLimitedMCTS):
             print(f"⚠️ MCTSが置き換えられています: {type(self.mcts)}")
@@ -66,44 +213,75 @@ class DepthLimitedCoach(Coach):
             self.mcts = DepthLimitedMCTS(self.game, self.nnet, self.args)
             print(f"✅ DepthLimitedMCTSで再作成しました")
         
-        # エピソード開始時に統計をリセット
-        self.mcts.reset_stats()
-
-        while True:
-            episodeStep += 1
-            canonicalBoard = self.game.getCanonicalForm(board, self.curPlayer)
-            temp = int(episodeStep < self.args.tempThreshold)
-
-            pi = self.mcts.getActionProb(canonicalBoard, temp=temp)
-            
-            # デバッグ: piのサイズチェック（最初の手のみ）
-            if episodeStep == 1:
-                print(f"   デバッグ: pi shape = {len(pi)}, 期待値 = {self.game.getActionSize()}")
-            
-            sym = self.game.getSymmetries(canonicalBoard, pi)
-            for b, p in sym:
-                trainExamples.append([b, self.curPlayer, p, None])
-
-            action = np.random.choice(len(pi), p=pi)
-            board, self.curPlayer = self.game.getNextState(board, self.curPlayer, action)
-
-            r = self.game.getGameEnded(board, self.curPlayer)
-
-            if r != 0:
-                # エピソード終了
-                # 統計情報を表示
-                stats = self.mcts.get_stats()
-                print(f"   エピソード終了: {episodeStep}手")
-                print(f"   最大探索深さ: {stats['max_depth_reached']}")
-                print(f"   深さ制限到達回数: {stats['depth_limit_hits']}")
-                print(f"   探索状態数: {stats['total_states']}")
-                
-                return [(x[0], x[2], r * ((-1) ** (x[1] != self.curPlayer))) for x in trainExamples]
+        return play_episode(self.game, self.mcts, self.args)
+    
+    def _self_play(self, num_workers):
+        """
+        1イテレーション分（numEps回）の自己対戦を実行
+        
+        Args:
+            num_workers: 自己対戦を並列に行うプロセス数（1ならこのプロセスで順に行う）
+        
+        Returns:
+            エピソードごとの (X, Pi, V) のリスト
+        """
+        from tqdm import tqdm
+        
+        # 複数プロセスの学習では、numEps回の対戦をプロセスで分け合う
+        # （各プロセスは自分の対戦の学習例で学習するので、学習例もプロセスごとに分かれる）
+        num_eps = self.args.numEps
+        dist = _distributed()
+        if dist is not None:
+            num_eps = len(range(dist.get_rank(), num_eps, dist.get_world_size()))
+        
+        if num_workers <= 1:
+            # 木はイテレーション内のエピソード間で使い回す（同じ局面のニューラルネット評価を再利用）
+            # ネットワークが変わるイテレーションの始めだけ作り直す。訪問回数などの探索の統計は
+            # エピソードごとに0に戻し、方策の目標にはそのエピソードの探索の結果だけを使う
+            self.mcts = DepthLimitedMCTS(self.game, self.nnet, self.args)
+            if self.nnet.args.get('int8_inference'):
+                self.nnet.quantize_for_inference()  # 学習（train()）の前に捨てられる
+            max_states = self.args.get('mcts_max_states', 500000)
             
-            # 安全のため、最大手数制限
-            if episodeStep > 200:
-                print(f"   ⚠️ 最大手数到達（200手）、引き分けとして終了")
-                return [(x[0], x[2], 0) for x in trainExamples]
+            episodes = []
+            for _ in tqdm(range(num_eps), desc="Self Play"):
+                self.mcts.trim(max_states)  # 古い状態を捨ててメモリを抑える
+                self.mcts.reset_visits()
+                episodes.append(self.executeEpisode())
+            return episodes
+        
+        # 各ワーカーに最新の重みを渡す（ネットワークが変わるのでイテレーションごとに作り直す）
+        # CUDAのテンソルはそのまま渡せないので、CPUにコピーしてから渡す
+        state_dict = {k: v.cpu() for k, v in self.nnet.nnet.state_dict().items()}
+        device = None
+        if self.nnet.args.get('cuda'):
+            import torch
+            device = torch.cuda.current_device()
+        initargs = (self.game, self.nnet.__class__, self.nnet.args, state_dict, self.args, device)
+        
+        ctx = multiprocessing.get_context('spawn')
+        with ctx.Pool(num_workers, initializer=_init_selfplay_worker, initargs=initargs) as pool:
+            return list(tqdm(pool.imap_unordered(_run_episode, range(num_eps)),
+                             total=num_eps, desc=f"Self Play ({num_workers} workers)"))
+    
+    def _history_arrays(self, examples):
+        """
+        ヒストリーの1要素を (X, Pi, V) の配列にする
+        
+        以前の形式（(board, pi, v) のリストやdeque）で保存された学習例も変換する
+        
+        Args:
+            examples: (X, Pi, V) の配列の組、または [(board, pi, v), ...]
+        
+        Returns:
+            (X, Pi, V): 学習用データの配列
+        """
+        if isinstance(examples, tuple):
+            return examples
+        examples = list(examples)
+        return _episode_arrays([e[0] for e in examples],
+                               [e[1] for e in examples],
+                               [e[2] for e in examples])
     
     def learn(self):
         """
@@ -113,7 +291,8 @@ class DepthLimitedCoach(Coach):
         """
         from Arena import Arena
         from MCTS import MCTS
-        from tqdm import tqdm
+        
+        dist = _distributed()
         
         for i in range(1, self.args.numIters + 1):
             # イテレーション開始
@@ -124,11 +303,16 @@ class DepthLimitedCoach(Coach):
             
             # Self-play (自己対戦)
             if not self.skipFirstSelfPlay or i > 1:
-                iterationTrainExamples = deque([], maxlen=self.args.maxlenOfQueue)
+                episodes = self._self_play(self.args.get('numWorkers', 1))
+                
+                # エピソードごとの配列を1つにまとめる
+                X, Pi, V = (np.concatenate([episode[k] for episode in episodes]) for k in range(3))
                 
-                for _ in tqdm(range(self.args.numEps), desc="Self Play"):
-                    self.mcts = DepthLimitedMCTS(self.game, self.nnet, self.args)  # reset search tree
-                    iterationTrainExamples += self.executeEpisode()
+                # maxlenOfQueueを超えた分は古い方から捨てる（コピーして元の配列を解放）
+                maxlen = self.args.maxlenOfQueue
+                if len(V) > maxlen:
+                    X, Pi, V = X[-maxlen:].copy(), Pi[-maxlen:].copy(), V[-maxlen:].copy()
+                iterationTrainExamples = (X, Pi, V)
                 
                 # 学習データをヒストリーに追加
                 self.trainExamplesHistory.append(iterationTrainExamples)
@@ -138,14 +322,14 @@ class DepthLimitedCoach(Coach):
                     f"Removing the oldest entry in trainExamples. len(trainExamplesHistory) = {len(self.trainExamplesHistory)}")
                 self.trainExamplesHistory.pop(0)
             
-            # 学習例を保存
+            # 学習例を保存（複数プロセスの学習では、プロセスごとに自分の学習例を保存する）
             self.saveTrainExamples(i)
             
-            # 全ての学習データを使って訓練
-            trainExamples = []
-            for e in self.trainExamplesHistory:
-                trainExamples.extend(e)
-            shuffle(trainExamples)
+            # 全ての学習データを使って訓練（シャッフルはtrain()がエポックごとに添字で行う）
+            history = [self._history_arrays(e) for e in self.trainExamplesHistory]
+            trainExamples = tuple(
+                np.concatenate([e[k] for e in history]) for k in range(3)
+            )
             
             # temp.pth.tarに保存（評価前の旧モデル）
             self.nnet.save_checkpoint(folder=self.args.checkpoint, filename='temp.pth.tar')
@@ -164,7 +348,15 @@ class DepthLimitedCoach(Coach):
             
             arena = Arena(lambda x: np.argmax(pmcts.getActionProb(x, temp=0)),
                           lambda x: np.argmax(nmcts.getActionProb(x, temp=0)), self.game)
-            pwins, nwins, draws = arena.playGames(self.args.arenaCompare)
+            if dist is None:
+                pwins, nwins, draws = arena.playGames(self.args.arenaCompare)
+            else:
+                # 複数プロセスの学習では、対戦（先手・後手を入れ替えた2局ずつ）をプロセスで分け合い、
+                # 勝敗を合計する（全プロセスが同じ結果で採否を決める）
+                num_pairs = len(range(dist.get_rank(), self.args.arenaCompare // 2, dist.get_world_size()))
+                results = [None] * dist.get_world_size()
+                dist.all_gather_object(results, arena.playGames(num_pairs * 2))
+                pwins, nwins, draws = (sum(r[k] for r in results) for k in range(3))
             
             # 結果表示（目立つように）
             print(f"\n{'='*70}")
@@ -191,17 +383,71 @@ class DepthLimitedCoach(Coach):
                 self.nnet.save_checkpoint(folder=self.args.checkpoint, filename=self.getCheckpointFile(i))
                 self.nnet.save_checkpoint(folder=self.args.checkpoint, filename='best.pth.tar')
     
+    def _examples_suffix(self):
+        """
+        学習例のファイル名の末尾
+        
+        複数プロセスの学習では、学習例はプロセスごとに違うので、ランク1以降は
+        「.rank<番号>」を付けたファイルに分けて保存する（ランク0と1プロセスの学習は付けない）
+        """
+        dist = _distributed()
+        if dist is None or dist.get_rank() == 0:
+            return ""
+        return f".rank{dist.get_rank()}"
+    
     def getCheckpointFile(self, iteration):
         """チェックポイントファイル名を生成"""
         return 'checkpoint_' + str(iteration) + '.pth.tar'
     
     def saveTrainExamples(self, iteration):
-        """学習データを保存"""
+        """
+        学習データを保存
+        
+        最新のpickleプロトコル（NumPy配列を効率よく書ける）で保存する。
+        zstandardがインストールされていれば、zstdで圧縮して「.examples.zst」に保存する
+        """
         folder = self.args.checkpoint
         if not os.path.exists(folder):
             os.makedirs(folder)
-        filename = os.path.join(folder, self.getCheckpointFile(iteration) + ".examples")
-        with open(filename, "wb+") as f:
-            Pickler(f).dump(self.trainExamplesHistory)
-        f.closed
+        filename = os.path.join(folder, self.getCheckpointFile(iteration) + ".examples" + self._examples_suffix())
+        if ZSTD_AVAILABLE:
+            with open(filename + ".zst", "wb") as f, zstandard.ZstdCompressor(level=3).stream_writer(f) as zf:
+                pickle.dump(self.trainExamplesHistory, zf, protocol=pickle.HIGHEST_PROTOCOL)
+        else:
+            with open(filename, "wb") as f:
+                pickle.dump(self.trainExamplesHistory, f, protocol=pickle.HIGHEST_PROTOCOL)
+    
+    def loadTrainExamples(self):
+        """
+        学習データを読み込む
+        
+        zstdで圧縮した「.examples.zst」があればそれを読み、
+        なければ元のCoachと同じく「.examples」を読む。
+        複数プロセスの学習では、プロセスごとに自分の学習例のファイル（_examples_suffix()）を読む
+        """
+        suffix = self._examples_suffix()
+        examplesFile = os.path.join(self.args.load_folder_file[0], self.args.load_folder_file[1]) + ".examples" + suffix
+        if not os.path.isfile(examplesFile + ".zst"):
+            if not suffix:
+                return super().loadTrainExamples()
+            
+            # ランク1以降は、ランク0のファイルを読む元のCoachを使わずに読む
+            if not os.path.isfile(examplesFile):
+                raise FileNotFoundError(f"学習例のファイルが見つかりません: {examplesFile}")
+            with open(examplesFile, "rb") as f:
+                self.trainExamplesHistory = pickle.load(f)
+            self.skipFirstSelfPlay = True
+            return
+        
+        examplesFile += ".zst"
+        if not ZSTD_AVAILABLE:
+            raise ImportError(f'"{examplesFile}" の読み込みにはzstandardが必要です（pip install zstandard）')
+        
+        log.info("File with trainExamples found. Loading it...")
+        with open(examplesFile, "rb") as f, zstandard.ZstdDecompressor().stream_reader(f) as zf:
+            self.trainExamplesHistory = pickle.load(zf)
+        log.info('Loading done!')
+        
+        # examples based on the model were already collected (loaded)
+        self.skipFirstSelfPlay = True
 
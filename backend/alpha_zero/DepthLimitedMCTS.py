@@ -7,13 +7,44 @@ alpha-zero-generalのMCTSを拡張して、深さ制限を追加
 
 import logging
 import math
+import os
+import sys
 import numpy as np
 
+# 親ディレクトリをパスに追加（学習スクリプトからトップレベルのモジュールとして読み込まれる場合）
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from alpha_zero.mcts_kernels import select_action, apply_temperature
+
 EPS = 1e-8
 
 log = logging.getLogger(__name__)
 
 
+class Node:
+    """
+    MCTSの1つの状態の情報
+    
+    状態ごとの値を1つのオブジェクトにまとめ、状態キーの辞書引きを1回で済ませる
+    """
+    __slots__ = ('E', 'P', 'V', 'Q', 'N', 'Ns', 'VL', 'VLs', 'touch')
+    
+    def __init__(self, E, touch):
+        self.E = E          # 終了判定（0=続行中）
+        self.P = None       # 方策: [prob, prob, ...]（展開するまでNone）
+        self.V = None       # 合法手: [0/1, 0/1, ...]
+        self.Q = None       # Q値: [float, float, ...]
+        self.N = None       # 訪問回数: [int, int, ...]
+        self.Ns = 0         # 状態訪問回数
+        
+        # バーチャルロス: 評価待ちの探索が通過中の数（アクションごとの配列 / 合計）
+        self.VL = None
+        self.VLs = 0
+        
+        # 最後に通ったときの getActionProb() の通し番号（trim() で古い状態から捨てるため）
+        self.touch = touch
+
+
 class DepthLimitedMCTS:
     """
     深さ制限付きMCTSクラス
@@ -32,12 +63,16 @@ class DepthLimitedMCTS:
         # 深さ制限（デフォルト: 50手先まで）
         self.max_depth = getattr(args, 'max_depth', 50)
         
-        self.Qsa = {}  # Q値: (state, action) -> float
-        self.Nsa = {}  # 訪問回数: (state, action) -> int
-        self.Ns = {}   # 状態訪問回数: state -> int
-        self.Ps = {}   # 方策: state -> [prob, prob, ...]
-        self.Es = {}   # 終了判定: state -> float
-        self.Vs = {}   # 合法手: state -> [0/1, 0/1, ...]
+        # 葉をまとめてニューラルネットで評価する数（1なら1回ずつ評価する）
+        # dotdictは未定義の属性でKeyErrorになるため、辞書として引く
+        self.batch_size = args.get('mcts_batch_size', 1) if isinstance(args, dict) else getattr(args, 'mcts_batch_size', 1)
+        
+        # 状態ごとの情報: state -> Node
+        # 辺の統計はアクション数の長さの配列で持つ（UCBをまとめて計算するため）
+        self.nodes = {}
+        
+        # getActionProb() の通し番号（Node.touch に記録する）
+        self._clock = 0
         
         # 統計情報
         self.max_depth_reached = 0
@@ -54,137 +89,358 @@ class DepthLimitedMCTS:
         Returns:
             probs: 各アクションの確率分布
         """
-        for i in range(self.args.numMCTSSims):
-            self.search(canonicalBoard, depth=0)
+        self._clock += 1
+        
+        if self.batch_size > 1 and hasattr(self.nnet, 'predict_batch'):
+            simulations = 0
+            while simulations < self.args.numMCTSSims:
+                simulations += self.search_batch(
+                    canonicalBoard, min(self.batch_size, self.args.numMCTSSims - simulations)
+                )
+        else:
+            for i in range(self.args.numMCTSSims):
+                self.search(canonicalBoard, depth=0)
 
-        s = self.game.stringRepresentation(canonicalBoard)
-        counts = [self.Nsa[(s, a)] if (s, a) in self.Nsa else 0 
-                  for a in range(self.game.getActionSize())]
+        node = self.nodes.get(self.game.stringRepresentation(canonicalBoard))
+        if node is not None and node.N is not None:
+            counts = node.N.astype(np.float64)
+        else:
+            counts = np.zeros(self.game.getActionSize(), dtype=np.float64)
 
         if temp == 0:
             # 温度0: 最も訪問されたアクションを選択
-            bestAs = np.array(np.argwhere(counts == np.max(counts))).flatten()
+            bestAs = np.flatnonzero(counts == counts.max())
             bestA = np.random.choice(bestAs)
             probs = [0] * len(counts)
             probs[bestA] = 1
             return probs
 
-        # 温度パラメータを適用
-        counts = [x ** (1. / temp) for x in counts]
-        counts_sum = float(sum(counts))
+        # 温度パラメータを適用（すべて0の場合は均等分布）
+        probs = apply_temperature(counts, 1. / temp)
         
-        if counts_sum > 0:
-            probs = [x / counts_sum for x in counts]
-        else:
-            # すべて0の場合は均等分布
-            probs = [1.0 / len(counts)] * len(counts)
-        
-        return probs
+        return probs.tolist()
 
     def search(self, canonicalBoard, depth=0):
         """
         MCTSの1回の探索（深さ制限付き）
         
+        再帰せずにループで葉まで降り、通った (状態, アクション) を経路に積んでから
+        葉の評価値を経路に沿ってバックアップする
+        
         Args:
             canonicalBoard: 正規化された盤面
             depth: 現在の探索深さ
         
         Returns:
-            v: 現在の盤面の評価値（-1~1）
-        """
-        # 統計更新
-        if depth > self.max_depth_reached:
-            self.max_depth_reached = depth
-        
-        # 深さ制限チェック
-        if depth >= self.max_depth:
-            self.depth_limit_hits += 1
-            # ニューラルネットの評価値で代替
-            _, v = self.nnet.predict(canonicalBoard)
-            return -v
-
-        s = self.game.stringRepresentation(canonicalBoard)
-
-        # ゲーム終了判定（キャッシュ）
-        if s not in self.Es:
-            self.Es[s] = self.game.getGameEnded(canonicalBoard, 1)
-        
-        if self.Es[s] != 0:
-            # 終端ノード
-            return -self.Es[s]
-
-        # 葉ノード: ニューラルネット評価
-        if s not in self.Ps:
-            self.Ps[s], v = self.nnet.predict(canonicalBoard)
-            valids = self.game.getValidMoves(canonicalBoard, 1)
-            self.Ps[s] = self.Ps[s] * valids  # 非合法手をマスク
+            v: 現在の盤面の評価値（-1~1、呼び出し元の手番から見た値）
+        """
+        path = []
+        applied_actions = []
+        
+        # 盤面をコピーせずに手を打って降り、探索後に取り消す
+        # ワタルートの getCanonicalForm() は盤面をそのまま返すので、正規化は不要
+        try:
+            while True:
+                # 統計更新
+                if depth > self.max_depth_reached:
+                    self.max_depth_reached = depth
+                
+                # 深さ制限チェック
+                if depth >= self.max_depth:
+                    self.depth_limit_hits += 1
+                    # ニューラルネットの評価値で代替
+                    _, leaf_value = self.nnet.predict(canonicalBoard)
+                    break
+                
+                s = self.game.stringRepresentation(canonicalBoard)
+                
+                # ゲーム終了判定（初めての状態のときだけ判定してNodeに残す）
+                node = self.nodes.get(s)
+                if node is None:
+                    node = self.nodes[s] = Node(self.game.getGameEnded(canonicalBoard, 1), self._clock)
+                else:
+                    node.touch = self._clock
+                
+                if node.E != 0:
+                    # 終端ノード
+                    leaf_value = node.E
+                    break
+                
+                # 葉ノード: ニューラルネット評価
+                if node.P is None:
+                    pi, v = self.nnet.predict(canonicalBoard)
+                    leaf_value = self._expand(node, canonicalBoard, pi, v)
+                    break
+                
+                # 内部ノード: UCBで最良のアクションを選択して次の状態へ
+                a = self._select_action(node)
+                path.append((node, a))
+                applied_actions.append(self.game.applyAction(canonicalBoard, 1, a))
+                depth += 1
+        finally:
+            for applied in reversed(applied_actions):
+                self.game.undoAction(canonicalBoard, applied)
+        
+        # バックアップ（Q値と訪問回数を更新）
+        return self._backup_path(path, leaf_value)
+    
+    def search_batch(self, canonicalBoard, batch_size):
+        """
+        葉を最大 batch_size 個集めてから、ニューラルネットでまとめて評価する探索
+        
+        評価待ちの経路にはバーチャルロス（負けとして仮に数える）を加えて、
+        同じバッチ内の探索が別の葉に向かうようにする。
+        同じ葉に行き着いた場合は、そこでバッチを打ち切る
+        
+        Args:
+            canonicalBoard: 正規化された盤面（ルート）
+            batch_size: 1回に集める葉の最大数
+        
+        Returns:
+            実行した探索の回数（1以上）
+        """
+        pending = []          # 評価待ちの葉: (経路, 盤面, Node or None)
+        pending_states = set()
+        simulations = 0
+        
+        # 経路はルートの盤面上で手を打って辿り、葉に着いたら元に戻す
+        # （評価待ちの葉の盤面だけをコピーして残す）
+        board = canonicalBoard
+        
+        while simulations < batch_size:
+            path = []
+            applied_actions = []
+            depth = 0
+            
+            try:
+                while True:
+                    if depth > self.max_depth_reached:
+                        self.max_depth_reached = depth
+                    
+                    # 深さ制限: 価値だけをニューラルネットで評価する
+                    if depth >= self.max_depth:
+                        self.depth_limit_hits += 1
+                        leaf = (path, board.clone(), None)
+                        break
+                    
+                    s = self.game.stringRepresentation(board)
+                    
+                    node = self.nodes.get(s)
+                    if node is None:
+                        node = self.nodes[s] = Node(self.game.getGameEnded(board, 1), self._clock)
+                    else:
+                        node.touch = self._clock
+                    
+                    if node.E != 0:
+                        # 終端ノード: 評価を待たずにその場でバックアップする
+                        leaf = None
+                        self._remove_virtual_loss(path)
+                        self._backup_path(path, node.E)
+                        break
+                    
+                    if node.P is None:
+                        leaf = (path, board.clone(), node)
+                        break
+                    
+                    a = self._select_action(node)
+                    
+                    # バーチャルロスを加えて次の状態へ
+                    if node.VL is None:
+                        node.VL = np.zeros(len(node.V), dtype=np.int64)
+                    node.VL[a] += 1
+                    node.VLs += 1
+                    path.append((node, a))
+                    
+                    applied_actions.append(self.game.applyAction(board, 1, a))
+                    depth += 1
+            finally:
+                for applied in reversed(applied_actions):
+                    self.game.undoAction(board, applied)
+            
+            if leaf is None:
+                simulations += 1
+                continue
             
-            sum_Ps_s = np.sum(self.Ps[s])
+            # 同じ葉を2回評価しないよう、重なったらこの経路は取り消して打ち切る
+            if leaf[2] is not None and leaf[2] in pending_states:
+                self._remove_virtual_loss(path)
+                break
+            
+            if leaf[2] is not None:
+                pending_states.add(leaf[2])
+            pending.append(leaf)
+            simulations += 1
+        
+        if pending:
+            pis, vs = self.nnet.predict_batch([board for _, board, _ in pending])
+            
+            for (path, board, node), pi, v in zip(pending, pis, vs):
+                self._remove_virtual_loss(path)
+                if node is not None:
+                    v = self._expand(node, board, pi, v)
+                self._backup_path(path, v)
+        
+        return max(simulations, 1)
+    
+    def _expand(self, node, canonicalBoard, pi, v):
+        """
+        葉ノードをニューラルネットの評価結果で展開
+        
+        Args:
+            node: 盤面の状態のNode
+            canonicalBoard: 正規化された盤面
+            pi: ニューラルネットの方策
+            v: ニューラルネットの価値
+        
+        Returns:
+            葉ノードの手番から見た評価値
+        """
+        valids = self.game.getValidMoves(canonicalBoard, 1)
+        ps = pi * valids  # 非合法手をマスク
+        
+        sum_Ps_s = np.sum(ps)
+        if sum_Ps_s > 0:
+            ps /= sum_Ps_s  # 正規化
+        else:
+            # すべて非合法の場合（ゲーム終了のはず）
+            log.warning("All valid moves were masked, doing a workaround.")
+            ps = ps + valids
+            sum_Ps_s = np.sum(ps)
             if sum_Ps_s > 0:
-                self.Ps[s] /= sum_Ps_s  # 正規化
+                ps /= sum_Ps_s
             else:
-                # すべて非合法の場合（ゲーム終了のはず）
-                log.warning("All valid moves were masked, doing a workaround.")
-                self.Ps[s] = self.Ps[s] + valids
-                sum_Ps_s = np.sum(self.Ps[s])
-                if sum_Ps_s > 0:
-                    self.Ps[s] /= sum_Ps_s
-                else:
-                    # 本当に合法手がない場合は強制終了
-                    self.Es[s] = self.game.getGameEnded(canonicalBoard, 1)
-                    if self.Es[s] == 0:
-                        # それでも終了していない場合は引き分け扱い
-                        self.Es[s] = 1e-4
-                    return -self.Es[s]
-
-            self.Vs[s] = valids
-            self.Ns[s] = 0
-            return -v
-
-        # 内部ノード: UCBで最良のアクションを選択
-        valids = self.Vs[s]
-        cur_best = -float('inf')
-        best_act = -1
-
-        for a in range(self.game.getActionSize()):
-            if valids[a]:
-                if (s, a) in self.Qsa:
-                    u = self.Qsa[(s, a)] + self.args.cpuct * self.Ps[s][a] * math.sqrt(self.Ns[s]) / (
-                            1 + self.Nsa[(s, a)])
-                else:
-                    u = self.args.cpuct * self.Ps[s][a] * math.sqrt(self.Ns[s] + EPS)
-
-                if u > cur_best:
-                    cur_best = u
-                    best_act = a
+                # 本当に合法手がない場合は強制終了
+                node.E = self.game.getGameEnded(canonicalBoard, 1)
+                if node.E == 0:
+                    # それでも終了していない場合は引き分け扱い
+                    node.E = 1e-4
+                return node.E
 
-        a = best_act
+        node.P = ps
+        node.V = valids
+        node.Ns = 0
+        action_size = len(valids)
+        node.Q = np.zeros(action_size, dtype=np.float64)
+        node.N = np.zeros(action_size, dtype=np.int64)
+        return v
+    
+    def _select_action(self, node):
+        """
+        UCB（PUCT）で最良のアクションを選択
         
-        # 次の状態へ
-        next_s, next_player = self.game.getNextState(canonicalBoard, 1, a)
-        next_s = self.game.getCanonicalForm(next_s, next_player)
-
-        # 再帰的に探索（深さ+1）
-        v = self.search(next_s, depth=depth + 1)
-
-        # バックアップ（Q値と訪問回数を更新）
-        if (s, a) in self.Qsa:
-            self.Qsa[(s, a)] = (self.Nsa[(s, a)] * self.Qsa[(s, a)] + v) / (self.Nsa[(s, a)] + 1)
-            self.Nsa[(s, a)] += 1
-        else:
-            self.Qsa[(s, a)] = v
-            self.Nsa[(s, a)] = 1
+        全アクションのUCB値の計算と最大値の選択は mcts_kernels.select_action() で行う。
+        評価待ちの経路が通過している辺は、その数だけ負けを加えた値で比べる
+        
+        Args:
+            node: 盤面の状態のNode（展開済み）
+        
+        Returns:
+            選択したアクション
+        """
+        n = node.N
+        q = node.Q
+        ns = node.Ns
+        
+        vl = node.VL
+        if vl is not None:
+            # バーチャルロス: 通過中の数だけ価値-1の訪問を加えたものとして扱う
+            n = n + vl
+            q = np.divide(node.N * q - vl, n, out=q.copy(), where=n > 0)
+            ns += node.VLs
+        
+        # u = Q + cpuct * P * sqrt(Ns) / (1 + N)（未訪問の辺はQ=0、分母は1になる）
+        coef = self.args.cpuct * math.sqrt(ns + EPS)
+        return int(select_action(q, n, node.P, node.V, coef))
+    
+    def _backup(self, node, a, v):
+        """
+        Q値と訪問回数を更新
+        
+        Args:
+            node: 盤面の状態のNode
+            a: 選択したアクション
+            v: その状態の手番から見た評価値
+        """
+        n = node.N[a]
+        node.Q[a] = (n * node.Q[a] + v) / (n + 1)
+        node.N[a] = n + 1
 
-        self.Ns[s] += 1
-        return -v
+        node.Ns += 1
+    
+    def _backup_path(self, path, leaf_value):
+        """
+        葉の評価値を経路に沿ってバックアップ（手番ごとに符号を反転）
+        
+        Args:
+            path: ルートから葉までの (Node, アクション) のリスト
+            leaf_value: 葉の手番から見た評価値
+        
+        Returns:
+            ルートの手番の相手から見た評価値（search() の戻り値）
+        """
+        v = -leaf_value
+        for node, a in reversed(path):
+            self._backup(node, a, v)
+            v = -v
+        return v
+    
+    def _remove_virtual_loss(self, path):
+        """経路に加えたバーチャルロスを取り除く"""
+        for node, a in path:
+            if node.VLs == 1:
+                node.VL = None
+                node.VLs = 0
+            else:
+                node.VLs -= 1
+                node.VL[a] -= 1
+    
+    def trim(self, max_entries=500000):
+        """
+        状態数が max_entries を超えていたら、最近通っていない状態から捨てる
+        
+        自己対戦のエピソードをまたいで木（ニューラルネットの評価結果）を使い回すときに、
+        メモリが増え続けないようにする。探索中（バーチャルロスが残っている間）は呼ばないこと
+        
+        Args:
+            max_entries: 残す状態の最大数
+        
+        Returns:
+            捨てた状態の数
+        """
+        nodes = self.nodes
+        excess = len(nodes) - max_entries
+        if excess <= 0:
+            return 0
+        
+        stale = sorted(nodes, key=lambda s: nodes[s].touch)[:excess]
+        for s in stale:
+            del nodes[s]
+        return excess
+    
+    def reset_visits(self):
+        """
+        探索の統計（Q値・訪問回数・バーチャルロス）を0に戻す
+        
+        ニューラルネットの評価結果（P/V/E）は残すので、次のエピソードでも同じ局面の推論は省ける。
+        統計を残したままだと、前のエピソードの訪問回数が方策の目標に混ざってしまうため、
+        自己対戦ではエピソードの始めに呼ぶ。探索中（バーチャルロスが残っている間）は呼ばないこと
+        """
+        for node in self.nodes.values():
+            if node.N is not None:
+                node.Q.fill(0.0)
+                node.N.fill(0)
+            node.Ns = 0
+            node.VL = None
+            node.VLs = 0
     
     def get_stats(self):
         """統計情報を取得"""
         return {
             'max_depth_reached': self.max_depth_reached,
             'depth_limit_hits': self.depth_limit_hits,
-            'total_states': len(self.Es),
-            'total_edges': len(self.Qsa),
+            'total_states': len(self.nodes),
+            'total_edges': sum(int(np.count_nonzero(node.N)) for node in self.nodes.values()
+                               if node.N is not None),
         }
     
     def reset_stats(self):
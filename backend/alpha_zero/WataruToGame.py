@@ -11,8 +11,11 @@ import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from game.game import WataruToGame as OriginalGame
-from game.move import Move
+from game.move import Move, Position
 import numpy as np
+from collections import OrderedDict
+from functools import lru_cache
+from itertools import chain
 from typing import List, Tuple, Optional
 
 
@@ -24,20 +27,48 @@ class WataruToGame:
     既存のワタルートゲームロジックを橋渡しします。
     """
     
-    def __init__(self, board_size: int = 9):
+    def __init__(self, board_size: int = 9, leaf_cache_size: int = 50000):
         """
         Args:
             board_size: 盤面サイズ（デフォルト: 9x9）
                        小さな盤面で学習を開始することを推奨
+            leaf_cache_size: 局面ごとの合法手・終局判定を保持する数（0で無効）
         """
         self.board_size = board_size
         
+        # 局面のZobristハッシュ -> (合法手がなく終局した場合の勝者 or None, 合法なアクションID)
+        # MCTSは自己対戦のたびに作り直されるが、このラッパーは学習中ずっと使われるので、
+        # 序盤など何度も現れる局面の合法手生成を省ける（古いものから捨てる）
+        self.leaf_cache_size = leaf_cache_size
+        self._leaf_cache: "OrderedDict[int, Tuple[Optional[int], np.ndarray]]" = OrderedDict()
+        
         # アクション空間の計算（レイヤー情報を含む）
         # 各マスに対して: 向き(2) x サイズ(3: 3/4/5マス) x レイヤー(2) = 12通り
         # 全体: 12 * board_size^2
         # レイヤー0: レイヤー1モード（通常配置）
         # レイヤー1: レイヤー2モード（橋渡し）
         self.action_size = 12 * board_size * board_size
+        self._cells = board_size * board_size
+        
+        # アクションIDごとの手のマスの表（盤面サイズごとに1回だけ作る）
+        self._action_paths = _action_paths(board_size)
+    
+    def __getstate__(self):
+        """
+        pickle用の状態（自己対戦ワーカーにspawnで渡すときなど）
+        
+        局面ごとのキャッシュ（最大 leaf_cache_size 件の合法手の配列）と手の表は送らず、
+        受け取った側で空のキャッシュと表を作り直す
+        """
+        state = self.__dict__.copy()
+        del state['_leaf_cache']
+        del state['_action_paths']
+        return state
+    
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._leaf_cache = OrderedDict()
+        self._action_paths = _action_paths(self.board_size)
     
     def getInitBoard(self) -> OriginalGame:
         """
@@ -116,6 +147,53 @@ class WataruToGame:
         # 次のプレイヤーは常に反対側
         return (next_board, -player)
     
+    def applyAction(self, board: OriginalGame, player: int, action: int) -> bool:
+        """
+        getNextState() と同じ手を、盤面をコピーせずにその場で適用する
+        
+        MCTSの探索で1手ごとに clone() するのを避けるためのもの。
+        探索が終わったら undoAction() で必ず元に戻すこと
+        
+        Args:
+            board: 現在の盤面（書き換えられる）
+            player: 現在のプレイヤー (1 or -1)
+            action: 選択されたアクション
+            
+        Returns:
+            手を適用できた場合True（Falseの場合はこの手を選んだ側の負けとしてwinnerを設定済み）
+        """
+        move = self._action_to_move(action, board)
+        
+        # 無効な手の場合 - これは起こらないはずだが念のため
+        if move is None:
+            print(f"WARNING: None move for action {action}")
+            board.winner = -player  # 相手の勝ち
+            return False
+        
+        try:
+            if board.apply_move(move):
+                return True
+            print(f"Invalid move: apply_move returned False for action {action}")
+        except Exception as e:
+            print(f"Invalid move: {e}")
+        
+        # この手を選んだプレイヤーの負けとする
+        board.winner = -player
+        return False
+    
+    def undoAction(self, board: OriginalGame, applied: bool) -> None:
+        """
+        applyAction() で適用した手を取り消す
+        
+        Args:
+            board: applyAction() を適用した盤面
+            applied: applyAction() の戻り値
+        """
+        if applied:
+            board.undo_last_move()
+        else:
+            board.winner = None
+    
     def getValidMoves(self, board: OriginalGame, player: int) -> np.ndarray:
         """
         合法手のマスクを返す
@@ -134,48 +212,12 @@ class WataruToGame:
         if board.winner is not None:
             return valid_moves
         
-        # 合法手を取得（初手フィルタリングは無効: 3マスブロックも含める）
-        legal_moves = board.get_legal_moves(filter_opening=False)
-        
-        # 合法手が無い場合は強制的にゲーム終了
-        if len(legal_moves) == 0:
-            # ゲーム終了判定を実行してwinnerを設定
-            self.getGameEnded(board, player)
+        # 合法手が無い場合は強制的にゲーム終了（winnerも設定される）
+        stalemate_winner, valid_actions = self._get_leaf_info(board)
+        if stalemate_winner is not None:
             return valid_moves
         
-        # デバッグ: 最初の数手をログ出力
-        debug = False
-        if debug and len(legal_moves) > 0:
-            print(f"\ngetValidMoves: {len(legal_moves)} legal moves")
-            for i, move in enumerate(legal_moves[:3]):  # 最初の3手のみ
-                action_id = self._move_to_action(move)
-                print(f"  Move {i}: size={move.block_size}, dir={move.direction}, start=({move.start_position.row},{move.start_position.col},L{move.start_position.layer}) -> action={action_id}")
-        
-        # 各合法手をアクションIDに変換してマーク
-        conversion_errors = 0
-        for move in legal_moves:
-            try:
-                action_id = self._move_to_action(move)
-                if 0 <= action_id < self.action_size:
-                    valid_moves[action_id] = 1
-                else:
-                    conversion_errors += 1
-            except Exception as e:
-                # エラーが発生した場合はスキップ（デバッグ用に記録）
-                conversion_errors += 1
-                # print(f"Warning: Failed to convert move to action: {e}")
-                continue
-        
-        if conversion_errors > 0:
-            print(f"WARNING: {conversion_errors} moves failed to convert to actions")
-        
-        # もし何らかの理由でvalid_movesがすべて0の場合
-        if np.sum(valid_moves) == 0:
-            print("WARNING: No valid moves after conversion!")
-            print(f"  Original legal_moves count: {len(legal_moves)}")
-            # ゲーム終了判定を実行
-            self.getGameEnded(board, player)
-        
+        valid_moves[valid_actions] = 1
         return valid_moves
     
     def getGameEnded(self, board: OriginalGame, player: int) -> float:
@@ -192,7 +234,11 @@ class WataruToGame:
             -1: playerの敗北
             小さな値: 引き分け
         """
-        # 既に勝者が決まっている場合
+        # 既に勝者が決まっていなければ、合法手が無いことによる終局を判定する
+        # （ブロックを使い切った場合など。終局ならwinnerが設定される）
+        if board.winner is None:
+            self._get_leaf_info(board)
+        
         if board.winner is not None:
             if board.winner == 0:
                 # 引き分け
@@ -204,37 +250,83 @@ class WataruToGame:
                 # playerの敗北
                 return -1
         
-        # 合法手が無い場合は強制的にゲーム終了とみなす
-        # （ブロックを使い切った場合など）
-        legal_moves = board.get_legal_moves(filter_opening=False)
-        if len(legal_moves) == 0:
-            # 合法手がない場合は現在のスコアで判定
-            # 便宜的に、より多くの陣地を取っている方を勝ちとする
-            p1_tiles = board.board.count_tiles(1)
-            p_neg1_tiles = board.board.count_tiles(-1)
-            
-            p1_total = p1_tiles['layer1'] + p1_tiles['layer2']
-            p_neg1_total = p_neg1_tiles['layer1'] + p_neg1_tiles['layer2']
+        # ゲーム継続中
+        return 0
+    
+    def _get_leaf_info(self, board: OriginalGame) -> Tuple[Optional[int], np.ndarray]:
+        """
+        局面の合法手と、合法手が無い場合の勝者をまとめて求める（キャッシュ付き）
+        
+        合法手が無い局面では board.winner を設定する。
+        勝者が決まっていない盤面（board.winner is None）に対してのみ呼ぶこと
+        （反則で勝敗を付けた盤面は、手を打つ前の局面と同じハッシュになるため）
+        
+        Args:
+            board: 現在の盤面
             
-            if p1_total > p_neg1_total:
-                winner = 1
-            elif p_neg1_total > p1_total:
-                winner = -1
-            else:
-                winner = 0  # 引き分け
+        Returns:
+            (stalemate_winner, valid_actions):
+                合法手が無い場合の勝者（合法手があればNone）と、合法なアクションIDの配列
+        """
+        key = board.zobrist_hash
+        cached = self._leaf_cache.get(key)
+        if cached is not None:
+            self._leaf_cache.move_to_end(key)
+        else:
+            cached = self._compute_leaf_info(board)
+            if self.leaf_cache_size > 0:
+                self._leaf_cache[key] = cached
+                if len(self._leaf_cache) > self.leaf_cache_size:
+                    self._leaf_cache.popitem(last=False)
+        
+        stalemate_winner = cached[0]
+        if stalemate_winner is not None:
+            board.winner = stalemate_winner
+        return cached
+    
+    def _compute_leaf_info(self, board: OriginalGame) -> Tuple[Optional[int], np.ndarray]:
+        """
+        _get_leaf_info() のキャッシュが無い場合の計算
+        
+        Args:
+            board: 現在の盤面（board.winner is None）
             
-            # 勝者を設定
-            board.winner = winner
+        Returns:
+            (stalemate_winner, valid_actions)
+        """
+        # 合法手を取得（初手フィルタリングは無効: 3マスブロックも含める）
+        # アクションIDには手の種類と開始位置だけがあればよいので、Moveは作らせない
+        placements = board.get_legal_placements()
+        
+        # 合法手が無い場合は強制的にゲーム終了とみなす
+        if len(placements) == 0:
+            return self._stalemate_winner(board), np.zeros(0, dtype=np.int64)
+        
+        return None, np.unique(self._placements_to_actions(placements))
+    
+    def _stalemate_winner(self, board: OriginalGame) -> int:
+        """
+        合法手が無くなった局面の勝者を決める
+        
+        便宜的に、より多くの陣地を取っている方を勝ちとする
+        
+        Args:
+            board: 現在の盤面
             
-            if winner == 0:
-                return 1e-4
-            elif winner == player:
-                return 1
-            else:
-                return -1
+        Returns:
+            勝者（1, -1, 0=引き分け）
+        """
+        p1_tiles = board.board.count_tiles(1)
+        p_neg1_tiles = board.board.count_tiles(-1)
         
-        # ゲーム継続中
-        return 0
+        p1_total = p1_tiles['layer1'] + p1_tiles['layer2']
+        p_neg1_total = p_neg1_tiles['layer1'] + p_neg1_tiles['layer2']
+        
+        if p1_total > p_neg1_total:
+            return 1
+        elif p_neg1_total > p1_total:
+            return -1
+        return 0  # 引き分け
     
     def getCanonicalForm(self, board: OriginalGame, player: int) -> OriginalGame:
         """
@@ -291,55 +383,82 @@ class WataruToGame:
                    チャンネル0-3: 盤面（P1層1, P1層2, P-1層1, P-1層2）
                    チャンネル4-5: 残りブロック情報
         """
+        tensor = np.empty((6, self.board_size, self.board_size), dtype=np.float32)
+        self._fill_board_tensor(board, tensor)
+        return tensor
+    
+    def _fill_board_tensor(self, board: OriginalGame, out: np.ndarray) -> None:
+        """
+        盤面のテンソル表現を、確保済みの配列に書き込む
+        
+        バッチ評価で (batch, 6, size, size) の配列に直接書き込めるように分けている
+        
+        Args:
+            board: WataruToGameオブジェクト
+            out: 書き込み先の (6, board_size, board_size) のfloat32配列
+        """
         # 盤面の基本テンソル（4チャンネル）
-        board_tensor = board.get_board_as_tensor()  # (4, size, size)
-        board_tensor = np.array(board_tensor, dtype=np.float32)
+        self._fill_board_planes(board, out[:4])
         
-        # 残りブロック情報（2チャンネル）を追加
-        blocks_channel = np.zeros((2, self.board_size, self.board_size), dtype=np.float32)
+        # 残りブロック情報（2チャンネル、盤面全体で同じ値）
+        out[4], out[5] = self._blocks_features(board)
+    
+    def _fill_board_planes(self, board: OriginalGame, out: np.ndarray) -> None:
+        """
+        盤面の4チャンネル（P1層1, P1層2, P-1層1, P-1層2）を確保済みの配列に書き込む
         
-        # プレイヤー1の残りブロック情報
-        p1_blocks = board.player_blocks[1]
-        blocks_channel[0, :, :] = (p1_blocks.size4 + p1_blocks.size5) / 2.0
+        盤面のネストしたリストを1回で配列に変換し、各チャンネルは比較結果を代入する。
+        0/1の値なので、書き込み先はfloat32でもuint8でもよい
         
-        # プレイヤー-1の残りブロック情報
-        p_neg1_blocks = board.player_blocks[-1]
-        blocks_channel[1, :, :] = (p_neg1_blocks.size4 + p_neg1_blocks.size5) / 2.0
+        Args:
+            board: WataruToGameオブジェクト
+            out: 書き込み先の (4, board_size, board_size) の配列
+        """
+        size = self.board_size
+        cells = np.fromiter(
+            chain.from_iterable(chain.from_iterable(board.board.board)),
+            dtype=np.int8, count=size * size * 2
+        ).reshape(size, size, 2)
+        layer1 = cells[:, :, 0]
+        layer2 = cells[:, :, 1]
+        
+        out[0] = layer1 == 1
+        out[1] = layer2 == 1
+        out[2] = layer1 == -1
+        out[3] = layer2 == -1
+    
+    def _blocks_features(self, board: OriginalGame) -> Tuple[float, float]:
+        """
+        残りブロック情報（チャンネル4-5に盤面全体で入る値）
         
-        # 結合 (6, size, size)
-        full_tensor = np.concatenate([board_tensor, blocks_channel], axis=0)
+        Args:
+            board: WataruToGameオブジェクト
         
-        return full_tensor
+        Returns:
+            (P1の値, P-1の値): それぞれ (4マスの残り + 5マスの残り) / 2
+        """
+        p1_blocks = board.player_blocks[1]
+        p_neg1_blocks = board.player_blocks[-1]
+        return (
+            (p1_blocks.size4 + p1_blocks.size5) / 2.0,
+            (p_neg1_blocks.size4 + p_neg1_blocks.size5) / 2.0,
+        )
     
-    def stringRepresentation(self, board: OriginalGame) -> str:
+    def stringRepresentation(self, board: OriginalGame) -> int:
         """
-        盤面の文字列表現（キャッシュ・ハッシュ用）
+        盤面のキー（キャッシュ・ハッシュ用）
         
-        MCTSのトランスポジションテーブルで使用
+        MCTSのトランスポジションテーブルで使用。
+        盤面を文字列化する代わりに、手を打つたびに差分更新されている
+        Zobristハッシュ（手番・残りブロックを含む）をそのまま返す
         
         Args:
             board: 現在の盤面
             
         Returns:
-            board_string: 盤面の文字列表現
+            board_key: 盤面のハッシュ値（move_historyは含まない）
         """
-        # 盤面を簡潔に文字列化（高速化のため）
-        # move_historyは除外（同じ盤面状態なら同じハッシュにする）
-        
-        # 盤面の状態を取得
-        board_array = board.board.board
-        
-        # 盤面を文字列化（NumPy風の簡潔な形式）
-        board_str = ""
-        for row in board_array:
-            for cell in row:
-                board_str += f"{cell[0]},{cell[1]};"
-        
-        # プレイヤーと残りブロックを追加
-        player_str = str(board.current_player)
-        blocks_str = f"{board.player_blocks[1].size4},{board.player_blocks[1].size5},{board.player_blocks[-1].size4},{board.player_blocks[-1].size5}"
-        
-        return f"{board_str}|{player_str}|{blocks_str}"
+        return board.zobrist_hash
     
     def display(self, board: OriginalGame) -> None:
         """
@@ -426,21 +545,34 @@ class WataruToGame:
         
         # アクションIDを計算（レイヤー情報を含む）
         # エンコード: ((direction * 3 + size) * 2 + layer) * board_size^2 + position
-        action_id = ((direction_idx * 3 + size_idx) * 2 + layer_idx) * (self.board_size ** 2) + position
+        action_id = ((direction_idx * 3 + size_idx) * 2 + layer_idx) * self._cells + position
         
         return action_id
     
+    def _placements_to_actions(self, placements: List[Tuple[int, int, int, int, int]]) -> np.ndarray:
+        """
+        get_legal_placements() の合法手をまとめてアクションIDに変換
+        
+        _move_to_action() と同じエンコーディングを配列でまとめて計算する
+        （get_legal_placements() の手はすべてのマスが同じレイヤーなので、変換できない手はない）
+        
+        Args:
+            placements: (方向, サイズ, レイヤー, 行, 列) のリスト
+            
+        Returns:
+            action_ids: アクションIDの配列
+        """
+        fields = np.array(placements, dtype=np.int64)
+        direction, size, layer, row, col = fields.T
+        
+        # ((direction * 3 + size) * 2 + layer) * board_size^2 + position
+        return ((direction * 3 + size - 3) * 2 + layer) * self._cells + row * self.board_size + col
+    
     def _action_to_move(self, action: int, board: OriginalGame) -> Move:
         """
         アクションIDをMoveオブジェクトに変換（レイヤー情報を含む）
         
-        デコード順序:
-        1. position = action % (board_size^2)
-        2. action //= (board_size^2)
-        3. layer = action % 2
-        4. action //= 2
-        5. size = action % 3  (0=3マス, 1=4マス, 2=5マス)
-        6. direction = action // 3
+        デコードは盤面サイズごとに作った表（_action_paths()）を引くだけで済ませる
         
         Args:
             action: アクションID
@@ -449,58 +581,70 @@ class WataruToGame:
         Returns:
             move: Moveオブジェクト（無効な場合はNone）
         """
-        from game.move import Position
-        from datetime import datetime
+        path = self._action_paths[action]
+        
+        # 境界チェック：盤面外に出る場合はNoneを返す
+        if path is None:
+            return None
         
-        # アクションIDをデコード
-        position = action % (self.board_size ** 2)
-        action //= (self.board_size ** 2)
+        # MCTSの探索中に毎回時刻を取得しないよう、タイムスタンプは0にしておく
+        # （実際に打つ手の時刻は呼び出し側で設定する）
+        # Positionは変更されないので表のものを共有し、リストだけ手ごとに作る
+        return Move(
+            player=board.current_player,
+            path=list(path),
+            timestamp=0.0
+        )
+
+
+@lru_cache(maxsize=None)
+def _action_paths(board_size: int) -> Tuple[Optional[Tuple[Position, ...]], ...]:
+    """
+    アクションIDごとの手のマス（Positionのタプル）の表を作る
+    
+    デコード順序:
+    1. position = action % (board_size^2)
+    2. action //= (board_size^2)
+    3. layer = action % 2
+    4. action //= 2
+    5. size = action % 3  (0=3マス, 1=4マス, 2=5マス)
+    6. direction = action // 3  (0=vertical, 1=horizontal)
+    
+    Args:
+        board_size: 盤面サイズ
+    
+    Returns:
+        アクションIDで引ける表（盤面外にはみ出すアクションはNone）
+    """
+    cells = board_size * board_size
+    table = []
+    
+    for action in range(12 * cells):
+        position = action % cells
+        code = action // cells
         
-        layer_idx = action % 2
-        action //= 2
+        layer = code % 2
+        code //= 2
         
-        size_idx = action % 3
-        direction_idx = action // 3
+        size = code % 3 + 3
+        vertical = code // 3 == 0
         
         # 位置を行・列に変換
-        row = position // self.board_size
-        col = position % self.board_size
-        
-        # 方向を文字列に変換
-        direction = 'vertical' if direction_idx == 0 else 'horizontal'
+        row = position // board_size
+        col = position % board_size
         
-        # サイズを数値に変換 (0=3マス, 1=4マス, 2=5マス)
-        if size_idx == 0:
-            size = 3
-        elif size_idx == 1:
-            size = 4
+        if vertical:
+            if row + size > board_size:
+                table.append(None)
+                continue
+            table.append(tuple(Position(row=row + i, col=col, layer=layer) for i in range(size)))
         else:
-            size = 5
-        
-        # レイヤーを数値に変換
-        layer = layer_idx  # 0 or 1
-        
-        # 境界チェック：盤面外に出る場合はNoneを返す
-        if direction == 'vertical':
-            if row + size > self.board_size:
-                return None
-        else:  # horizontal
-            if col + size > self.board_size:
-                return None
-        
-        # pathを生成（レイヤー情報を含む）
-        path = []
-        for i in range(size):
-            if direction == 'vertical':
-                path.append(Position(row=row + i, col=col, layer=layer))
-            else:  # horizontal
-                path.append(Position(row=row, col=col + i, layer=layer))
-        
-        return Move(
-            player=board.current_player,
-            path=path,
-            timestamp=datetime.now().timestamp()
-        )
+            if col + size > board_size:
+                table.append(None)
+                continue
+            table.append(tuple(Position(row=row, col=col + i, layer=layer) for i in range(size)))
+    
+    return tuple(table)
 
 
 def quick_test():
@@ -0,0 +1,14 @@
+"""
+alpha-zero-generalのパス設定
+
+インポートすると backend/alpha-zero-general を sys.path に追加し、
+alpha-zero-generalのモジュール（Coach, Arena, MCTS, utils）を読み込めるようにする
+"""
+
+import os
+import sys
+
+ALPHA_ZERO_GENERAL_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'alpha-zero-general')
+
+if ALPHA_ZERO_GENERAL_PATH not in sys.path:
+    sys.path.append(ALPHA_ZERO_GENERAL_PATH)
@@ -4,7 +4,19 @@ GPU環境確認スクリプト
 PyTorchとCUDAが正しくインストールされているか確認します。
 """
 
+import os
 import sys
+import time
+
+# 計測の途中でインポートの時間が入らないよう、最初にまとめてインポートしておく
+try:
+    import torch
+    import torch.nn as nn
+    TORCH_AVAILABLE = True
+    TORCH_IMPORT_ERROR = None
+except ImportError as e:
+    TORCH_AVAILABLE = False
+    TORCH_IMPORT_ERROR = e
 
 def check_gpu():
     print("=" * 60)
@@ -12,13 +24,12 @@ def check_gpu():
     print("=" * 60)
     
     # PyTorchのインポート
-    try:
-        import torch
+    if TORCH_AVAILABLE:
         print(f"\n✅ PyTorchインポート成功")
         print(f"   バージョン: {torch.__version__}")
-    except ImportError as e:
+    else:
         print(f"\n❌ PyTorchがインストールされていません")
-        print(f"   エラー: {e}")
+        print(f"   エラー: {TORCH_IMPORT_ERROR}")
         print("\n解決方法:")
         print("   pip install torch torchvision torchaudio --index-url https://download.pytorch.org/whl/cu121")
         return False
@@ -27,15 +38,21 @@ def check_gpu():
     print(f"\nCUDA利用可能: {torch.cuda.is_available()}")
     
     if torch.cuda.is_available():
+        # 調べるのは学習で使うGPU（環境変数 ALPHAZERO_GPU、デフォルト: 0）
+        # 最初に1回だけ選び、確認・解放はすべてこのデバイスで行う
+        # （別のGPUを使う環境でcuda:0にもコンテキストが作られないようにする）
+        dev = int(os.getenv("ALPHAZERO_GPU", "0"))
+        torch.cuda.set_device(dev)
+        
         print(f"✅ CUDAが利用可能です！")
         print(f"   CUDAバージョン: {torch.version.cuda}")
         print(f"   cuDNNバージョン: {torch.backends.cudnn.version()}")
         print(f"   GPUデバイス数: {torch.cuda.device_count()}")
-        print(f"   現在のGPU: {torch.cuda.current_device()}")
-        print(f"   GPU名: {torch.cuda.get_device_name(0)}")
+        print(f"   現在のGPU: {dev}")
+        print(f"   GPU名: {torch.cuda.get_device_name(dev)}")
         
         # メモリ情報
-        props = torch.cuda.get_device_properties(0)
+        props = torch.cuda.get_device_properties(dev)
         print(f"   GPU総メモリ: {props.total_memory / 1024**3:.2f} GB")
         print(f"   マルチプロセッサ数: {props.multi_processor_count}")
         print(f"   Compute Capability: {props.major}.{props.minor}")
@@ -45,25 +62,43 @@ def check_gpu():
         print("GPU演算テスト")
         print("=" * 60)
         
+        # BF16はCompute Capability 8.0以上（Ampere以降）のみ。ALPHAZERO_PRECISION=fp32 なら使わない
+        use_bf16 = props.major >= 8 and os.getenv("ALPHAZERO_PRECISION", "tf32").lower() != "fp32"
+        
         try:
-            print("\n1. テンソル作成テスト...")
-            x = torch.randn(1000, 1000).cuda()
-            y = torch.randn(1000, 1000).cuda()
-            print(f"   ✅ テンソル作成成功")
+            print("\n1. 畳み込みテスト（学習と同じ 64x6x9x9 の入力）...")
+            # 盤面の形は固定なので、cuDNNに最速のアルゴリズムを選ばせる
+            torch.backends.cudnn.benchmark = True
             
-            print("\n2. 行列演算テスト...")
-            z = torch.matmul(x, y)
-            print(f"   ✅ 行列演算成功")
-            print(f"   結果の形状: {z.shape}")
+            dtypes = [torch.float32] + ([torch.bfloat16] if use_bf16 else [])
+            iters = 50
+            for dtype in dtypes:
+                # CPUで作ってから .cuda() で転送せず、最初からGPU上に作る
+                inp = torch.randn(64, 6, 9, 9, device=f"cuda:{dev}", dtype=dtype)
+                conv = nn.Conv2d(6, 128, 3, padding=1).to(f"cuda:{dev}", dtype=dtype)
+                
+                with torch.inference_mode():
+                    # ウォームアップ（アルゴリズム選択はここで済ませ、計測に入れない）
+                    for _ in range(3):
+                        conv(inp)
+                    torch.cuda.synchronize(dev)
+                    
+                    start = time.perf_counter()
+                    for _ in range(iters):
+                        out = conv(inp)
+                    torch.cuda.synchronize(dev)
+                    elapsed = (time.perf_counter() - start) / iters
+                
+                flops = 2 * out.numel() * conv.in_channels * 3 * 3
+                print(f"   ✅ {str(dtype).replace('torch.', '')}: {elapsed * 1000:.3f} ms/回, {flops / elapsed / 1e9:.1f} GFLOP/s")
             
-            print("\n3. メモリ使用量...")
-            allocated = torch.cuda.memory_allocated(0) / 1024**2
-            reserved = torch.cuda.memory_reserved(0) / 1024**2
+            print("\n2. メモリ使用量...")
+            allocated = torch.cuda.memory_allocated(dev) / 1024**2
+            reserved = torch.cuda.memory_reserved(dev) / 1024**2
             print(f"   割り当て済みメモリ: {allocated:.2f} MB")
             print(f"   予約済みメモリ: {reserved:.2f} MB")
             
-            print("\n4. ニューラルネットワークテスト...")
-            import torch.nn as nn
+            print("\n3. ニューラルネットワークテスト...")
             model = nn.Sequential(
                 nn.Conv2d(4, 128, 3, padding=1),
                 nn.BatchNorm2d(128),
@@ -71,20 +106,28 @@ def check_gpu():
                 nn.Conv2d(128, 128, 3, padding=1),
                 nn.BatchNorm2d(128),
                 nn.ReLU(),
-            ).cuda()
+            ).to(f"cuda:{dev}", non_blocking=True)
+            
+            test_input = torch.randn(8, 4, 9, 9, device=f"cuda:{dev}")  # batch=8, 9x9盤面
             
-            test_input = torch.randn(8, 4, 9, 9).cuda()  # batch=8, 9x9盤面
-            output = model(test_input)
+            with torch.autocast("cuda", dtype=torch.bfloat16, enabled=use_bf16):
+                output = model(test_input)
             print(f"   ✅ ニューラルネット実行成功")
             print(f"   入力形状: {test_input.shape}")
             print(f"   出力形状: {output.shape}")
+            print(f"   計算精度: {'BF16 (autocast)' if use_bf16 else 'FP32'}")
             
-            allocated_after = torch.cuda.memory_allocated(0) / 1024**2
+            allocated_after = torch.cuda.memory_allocated(dev) / 1024**2
             print(f"   モデル使用メモリ: {allocated_after - allocated:.2f} MB")
             
             # クリーンアップ
-            del x, y, z, model, test_input, output
-            torch.cuda.empty_cache()
+            # empty_cache() はキャッシュしたメモリをドライバに返し、次の確保をcudaMallocからやり直させる。
+            # このチェックの後にプロセスは終わるので通常は呼ばず、メモリを調べたいときだけ解放量を表示する
+            del inp, conv, out, model, test_input, output
+            if os.getenv("ALPHAZERO_DEBUG_MEM"):
+                with torch.cuda.device(dev):
+                    torch.cuda.empty_cache()
+                print(f"   解放後の予約済みメモリ: {torch.cuda.memory_reserved(dev) / 1024**2:.2f} MB")
             
             print("\n" + "=" * 60)
             print("✅ すべてのテスト成功！Alpha Zero学習の準備完了！")
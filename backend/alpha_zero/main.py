@@ -4,27 +4,176 @@ Alpha Zero 学習メインスクリプト
 ワタルートゲームでAlpha Zero方式の強化学習を実行
 """
 
+import argparse
+import datetime
 import os
 import sys
 
-# 再帰深度制限を増やす（MCTSの深い探索用）
-sys.setrecursionlimit(10000)
+# PyTorchのCUDAアロケータ設定（torchをインポートする前に設定しないと効かない）
+# 自己対戦と学習で大きさの違うバッチを繰り返し確保・解放するので、
+# 確保済みのセグメントをその場で伸ばせるようにして断片化とcudaMallocを減らす
+# 環境変数 ALPHAZERO_ALLOC_CONF で上書きでき、空文字列なら設定しない
+# （PYTORCH_CUDA_ALLOC_CONF が既に設定されていればそちらを優先する）
+_alloc_conf = os.environ.get('ALPHAZERO_ALLOC_CONF', 'expandable_segments:True')
+if _alloc_conf:
+    os.environ.setdefault('PYTORCH_CUDA_ALLOC_CONF', _alloc_conf)
 
-# alpha-zero-generalをパスに追加
-alpha_zero_general_path = os.path.join(os.path.dirname(__file__), '..', 'alpha-zero-general')
-sys.path.append(alpha_zero_general_path)
+# スクリプトとして直接実行（python main.py）した場合だけ、backendをパスに追加する
+# （python -m alpha_zero.main で実行する場合やパッケージとしてインポートする場合は不要）
+if __package__ in (None, ''):
+    _backend_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    if _backend_path not in sys.path:
+        sys.path.append(_backend_path)
 
-# 現在のディレクトリをパスに追加（同じディレクトリのモジュールをインポート可能にする）
-sys.path.insert(0, os.path.dirname(__file__))
+# alpha-zero-general（utils.dotdict など）のパスは、どの実行方法でも alpha_zero._paths で追加する
+import alpha_zero._paths
 
 # 深さ制限付きCoachを使用
-from DepthLimitedCoach import DepthLimitedCoach as Coach
-from WataruToGame import WataruToGame
-from pytorch.NNet import NNetWrapper as nn
+# 同じモジュールが別名（WataruToGame と alpha_zero.WataruToGame）で2回読み込まれないよう、
+# パッケージ内のモジュールはすべて alpha_zero. から読み込む
+from alpha_zero.DepthLimitedCoach import DepthLimitedCoach as Coach
+from alpha_zero.WataruToGame import WataruToGame
+from alpha_zero.pytorch.NNet import NNetWrapper as nn, load_checkpoint_meta
 from utils import dotdict
 
+import torch
+import torch.distributed as dist
 
-def main():
+
+# ========== 学習設定 ==========
+
+# 全モード共通の設定
+BASE_ARGS = dotdict({
+    'tempThreshold': 15,        # 温度パラメータの閾値
+    'updateThreshold': 0.55,    # モデル更新の勝率閾値
+    'cpuct': 1.0,               # MCTS探索パラメータ
+    'mcts_batch_size': 8,       # 葉をまとめてニューラルネットで評価する数（1で逐次評価）
+    'numWorkers': 1,            # 自己対戦を並列に行うプロセス数（1でこのプロセスのみ。main() で環境変数から設定）
+    'fp16_inference': True,     # 自己対戦・評価対戦の推論をCUDAでFP16にする
+    'amp_training': True,       # 学習をCUDAで混合精度（BF16、非対応GPUではFP16）にする
+    'channels_last': True,      # CUDAで畳み込みをNHWCの配置で計算する（半精度のTensorコアで速い）
+    
+    # ニューラルネット設定
+    'lr': 0.001,
+    'dropout': 0.3,
+    'batch_size': 64,
+    'num_channels': 96,
+    'num_res_blocks': 6,
+    
+    # その他
+    'checkpoint': './models/',
+    'load_model': False,
+    'load_folder_file': ('./models/', 'best.pth.tar'),
+})
+
+# モードごとに BASE_ARGS から変える設定（カスタム設定は '2' に入力値を重ねる）
+MODE_OVERRIDES = {
+    # フェーズ1: プロトタイプ（既存モデルに合わせて96ch/6blocks）
+    '1': {
+        'numIters': 3,              # イテレーション数（5→3に削減）
+        'numEps': 5,                # 各イテレーションの自己対戦数（10→5に削減）
+        'maxlenOfQueue': 5000,      # 経験再生バッファサイズ
+        'numMCTSSims': 25,          # MCTSシミュレーション回数（50→25に削減）
+        'arenaCompare': 5,          # モデル評価の対戦回数（10→5に削減）
+        'max_depth': 30,            # ★新機能: MCTS最大探索深さ
+        'epochs': 3,                # エポック数も削減（5→3）
+        'batch_size': 32,
+        'numItersForTrainExamplesHistory': 3,
+    },
+    # フェーズ2: 短期学習
+    '2': {
+        'numIters': 20,
+        'numEps': 15,
+        'maxlenOfQueue': 10000,
+        'numMCTSSims': 75,
+        'arenaCompare': 15,
+        'max_depth': 40,            # ★追加: MCTS最大探索深さ
+        'epochs': 8,
+        'numItersForTrainExamplesHistory': 15,
+    },
+    # フェーズ3: 本格学習
+    '3': {
+        'numIters': 100,
+        'numEps': 25,
+        'maxlenOfQueue': 20000,
+        'numMCTSSims': 100,
+        'arenaCompare': 20,
+        'max_depth': 50,            # ★追加: MCTS最大探索深さ
+        'epochs': 10,
+        'num_channels': 128,
+        'num_res_blocks': 8,
+        'numItersForTrainExamplesHistory': 20,
+    },
+}
+
+MODE_NAMES = {
+    '1': "プロトタイプモード（動作確認、深さ制限付き）",
+    '2': "短期学習モード（性能評価）",
+    '3': "本格学習モード（強いAI）",
+    '4': "カスタムモード",
+}
+
+
+def parse_args(argv=None):
+    """
+    コマンドライン引数の解析
+    
+    指定しなかった項目は環境変数、それもなければ対話入力（端末から実行した場合のみ）で決める
+    """
+    parser = argparse.ArgumentParser(description="Alpha Zero - ワタルート学習")
+    parser.add_argument('--mode', choices=['1', '2', '3', '4'],
+                        help="学習フェーズ（1: プロトタイプ, 2: 短期, 3: 本格, 4: カスタム）")
+    parser.add_argument('--iters', type=int, help="カスタム設定のイテレーション数")
+    parser.add_argument('--eps', type=int, help="カスタム設定の各イテレーションの対戦数")
+    parser.add_argument('--sims', type=int, help="カスタム設定のMCTSシミュレーション回数")
+    parser.add_argument('--resume', choices=['y', 'n'], help="既存のモデルから続きを学習するか")
+    parser.add_argument('-y', '--yes', action='store_true', help="開始前の確認を省略する")
+    return parser.parse_args(argv)
+
+
+def interactive():
+    """
+    対話入力ができるか
+    
+    標準入力が端末でない場合と、torchrunで複数プロセスとして起動された場合
+    （全プロセスが同じ設定になるよう、入力を待たない）はFalse
+    """
+    return sys.stdin.isatty() and int(os.getenv('WORLD_SIZE', '1')) == 1
+
+
+def ask(prompt, value, env_name, default):
+    """
+    設定値を取得
+    
+    コマンドライン引数 → 環境変数 → 対話入力 の順に探す。標準入力が端末でない場合
+    （CIやsystemd、コンテナから実行した場合）やtorchrunで起動した場合は、入力を待たずにデフォルト値を使う
+    
+    Args:
+        prompt: 対話入力のプロンプト
+        value: コマンドライン引数の値（未指定ならNone）
+        env_name: 環境変数名
+        default: デフォルト値
+    
+    Returns:
+        設定値（文字列）
+    """
+    if value is not None:
+        print(f"{prompt}{value} (コマンドライン引数)")
+        return str(value)
+    
+    if env_name in os.environ:
+        value = os.environ[env_name].strip()
+        print(f"{prompt}{value} (環境変数 {env_name})")
+        return value
+    
+    if interactive():
+        return input(prompt).strip() or default
+    
+    print(f"{prompt}{default} (対話入力ができないためデフォルト値)")
+    return default
+
+
+def main(argv=None):
     """
     学習のメイン処理
     
@@ -32,6 +181,7 @@ def main():
     フェーズ2: 短期学習（性能評価）
     フェーズ3: 本格学習（強いAI）
     """
+    cli = parse_args(argv)
     
     print("=" * 70)
     print("Alpha Zero - ワタルート学習")
@@ -42,6 +192,32 @@ def main():
     # ゲーム設定
     BOARD_SIZE = 9  # 9x9盤面から開始
     
+    # 自己対戦のワーカープロセス数（環境変数 ALPHA_ZERO_WORKERS、デフォルト: 1）
+    NUM_WORKERS = int(os.environ.get('ALPHA_ZERO_WORKERS', '1'))
+    
+    # 使うGPUの番号（環境変数 ALPHAZERO_GPU、デフォルト: 0）
+    GPU_ID = int(os.getenv('ALPHAZERO_GPU', '0'))
+    
+    # torchrunで複数プロセスとして起動された場合は、プロセスごとに1つのGPUを使ってDDPで学習する
+    #   例: torchrun --nproc_per_node=2 main.py -y
+    # 自己対戦はプロセスで分け合い、学習の勾配はプロセス間で平均する
+    WORLD_SIZE = int(os.getenv('WORLD_SIZE', '1'))
+    DISTRIBUTED = WORLD_SIZE > 1
+    if DISTRIBUTED:
+        GPU_ID = int(os.getenv('LOCAL_RANK', '0'))
+    
+    # CUDAでの計算精度（環境変数 ALPHAZERO_PRECISION、デフォルト: tf32）
+    #   tf32: 学習の行列積・畳み込みをTF32で計算（Ampere以降で有効）
+    #   bf16: tf32に加えて、推論をFP16の代わりにBF16で計算（Compute Capability 8.0以上のみ）
+    #   fp32: TF32も半精度（推論のFP16・学習の混合精度）も使わない（古いGPUや精度を確認したいとき）
+    PRECISION = os.getenv('ALPHAZERO_PRECISION', 'tf32').lower()
+    
+    # CPUの自己対戦をINT8に量子化したモデルで行うか（環境変数 ALPHAZERO_INT8=1 で有効、CUDAでは使わない）
+    INT8 = os.getenv('ALPHAZERO_INT8') == '1'
+    
+    # ネットワークを torch.compile するか（環境変数 ALPHAZERO_COMPILE=1 で有効、Tritonが必要）
+    COMPILE = os.getenv('ALPHAZERO_COMPILE') == '1'
+    
     # 学習フェーズの選択
     print("\n学習フェーズを選択してください:")
     print("  1. プロトタイプ（3イテレーション、約30分-1時間）")
@@ -49,134 +225,42 @@ def main():
     print("  3. 本格学習（100イテレーション、約1-2日）")
     print("  4. カスタム設定")
     
-    # 環境変数があればそれを使用、なければユーザー入力
-    if 'ALPHA_ZERO_MODE' in os.environ:
-        choice = os.environ.get('ALPHA_ZERO_MODE', '1').strip()
-        print(f"\n選択: {choice} (環境変数 ALPHA_ZERO_MODE)")
-    else:
-        choice = input("\n選択 (1-4): ").strip()
-        if choice not in ['1', '2', '3', '4']:
-            print("無効な選択です。プロトタイプモード (1) を使用します。")
-            choice = '1'
-    
-    if choice == '1':
-        # フェーズ1: プロトタイプ（既存モデルに合わせて96ch/6blocks）
-        args = dotdict({
-            'numIters': 3,              # イテレーション数（5→3に削減）
-            'numEps': 5,                # 各イテレーションの自己対戦数（10→5に削減）
-            'tempThreshold': 15,        # 温度パラメータの閾値
-            'updateThreshold': 0.55,    # モデル更新の勝率閾値
-            'maxlenOfQueue': 5000,      # 経験再生バッファサイズ
-            'numMCTSSims': 25,          # MCTSシミュレーション回数（50→25に削減）
-            'arenaCompare': 5,          # モデル評価の対戦回数（10→5に削減）
-            'cpuct': 1.0,               # MCTS探索パラメータ
-            'max_depth': 30,            # ★新機能: MCTS最大探索深さ
-            
-            # ニューラルネット設定（既存モデルと一致させる）
-            'lr': 0.001,
-            'dropout': 0.3,
-            'epochs': 3,                # エポック数も削減（5→3）
-            'batch_size': 32,
-            'num_channels': 96,         # 既存モデルに合わせる（64→96）
-            'num_res_blocks': 6,        # 既存モデルに合わせる（4→6）
-            
-            # その他
-            'checkpoint': './models/',
-            'load_model': False,
-            'load_folder_file': ('./models/', 'best.pth.tar'),
-            'numItersForTrainExamplesHistory': 3,
-        })
-        print("\n✅ プロトタイプモード（動作確認、深さ制限付き）")
-    
-    elif choice == '2':
-        # フェーズ2: 短期学習
-        args = dotdict({
-            'numIters': 20,
-            'numEps': 15,
-            'tempThreshold': 15,
-            'updateThreshold': 0.55,
-            'maxlenOfQueue': 10000,
-            'numMCTSSims': 75,
-            'arenaCompare': 15,
-            'cpuct': 1.0,
-            'max_depth': 40,            # ★追加: MCTS最大探索深さ
-            
-            'lr': 0.001,
-            'dropout': 0.3,
-            'epochs': 8,
-            'batch_size': 64,
-            'num_channels': 96,
-            'num_res_blocks': 6,
-            
-            'checkpoint': './models/',
-            'load_model': False,
-            'load_folder_file': ('./models/', 'best.pth.tar'),
-            'numItersForTrainExamplesHistory': 15,
-        })
-        print("\n✅ 短期学習モード（性能評価）")
-    
-    elif choice == '3':
-        # フェーズ3: 本格学習
-        args = dotdict({
-            'numIters': 100,
-            'numEps': 25,
-            'tempThreshold': 15,
-            'updateThreshold': 0.55,
-            'maxlenOfQueue': 20000,
-            'numMCTSSims': 100,
-            'arenaCompare': 20,
-            'cpuct': 1.0,
-            'max_depth': 50,            # ★追加: MCTS最大探索深さ
-            
-            'lr': 0.001,
-            'dropout': 0.3,
-            'epochs': 10,
-            'batch_size': 64,
-            'num_channels': 128,
-            'num_res_blocks': 8,
-            
-            'checkpoint': './models/',
-            'load_model': False,
-            'load_folder_file': ('./models/', 'best.pth.tar'),
-            'numItersForTrainExamplesHistory': 20,
-        })
-        print("\n✅ 本格学習モード（強いAI）")
+    # --mode、環境変数 ALPHA_ZERO_MODE、ユーザー入力の順
+    choice = ask("\n選択 (1-4): ", cli.mode, 'ALPHA_ZERO_MODE', '1')
+    if choice not in ['1', '2', '3', '4']:
+        print("無効な選択です。プロトタイプモード (1) を使用します。")
+        choice = '1'
     
-    else:
-        # カスタム設定
+    if choice == '4':
+        # カスタム設定（短期学習の設定に入力値を重ねる）
         print("\nカスタム設定を入力してください:")
-        num_iters = int(input("イテレーション数 (デフォルト: 10): ") or "10")
-        num_eps = int(input("各イテレーションの対戦数 (デフォルト: 15): ") or "15")
-        num_sims = int(input("MCTSシミュレーション回数 (デフォルト: 75): ") or "75")
-        
-        args = dotdict({
+        num_iters = int(ask("イテレーション数 (デフォルト: 10): ", cli.iters, 'ALPHA_ZERO_ITERS', '10'))
+        num_eps = int(ask("各イテレーションの対戦数 (デフォルト: 15): ", cli.eps, 'ALPHA_ZERO_EPS', '15'))
+        num_sims = int(ask("MCTSシミュレーション回数 (デフォルト: 75): ", cli.sims, 'ALPHA_ZERO_SIMS', '75'))
+        overrides = {
+            **MODE_OVERRIDES['2'],
             'numIters': num_iters,
             'numEps': num_eps,
-            'tempThreshold': 15,
-            'updateThreshold': 0.55,
-            'maxlenOfQueue': 10000,
             'numMCTSSims': num_sims,
-            'arenaCompare': 15,
-            'cpuct': 1.0,
-            'max_depth': 40,            # ★追加: MCTS最大探索深さ
-            
-            'lr': 0.001,
-            'dropout': 0.3,
-            'epochs': 8,
-            'batch_size': 64,
-            'num_channels': 96,
-            'num_res_blocks': 6,
-            
-            'checkpoint': './models/',
-            'load_model': False,
-            'load_folder_file': ('./models/', 'best.pth.tar'),
-            'numItersForTrainExamplesHistory': 15,
-        })
-        print("\n✅ カスタムモード")
+        }
+    else:
+        overrides = MODE_OVERRIDES[choice]
+    
+    args = dotdict({
+        **BASE_ARGS,
+        **overrides,
+        'numWorkers': NUM_WORKERS,
+        'compile': COMPILE,
+        'int8_inference': INT8,
+        'distributed': DISTRIBUTED,
+    })
+    print(f"\n✅ {MODE_NAMES[choice]}")
     
     # モデル再開の確認
     if os.path.exists(os.path.join(args.checkpoint, 'best.pth.tar')):
-        resume = input("\n既存のモデルが見つかりました。続きから学習しますか？ (y/n): ").strip().lower()
+        # 端末がない（スケジュール実行など）場合は、既存のモデルを上書きしないよう続きから学習する
+        resume = ask("\n既存のモデルが見つかりました。続きから学習しますか？ (y/n): ",
+                     cli.resume, 'ALPHA_ZERO_RESUME', 'y' if not interactive() else 'n').lower()
         if resume == 'y':
             args.load_model = True
             print("✅ 学習済みモデルから再開します")
@@ -190,6 +274,15 @@ def main():
     print(f"イテレーション数: {args.numIters}")
     print(f"各イテレーションの対戦数: {args.numEps}")
     print(f"MCTSシミュレーション回数: {args.numMCTSSims}")
+    print(f"MCTSバッチサイズ: {args.mcts_batch_size}")
+    print(f"自己対戦ワーカー数: {args.numWorkers}")
+    print(f"使用GPU: {f'cuda:{GPU_ID}' if torch.cuda.is_available() else 'なし（CPU）'}")
+    print(f"分散学習（DDP）: {f'{WORLD_SIZE}プロセス' if DISTRIBUTED else '無効'}")
+    print(f"推論のFP16: {'有効（CUDA使用時）' if args.fp16_inference else '無効'}")
+    print(f"学習の混合精度: {'有効（CUDA使用時）' if args.amp_training else '無効'}")
+    print(f"計算精度（CUDA使用時）: {PRECISION}")
+    print(f"torch.compile: {'有効（CUDA使用時）' if args.compile else '無効'}")
+    print(f"自己対戦のINT8推論: {'有効（CPU使用時）' if args.int8_inference else '無効'}")
     print(f"バッチサイズ: {args.batch_size}")
     print(f"ニューラルネット:")
     print(f"  - チャンネル数: {args.num_channels}")
@@ -199,13 +292,37 @@ def main():
     print("=" * 70)
     
     # 確認
-    confirm = input("\nこの設定で学習を開始しますか？ (y/n): ").strip().lower()
+    confirm = ask("\nこの設定で学習を開始しますか？ (y/n): ",
+                  'y' if cli.yes else None, 'ALPHA_ZERO_YES', 'y' if not interactive() else 'n').lower()
     if confirm != 'y':
         print("学習をキャンセルしました")
         return
     
     print("\n🚀 学習開始！\n")
     
+    # 使うGPUは最初に1回だけ選ぶ（以降の .cuda() や推論はすべてこのデバイスで行われ、
+    # 呼び出しごとにデバイスを切り替えずに済む）
+    if torch.cuda.is_available():
+        torch.cuda.set_device(GPU_ID)
+        
+        # TF32とcuDNNの設定はネットワークの作成時に args.tf32 に従って行われる
+        if PRECISION == 'fp32':
+            args.tf32 = False
+            args.fp16_inference = False
+            args.amp_training = False
+        elif PRECISION == 'bf16':
+            major, minor = torch.cuda.get_device_capability(GPU_ID)
+            if major >= 8:
+                args.inference_dtype = 'bfloat16'
+            else:
+                print(f"⚠️ このGPU（Compute Capability {major}.{minor}）はBF16に対応していないため、推論はFP16で行います")
+    
+    # プロセスグループの初期化（GPUを選んだ後に行う。自己対戦の長さはプロセスごとに違うので、
+    # 同期を待つ時間は長めにとる）
+    if DISTRIBUTED:
+        dist.init_process_group('nccl' if torch.cuda.is_available() else 'gloo',
+                                timeout=datetime.timedelta(hours=2))
+    
     # ゲームとニューラルネットの作成
     game = WataruToGame(board_size=BOARD_SIZE)
     nnet = nn(game, args)
@@ -216,12 +333,10 @@ def main():
         checkpoint_path = os.path.join(args.checkpoint, 'best.pth.tar')
         if os.path.exists(checkpoint_path):
             try:
-                import torch
-                checkpoint = torch.load(checkpoint_path, map_location='cpu')
-                
-                # チェックポイントからネットワーク構造情報を取得
-                saved_channels = checkpoint.get('num_channels', None)
-                saved_res_blocks = checkpoint.get('num_res_blocks', None)
+                # チェックポイントからネットワーク構造情報を取得（重みは読み込まない）
+                meta = load_checkpoint_meta(checkpoint_path)
+                saved_channels = meta['num_channels']
+                saved_res_blocks = meta['num_res_blocks']
                 
                 # 既存モデルの構造が記録されている場合、それに合わせる
                 if saved_channels is not None and saved_res_blocks is not None:
@@ -254,6 +369,17 @@ def main():
                 print("新規学習を開始します\n")
                 args.load_model = False
     
+    # 複数プロセスの学習では、ランク0の重みを全プロセスに配る（乱数で初期化した重みはプロセスごとに違う）
+    nnet.broadcast_weights()
+    
+    # 推論入力のバッファを先に確保しておく（MCTSの推論ごとにテンソルを作らない）
+    nnet.prealloc_eval_buffer(args.mcts_batch_size)
+    
+    # CUDAとcuDNNのウォームアップ（MCTSの推論と学習で使うバッチサイズの形を先に選ばせる）
+    if torch.cuda.is_available():
+        print("CUDAのウォームアップ中...")
+        nnet.warmup(list(range(1, args.mcts_batch_size + 1)) + [args.batch_size])
+    
     # Coachの作成
     c = Coach(game, nnet, args)
     
@@ -277,6 +403,9 @@ def main():
         import traceback
         traceback.print_exc()
     
+    if DISTRIBUTED:
+        dist.destroy_process_group()
+    
     print("\n" + "=" * 70)
     print("学習完了")
     print("=" * 70)
@@ -0,0 +1,114 @@
+"""
+MCTSの数値計算カーネル
+
+DepthLimitedMCTSの行動選択（PUCT）と温度の適用を、配列に対する関数として切り出したもの。
+Numbaがインストールされていればネイティブコードにコンパイルし、
+なければNumPyで同じ計算を行う（Numbaは任意の依存）
+"""
+
+import numpy as np
+
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+
+if NUMBA_AVAILABLE:
+    @njit(cache=True)
+    def select_action(q, n, p, valids, coef):
+        """
+        PUCTの値 q + coef * p / (1 + n) が最大の合法なアクションを返す
+
+        一時配列を作らずに1回のループで最大値を求める
+
+        Args:
+            q: Q値の配列
+            n: 訪問回数の配列
+            p: 方策（事前確率）の配列
+            valids: 合法手のマスク（0=非合法）
+            coef: cpuct * sqrt(状態の訪問回数)
+
+        Returns:
+            選択したアクション（合法手がなければ-1）
+        """
+        best_value = -np.inf
+        best_action = -1
+        for a in range(q.shape[0]):
+            if valids[a] != 0:
+                u = q[a] + coef * p[a] / (1.0 + n[a])
+                if u > best_value:
+                    best_value = u
+                    best_action = a
+        return best_action
+
+    @njit(cache=True)
+    def apply_temperature(counts, inv_temp):
+        """
+        訪問回数に温度を適用して確率分布にする
+
+        Args:
+            counts: 訪問回数の配列
+            inv_temp: 1 / 温度
+
+        Returns:
+            確率分布（訪問回数がすべて0なら均等分布）
+        """
+        size = counts.shape[0]
+        probs = np.empty(size, dtype=np.float64)
+        total = 0.0
+        for a in range(size):
+            x = float(counts[a]) ** inv_temp
+            probs[a] = x
+            total += x
+        if total > 0:
+            for a in range(size):
+                probs[a] /= total
+        else:
+            for a in range(size):
+                probs[a] = 1.0 / size
+        return probs
+
+else:
+    def select_action(q, n, p, valids, coef):
+        """
+        PUCTの値 q + coef * p / (1 + n) が最大の合法なアクションを返す
+
+        Args:
+            q: Q値の配列
+            n: 訪問回数の配列
+            p: 方策（事前確率）の配列
+            valids: 合法手のマスク（0=非合法）
+            coef: cpuct * sqrt(状態の訪問回数)
+
+        Returns:
+            選択したアクション（合法手がなければ-1）
+        """
+        # 方策がfloat32でもQ値と同じfloat64で計算し、配列の演算はその場で行う
+        u = np.multiply(p, coef, dtype=np.float64)
+        u /= n + 1
+        u += q
+        u[valids == 0] = -np.inf  # 非合法手は選ばない
+
+        best_action = int(np.argmax(u))
+        return best_action if u[best_action] > -np.inf else -1
+
+    def apply_temperature(counts, inv_temp):
+        """
+        訪問回数に温度を適用して確率分布にする
+
+        Args:
+            counts: 訪問回数の配列
+            inv_temp: 1 / 温度
+
+        Returns:
+            確率分布（訪問回数がすべて0なら均等分布）
+        """
+        probs = counts.astype(np.float64) ** inv_temp
+        total = probs.sum()
+        if total > 0:
+            probs /= total
+        else:
+            probs[:] = 1.0 / len(probs)
+        return probs
@@ -4,11 +4,60 @@ Alpha Zeroモデルのダウンロードとロード管理
 本番環境で自動的にモデルをダウンロードする機能を提供
 """
 
+import hashlib
 import os
 import urllib.request
+from contextlib import contextmanager
+from dataclasses import dataclass
+from functools import lru_cache
 from pathlib import Path
 from typing import Optional
 
+try:
+    import fcntl
+    FCNTL_AVAILABLE = True
+except ImportError:
+    # Windowsにはfcntlがない（その場合はロックしない）
+    FCNTL_AVAILABLE = False
+
+
+@dataclass(frozen=True)
+class _Env:
+    """モデルの読み込みに使う環境変数（_env() で1回だけ読む）"""
+    model_path: Optional[str]    # ALPHAZERO_MODEL_PATH
+    model_url: Optional[str]     # ALPHAZERO_MODEL_URL
+    model_sha256: Optional[str]  # ALPHAZERO_MODEL_SHA256（小文字）
+
+
+@contextmanager
+def _file_lock(path: str):
+    """
+    ファイルロック（同じファイルをロックする他のプロセスはここで待つ）
+    
+    Args:
+        path: ロックに使うファイルのパス
+    """
+    if not FCNTL_AVAILABLE:
+        yield
+        return
+    
+    with open(path, 'a') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+@lru_cache(maxsize=None)
+def _env() -> _Env:
+    """環境変数をまとめて読み、プロセス内でキャッシュする"""
+    return _Env(
+        model_path=os.getenv('ALPHAZERO_MODEL_PATH'),
+        model_url=os.getenv('ALPHAZERO_MODEL_URL'),
+        model_sha256=os.getenv('ALPHAZERO_MODEL_SHA256', '').strip().lower() or None,
+    )
+
 
 class ModelLoader:
     """モデルファイルを複数のソースから読み込む"""
@@ -16,6 +65,9 @@ class ModelLoader:
     # デフォルトのGitHubリリースURL
     DEFAULT_MODEL_URL = "https://github.com/Koyo46/wataru-to-dojo/releases/download/v1.0-alphazero-model/best.pth.tar"
     
+    # ダウンロード時に1回で読み込むサイズ（1MB）
+    CHUNK_SIZE = 1 << 20
+    
     @staticmethod
     def load_model_path(model_path: Optional[str] = None) -> str:
         """
@@ -28,6 +80,9 @@ class ModelLoader:
         4. 環境変数 ALPHAZERO_MODEL_URL からダウンロード
         5. デフォルトURLからダウンロード
         
+        見つけたパスはプロセス内でキャッシュし、2回目以降はファイルを探し直さない
+        （環境変数 ALPHAZERO_RELOAD=1 のときはキャッシュと読み込んだ環境変数を捨てて探し直す）
+        
         Args:
             model_path: モデルファイルのパス（オプション）
             
@@ -37,49 +92,12 @@ class ModelLoader:
         Raises:
             FileNotFoundError: モデルが見つからずダウンロードもできない場合
         """
-        # 1. 引数で指定されたパスを確認
-        if model_path and os.path.exists(model_path):
-            print(f"[OK] モデル発見（引数指定）: {model_path}")
-            return model_path
-        
-        # 2. 環境変数で指定されたパスを確認
-        env_path = os.getenv('ALPHAZERO_MODEL_PATH')
-        if env_path and os.path.exists(env_path):
-            print(f"[OK] モデル発見（環境変数）: {env_path}")
-            return env_path
-        
-        # 3. デフォルトのローカルパスを確認（開発環境用）
-        local_paths = [
-            'alpha_zero/models/best.pth.tar',
-            'backend/alpha_zero/models/best.pth.tar',
-            os.path.join(os.path.dirname(__file__), 'models', 'best.pth.tar'),
-        ]
-        
-        for path in local_paths:
-            if os.path.exists(path):
-                print(f"[OK] モデル発見（ローカル）: {path}")
-                return path
-        
-        # 4. リモートからダウンロード
-        print("[INFO] ローカルにモデルが見つかりません")
-        print("[INFO] リモートからモデルをダウンロードします...")
-        
-        # ダウンロード先パス（本番環境では /tmp を使用）
-        download_path = os.getenv('ALPHAZERO_MODEL_PATH', '/tmp/alphazero/best.pth.tar')
-        
-        # ダウンロード元URL
-        remote_url = os.getenv('ALPHAZERO_MODEL_URL', ModelLoader.DEFAULT_MODEL_URL)
+        if os.getenv('ALPHAZERO_RELOAD') == '1':
+            _env.cache_clear()
+            _resolve_model_path.cache_clear()
         
-        try:
-            return ModelLoader._download(remote_url, download_path)
-        except Exception as e:
-            raise FileNotFoundError(
-                f"モデルファイルが見つからず、ダウンロードも失敗しました: {e}\n"
-                f"以下のいずれかを設定してください:\n"
-                f"1. ALPHAZERO_MODEL_PATH環境変数（ローカルパス）\n"
-                f"2. ALPHAZERO_MODEL_URL環境変数（ダウンロードURL）\n"
-                f"デフォルトURL: {ModelLoader.DEFAULT_MODEL_URL}"
-            )
+        env = _env()
+        return _resolve_model_path(model_path, env.model_path, env.model_url)
     
     @staticmethod
     def _download(url: str, local_path: str) -> str:
@@ -96,47 +114,218 @@ class ModelLoader:
         Raises:
             Exception: ダウンロード失敗時
         """
-        # 既にファイルがある場合はスキップ
+        # 期待するハッシュ値（環境変数 ALPHAZERO_MODEL_SHA256、未設定なら照合しない）
+        expected_sha256 = _env().model_sha256
+        
+        # 既に検証済みのファイルがある場合はスキップ
+        stale_mtime = None
         if os.path.exists(local_path):
             file_size = os.path.getsize(local_path)
-            if file_size > 1000000:  # 1MB以上なら有効なファイルとみなす
+            if ModelLoader._is_verified(local_path, expected_sha256):
                 print(f"[OK] モデルは既に存在: {local_path} ({file_size / 1024 / 1024:.1f} MB)")
                 return local_path
+            print(f"[WARNING] 既存のモデルを検証できないため、ダウンロードし直します: {local_path}")
+            stale_mtime = os.stat(local_path).st_mtime_ns
         
         # ディレクトリを作成
         Path(local_path).parent.mkdir(parents=True, exist_ok=True)
         
+        # 複数のプロセスが同時に同じ場所へダウンロードしないよう、ロックを取ってから行う
+        with _file_lock(local_path + '.lock'):
+            # ロックを待つ間に他のプロセスがダウンロードを終えていれば、それを使う
+            # （検証に失敗したファイルのままなら、もう一度は調べない）
+            if (os.path.exists(local_path)
+                    and os.stat(local_path).st_mtime_ns != stale_mtime
+                    and ModelLoader._is_verified(local_path, expected_sha256)):
+                print(f"[OK] モデルは既に存在: {local_path}")
+                return local_path
+            
+            return ModelLoader._fetch(url, local_path, expected_sha256)
+    
+    @staticmethod
+    def _fetch(url: str, local_path: str, expected_sha256: Optional[str]) -> str:
+        """
+        URLからファイルをダウンロードし、検証してから保存先に置く
+        
+        Args:
+            url: ダウンロード元URL
+            local_path: 保存先パス
+            expected_sha256: 期待するSHA-256（Noneなら照合しない）
+            
+        Returns:
+            ダウンロードしたファイルのパス
+        """
         print(f"[INFO] モデルをダウンロード中...")
         print(f"   URL: {url}")
         print(f"   保存先: {local_path}")
         
+        # 途中のファイルが本来のパスに残らないよう、一時ファイルに書いてから置き換える
+        tmp_path = local_path + '.part'
+        
         try:
-            # プログレスバー付きダウンロード
-            def report(count, block_size, total_size):
-                if total_size > 0:
-                    percent = min(int(count * block_size * 100 / total_size), 100)
-                    downloaded = count * block_size / 1024 / 1024
-                    total = total_size / 1024 / 1024
-                    print(f"\r   進捗: {percent}% ({downloaded:.1f}/{total:.1f} MB)", end='')
+            with urllib.request.urlopen(url) as response, open(tmp_path, 'wb') as f:
+                total_size = int(response.headers.get('Content-Length') or 0)
+                downloaded = 0
+                last_step = -1
+                sha256 = hashlib.sha256()
+                
+                # 1MBずつ読み込み、進捗は5%刻みでだけ表示する（表示のI/Oで遅くならないように）
+                while True:
+                    chunk = response.read(ModelLoader.CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    f.write(chunk)
+                    sha256.update(chunk)
+                    downloaded += len(chunk)
+                    
+                    if total_size > 0:
+                        step = min(downloaded * 100 // total_size, 100) // 5
+                        if step != last_step:
+                            last_step = step
+                            print(f"\r   進捗: {step * 5}% ({downloaded / 1024 / 1024:.1f}/{total_size / 1024 / 1024:.1f} MB)", end='')
             
-            urllib.request.urlretrieve(url, local_path, reporthook=report)
-            print(f"\n[OK] ダウンロード完了: {local_path}")
+            # 途中で切れていないか確認
+            if total_size > 0 and downloaded != total_size:
+                raise Exception(f"ダウンロードが途中で終了しました ({downloaded}/{total_size} bytes)")
             
             # ファイルサイズを確認
-            file_size = os.path.getsize(local_path)
-            print(f"   ファイルサイズ: {file_size / 1024 / 1024:.1f} MB")
+            if downloaded < 100000:  # 100KB未満は異常
+                raise Exception(f"ダウンロードしたファイルが小さすぎます ({downloaded} bytes)")
             
-            if file_size < 100000:  # 100KB未満は異常
-                raise Exception(f"ダウンロードしたファイルが小さすぎます ({file_size} bytes)")
+            # ハッシュ値を照合
+            digest = sha256.hexdigest()
+            if expected_sha256 and digest != expected_sha256:
+                raise Exception(f"SHA-256が一致しません (期待値: {expected_sha256}, 実際: {digest})")
+            
+            os.replace(tmp_path, local_path)
+            ModelLoader._write_sidecar(local_path, digest)
+            print(f"\n[OK] ダウンロード完了: {local_path}")
+            print(f"   ファイルサイズ: {downloaded / 1024 / 1024:.1f} MB")
+            print(f"   SHA-256: {digest}")
             
             return local_path
             
         except Exception as e:
             # ダウンロード失敗時、不完全なファイルを削除
-            if os.path.exists(local_path):
-                os.remove(local_path)
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
             print(f"\n[ERROR] ダウンロード失敗: {e}")
             raise
+    
+    @staticmethod
+    def _sha256(path: str) -> str:
+        """ファイルのSHA-256を1MBずつ読み込んで計算"""
+        sha256 = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(ModelLoader.CHUNK_SIZE), b''):
+                sha256.update(chunk)
+        return sha256.hexdigest()
+    
+    @staticmethod
+    def _write_sidecar(path: str, digest: str):
+        """
+        検証済みのハッシュ値をサイドカーファイル（<path>.sha256）に保存
+        
+        ファイルの更新時刻とサイズも一緒に保存し、変わっていなければ次回は計算し直さない
+        """
+        stat = os.stat(path)
+        with open(path + '.sha256', 'w') as f:
+            f.write(f"{digest} {stat.st_mtime_ns} {stat.st_size}\n")
+    
+    @staticmethod
+    def _is_verified(path: str, expected_sha256: Optional[str] = None) -> bool:
+        """
+        既存のモデルファイルが正しいか確認
+        
+        サイドカーの更新時刻・サイズがファイルと一致すれば、保存したハッシュ値を使う（stat 1回で済む）。
+        一致しなければハッシュ値を計算し直し、期待値があれば照合する
+        
+        Args:
+            path: モデルファイルのパス
+            expected_sha256: 期待するSHA-256（Noneなら照合しない）
+            
+        Returns:
+            そのまま使ってよければTrue
+        """
+        stat = os.stat(path)
+        
+        try:
+            with open(path + '.sha256') as f:
+                digest, mtime_ns, size = f.read().split()
+            if int(mtime_ns) == stat.st_mtime_ns and int(size) == stat.st_size:
+                return expected_sha256 is None or digest == expected_sha256
+        except (OSError, ValueError):
+            pass
+        
+        if expected_sha256 is None:
+            # 照合する値がなければ、以前と同じくサイズだけで判断する
+            if stat.st_size <= 1000000:  # 1MB以下は不完全なファイルとみなす
+                return False
+            ModelLoader._write_sidecar(path, ModelLoader._sha256(path))
+            return True
+        
+        digest = ModelLoader._sha256(path)
+        if digest != expected_sha256:
+            return False
+        ModelLoader._write_sidecar(path, digest)
+        return True
+
+
+@lru_cache(maxsize=None)
+def _resolve_model_path(model_path: Optional[str], env_path: Optional[str], env_url: Optional[str]) -> str:
+    """
+    ModelLoader.load_model_path() の本体（引数と環境変数の組ごとに結果をキャッシュ）
+    
+    Args:
+        model_path: 引数で指定されたモデルファイルのパス
+        env_path: 環境変数 ALPHAZERO_MODEL_PATH の値
+        env_url: 環境変数 ALPHAZERO_MODEL_URL の値
+        
+    Returns:
+        利用可能なモデルファイルのパス
+    """
+    # 1. 引数で指定されたパスを確認
+    if model_path and os.path.exists(model_path):
+        print(f"[OK] モデル発見（引数指定）: {model_path}")
+        return model_path
+    
+    # 2. 環境変数で指定されたパスを確認
+    if env_path and os.path.exists(env_path):
+        print(f"[OK] モデル発見（環境変数）: {env_path}")
+        return env_path
+    
+    # 3. デフォルトのローカルパスを確認（開発環境用）
+    local_paths = [
+        'alpha_zero/models/best.pth.tar',
+        'backend/alpha_zero/models/best.pth.tar',
+        os.path.join(os.path.dirname(__file__), 'models', 'best.pth.tar'),
+    ]
+    
+    path = next((p for p in local_paths if os.path.exists(p)), None)
+    if path:
+        print(f"[OK] モデル発見（ローカル）: {path}")
+        return path
+    
+    # 4. リモートからダウンロード
+    print("[INFO] ローカルにモデルが見つかりません")
+    print("[INFO] リモートからモデルをダウンロードします...")
+    
+    # ダウンロード先パス（本番環境では /tmp を使用）
+    download_path = env_path or '/tmp/alphazero/best.pth.tar'
+    
+    # ダウンロード元URL
+    remote_url = env_url or ModelLoader.DEFAULT_MODEL_URL
+    
+    try:
+        return ModelLoader._download(remote_url, download_path)
+    except Exception as e:
+        raise FileNotFoundError(
+            f"モデルファイルが見つからず、ダウンロードも失敗しました: {e}\n"
+            f"以下のいずれかを設定してください:\n"
+            f"1. ALPHAZERO_MODEL_PATH環境変数（ローカルパス）\n"
+            f"2. ALPHAZERO_MODEL_URL環境変数（ダウンロードURL）\n"
+            f"デフォルトURL: {ModelLoader.DEFAULT_MODEL_URL}"
+        )
 
 
 def test_model_loader():
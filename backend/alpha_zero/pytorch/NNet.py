@@ -4,13 +4,17 @@
 alpha-zero-generalのNeuralNet抽象クラスに準拠した実装
 """
 
+import json
 import os
 import sys
 import time
 import numpy as np
 import torch
+import torch.nn as nn
+import torch.nn.functional as F
 import torch.optim as optim
-from torch.utils.data import Dataset, DataLoader
+import torch.distributed as dist
+from torch.nn.parallel import DistributedDataParallel as DDP
 
 # 親ディレクトリをパスに追加
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
@@ -18,28 +22,6 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(
 from alpha_zero.pytorch.WataruToNNet import WataruToNNet
 
 
-class WataruToDataset(Dataset):
-    """
-    学習データセット
-    
-    自己対戦で得られたデータを効率的にバッチ処理
-    """
-    
-    def __init__(self, examples):
-        """
-        Args:
-            examples: [(board, pi, v), ...] のリスト
-        """
-        self.examples = examples
-    
-    def __len__(self):
-        return len(self.examples)
-    
-    def __getitem__(self, idx):
-        board, pi, v = self.examples[idx]
-        return board, pi, v
-
-
 class NNetWrapper:
     """
     ニューラルネットワークのラッパークラス
@@ -66,6 +48,14 @@ class NNetWrapper:
             'cuda': torch.cuda.is_available(),
             'num_channels': 128,
             'num_res_blocks': 8,
+            'fp16_inference': False,  # 推論時にCUDAでFP16（autocast）を使うか
+            'inference_dtype': 'float16',  # fp16_inference時の型（'float16' または Ampere以降向けの 'bfloat16'）
+            'amp_training': False,  # 学習時にCUDAで混合精度（BF16、非対応GPUではFP16）を使うか
+            'tf32': True,  # CUDAでFP32の行列積・畳み込みをTF32で計算するか（Ampere以降で有効）
+            'compile': False,  # CUDAでネットワークを torch.compile するか（Tritonが必要）
+            'channels_last': False,  # CUDAで畳み込みをNHWC（channels_last）の配置で計算するか
+            'int8_inference': False,  # CPUの自己対戦でINT8に量子化したモデルで推論するか
+            'distributed': False,  # torchrunで起動した複数プロセスでDDPを使って学習するか（プロセスグループはmain.pyで初期化）
         }
         
         self.args = {**default_args, **(args or {})}
@@ -81,9 +71,49 @@ class NNetWrapper:
         # CUDA対応
         if self.args['cuda']:
             self.nnet.cuda()
+            
+            # 入力の形は (batch, 6, size, size) で固定なので、cuDNNに形ごとの最速のアルゴリズムを選ばせる
+            torch.backends.cudnn.benchmark = True
+            tf32 = bool(self.args['tf32'])
+            torch.backends.cuda.matmul.allow_tf32 = tf32
+            torch.backends.cudnn.allow_tf32 = tf32
+            torch.set_float32_matmul_precision('high' if tf32 else 'highest')
+        
+        # 重みと入力のメモリ配置。channels_lastならTensorコアのNHWCの畳み込みをcuDNN内の並べ替えなしで使える
+        self.memory_format = torch.contiguous_format
+        if self.args['cuda'] and self.args.get('channels_last', False):
+            self.memory_format = torch.channels_last
+            self.nnet.to(memory_format=self.memory_format)
+        
+        # 順伝播に使うモジュール。compileが有効なら畳み込み・BatchNorm・ReLUなどを融合したものを使う
+        # （重みは self.nnet と共有するので、保存・読み込みは self.nnet のまま行う。
+        #   MCTSと学習でバッチサイズが変わるたびにコンパイルし直さないよう dynamic=True にする）
+        self.model = self.nnet
+        if self.args['cuda'] and self.args.get('compile', False):
+            self.model = torch.compile(self.nnet, dynamic=True)
+        
+        # 推論入力の使い回し用バッファ（prealloc_eval_buffer() で作る）
+        self._eval_buf = None
+        
+        # 推論専用の量子化モデル（quantize_for_inference() で作る。重みが変わると捨てる）
+        self.infer_model = None
+        
+        # 学習の混合精度。BF16はFP32と指数部の幅が同じなので損失のスケーリングは要らず、
+        # FP16の場合だけGradScalerで勾配のアンダーフローを防ぐ
+        self.amp_dtype = None
+        if self.args['cuda'] and self.args.get('amp_training', False):
+            self.amp_dtype = torch.bfloat16 if torch.cuda.is_bf16_supported() else torch.float16
+        use_scaler = self.amp_dtype == torch.float16
+        if hasattr(torch.amp, 'GradScaler'):
+            self.scaler = torch.amp.GradScaler('cuda', enabled=use_scaler)
+        else:
+            # torch.amp.GradScaler がない古いPyTorch
+            self.scaler = torch.cuda.amp.GradScaler(enabled=use_scaler)
         
         print(f"ニューラルネットワーク作成完了")
         print(f"  デバイス: {'CUDA' if self.args['cuda'] else 'CPU'}")
+        if self.amp_dtype is not None:
+            print(f"  学習の混合精度: {str(self.amp_dtype).replace('torch.', '')}")
         print(f"  チャンネル数: {self.args['num_channels']}")
         print(f"  残差ブロック数: {self.args['num_res_blocks']}")
         
@@ -96,40 +126,56 @@ class NNetWrapper:
         自己対戦データで学習
         
         Args:
-            examples: [(board, pi, v), ...] のリスト
-                     board: 盤面状態
-                     pi: MCTS探索結果（方策）
-                     v: 最終的な勝敗（価値）
+            examples: (X, Pi, V) の配列の組、または [(board, pi, v), ...] のリスト
+                     X / board: 盤面テンソル (N, 6, size, size)
+                     Pi / pi: MCTS探索結果（方策） (N, action_size)
+                     V / v: 最終的な勝敗（価値） (N,)
         """
         optimizer = optim.Adam(self.nnet.parameters(), lr=self.args['lr'])
+        self.infer_model = None  # 重みが変わるので、量子化したモデルは使えなくなる
+        
+        X, Pi, V = self._examples_to_arrays(examples)
+        num_examples = len(V)
+        batch_size = self.args['batch_size']
+        num_batches = (num_examples + batch_size - 1) // batch_size
+        
+        # 配列はテンソルに1回だけ変換しておく（メモリは共有するのでコピーはしない）
+        X_t = torch.from_numpy(X)
+        Pi_t = torch.from_numpy(Pi)
+        V_t = torch.from_numpy(V)
+        device = 'cuda' if self.args['cuda'] else 'cpu'
+        
+        # CUDAの場合はバッチをピン留めメモリに集めてから転送する（non_blockingで非同期に転送できる）
+        # 転送中のバッファに次のバッチを書き込まないよう、2組を交互に使う
+        pinned = None
+        if self.args['cuda']:
+            pinned = [
+                tuple(torch.empty((batch_size,) + t.shape[1:], dtype=t.dtype, pin_memory=True)
+                      for t in (X_t, Pi_t, V_t))
+                for _ in range(2)
+            ]
+        
+        # 複数プロセスの学習では、勾配をプロセス間で平均する（逆伝播と重ねてall-reduceされる）
+        # 作成時にランク0の重みが全プロセスに配られるので、学習の始めに重みがそろう
+        # 学習例はプロセスごとの自己対戦の結果をそのまま使う（DistributedSamplerで分けたのと同じになる）
+        model = self.model
+        if self._is_distributed():
+            model = DDP(self.nnet, device_ids=[torch.cuda.current_device()] if self.args['cuda'] else None)
+            
+            # 学習例の数はプロセスごとに違うので、全プロセスで同じバッチ数だけ学習する
+            # （バッチ数がずれると、all-reduceを待ったまま止まってしまう）
+            batches = torch.tensor([num_batches], device=device)
+            dist.all_reduce(batches, op=dist.ReduceOp.MIN)
+            num_batches = int(batches.item())
         
-        print(f"\n学習開始: {len(examples)}例")
-        
-        # デバッグ: 最初のサンプルをチェック
-        if len(examples) > 0:
-            sample_board, sample_pi, sample_v = examples[0]
-            print(f"デバッグ: サンプルデータの形状:")
-            print(f"  board type: {type(sample_board)}, shape: {np.array(sample_board).shape if isinstance(sample_board, (list, np.ndarray)) else 'N/A'}")
-            print(f"  pi type: {type(sample_pi)}, length: {len(sample_pi) if hasattr(sample_pi, '__len__') else 'N/A'}")
-            print(f"  v type: {type(sample_v)}, value: {sample_v}")
-            print(f"  期待されるアクション数: {self.action_size}")
-        
-        # カスタムcollate関数（データの形状を保証）
-        def custom_collate(batch):
-            boards = [item[0] for item in batch]
-            pis = [item[1] for item in batch]
-            vs = [item[2] for item in batch]
-            return boards, pis, vs
-        
-        # データセットとローダーの作成
-        dataset = WataruToDataset(examples)
-        dataloader = DataLoader(
-            dataset,
-            batch_size=self.args['batch_size'],
-            shuffle=True,
-            num_workers=0,  # Windowsでは0推奨
-            collate_fn=custom_collate  # カスタムcollate関数を使用
-        )
+        print(f"\n学習開始: {num_examples}例")
+        
+        # デバッグ: データの形状をチェック
+        print(f"デバッグ: 学習データの形状:")
+        print(f"  X shape: {X.shape}")
+        print(f"  Pi shape: {Pi.shape}")
+        print(f"  V shape: {V.shape}")
+        print(f"  期待されるアクション数: {self.action_size}")
         
         self.nnet.train()
         
@@ -143,11 +189,22 @@ class NNetWrapper:
             
             epoch_start = time.time()
             
-            for batch_idx, (boards, target_pis, target_vs) in enumerate(dataloader):
-                # データをテンソルに変換
-                boards = torch.FloatTensor(np.array(boards))
-                target_pis = torch.FloatTensor(np.array(target_pis))
-                target_vs = torch.FloatTensor(np.array(target_vs))
+            # エポックごとに添字をシャッフルし、テンソルからバッチを切り出す
+            perm = torch.randperm(num_examples)
+            
+            for batch_idx, start in enumerate(range(0, num_batches * batch_size, batch_size)):
+                idx = perm[start:start + batch_size]
+                
+                if pinned is None:
+                    boards = X_t.index_select(0, idx)
+                    target_pis = Pi_t.index_select(0, idx)
+                    target_vs = V_t.index_select(0, idx)
+                else:
+                    buf_x, buf_pi, buf_v = pinned[batch_idx % 2]
+                    n = len(idx)
+                    boards = torch.index_select(X_t, 0, idx, out=buf_x[:n])
+                    target_pis = torch.index_select(Pi_t, 0, idx, out=buf_pi[:n])
+                    target_vs = torch.index_select(V_t, 0, idx, out=buf_v[:n])
                 
                 # デバッグ: サイズチェック（最初のバッチのみ）
                 if batch_idx == 0 and epoch == 0:
@@ -158,20 +215,23 @@ class NNetWrapper:
                     print(f"  期待されるアクション数: {self.action_size}")
                 
                 # CUDA対応
-                if self.args['cuda']:
-                    boards = boards.cuda()
-                    target_pis = target_pis.cuda()
-                    target_vs = target_vs.cuda()
+                boards = boards.to(device, non_blocking=True).contiguous(memory_format=self.memory_format)
+                target_pis = target_pis.to(device, non_blocking=True)
+                target_vs = target_vs.to(device, non_blocking=True)
                 
-                # 順伝播
-                out_pi, out_v = self.nnet(boards)
+                # 順伝播（混合精度が有効なら畳み込みと全結合をBF16/FP16で計算する）
+                with torch.autocast('cuda', dtype=self.amp_dtype or torch.float16,
+                                    enabled=self.amp_dtype is not None):
+                    out_pi, out_v = model(boards)
+                out_pi = out_pi.float()
+                out_v = out_v.float()
                 
                 # デバッグ: 出力サイズチェック（最初のバッチのみ）
                 if batch_idx == 0 and epoch == 0:
                     print(f"  out_pi shape: {out_pi.shape}")
                     print(f"  out_v shape: {out_v.shape}")
                 
-                # 損失計算
+                # 損失計算（FP32で行う）
                 l_pi = self.loss_pi(target_pis, out_pi)
                 l_v = self.loss_v(target_vs, out_v)
                 total_loss = l_pi + l_v
@@ -181,10 +241,11 @@ class NNetWrapper:
                 v_losses.append(l_v.item())
                 total_losses.append(total_loss.item())
                 
-                # 逆伝播
-                optimizer.zero_grad()
-                total_loss.backward()
-                optimizer.step()
+                # 逆伝播（勾配は0で埋めずに捨てる。GradScalerが無効な場合は、そのまま backward() と step() になる）
+                optimizer.zero_grad(set_to_none=True)
+                self.scaler.scale(total_loss).backward()
+                self.scaler.step(optimizer)
+                self.scaler.update()
                 
                 batch_count += 1
             
@@ -199,6 +260,50 @@ class NNetWrapper:
         
         print("\n✅ 学習完了")
     
+    def broadcast_weights(self):
+        """
+        複数プロセスの学習で、ランク0の重みを全プロセスにそろえる
+        
+        DDPが重みをそろえるのは学習（train()）の始めなので、ネットワークの作成・読み込みの後に
+        呼んでおき、最初の自己対戦から全プロセスが同じネットワークを使うようにする
+        """
+        if not self._is_distributed():
+            return
+        
+        state = [None]
+        if dist.get_rank() == 0:
+            state[0] = {k: v.cpu() for k, v in self.nnet.state_dict().items()}
+        dist.broadcast_object_list(state, src=0)
+        self.nnet.load_state_dict(state[0])
+        self.infer_model = None
+    
+    def _is_distributed(self):
+        """複数プロセス（torchrun）で学習しているか（argsで有効にし、プロセスグループが初期化済みの場合）"""
+        return self.args['distributed'] and dist.is_available() and dist.is_initialized()
+    
+    def _examples_to_arrays(self, examples):
+        """
+        学習データを (X, Pi, V) のfloat32配列にそろえる
+        
+        (board, pi, v) のリスト（以前の形式で保存された学習例など）も受け付ける
+        
+        Args:
+            examples: (X, Pi, V) の配列の組、または [(board, pi, v), ...] のリスト
+        
+        Returns:
+            (X, Pi, V): 連続したfloat32配列（すでにそうなっていればコピーしない）
+        """
+        if isinstance(examples, tuple):
+            boards, pis, vs = examples
+        else:
+            boards = [e[0] for e in examples]
+            pis = [e[1] for e in examples]
+            vs = [e[2] for e in examples]
+        
+        return (np.ascontiguousarray(boards, dtype=np.float32),
+                np.ascontiguousarray(pis, dtype=np.float32),
+                np.ascontiguousarray(vs, dtype=np.float32))
+    
     def predict(self, board):
         """
         盤面の評価
@@ -210,38 +315,168 @@ class NNetWrapper:
             pi: 方策（確率分布）- numpy配列
             v: 価値（スカラー）- float
         """
-        # ボードをテンソルに変換
-        board_tensor = self.board_to_tensor(board)
-        board_tensor = torch.FloatTensor(board_tensor.astype(np.float32))
+        # ボードをテンソルに変換（バッチ次元付き）
+        board_tensor = self._boards_to_input([board])
         
-        if self.args['cuda']:
-            board_tensor = board_tensor.cuda()
+        self.nnet.eval()
+        model = self.model if self.infer_model is None else self.infer_model
+        with torch.inference_mode(), self._inference_autocast():
+            pi, v = model(board_tensor)
+        
+        # ロジットを確率に変換。FP16の出力はFP32に戻してから扱う
+        pi = torch.softmax(pi.float(), dim=1).cpu().numpy()[0]
+        v = v.float().cpu().numpy()[0][0]
+        
+        return pi, v
+    
+    def predict_batch(self, boards):
+        """
+        複数の盤面をまとめて評価（1回の順伝播で処理する）
         
-        # バッチ次元追加
-        board_tensor = board_tensor.unsqueeze(0)
+        MCTSの葉をまとめて評価するためのもの。GPUでは1盤面ずつ predict() を
+        呼ぶよりも、転送と順伝播の回数が減る分だけ速い
+        
+        Args:
+            boards: WataruToGameオブジェクトのリスト
+        
+        Returns:
+            pis: 方策（確率分布）- (len(boards), action_size) のnumpy配列
+            vs: 価値 - (len(boards),) のnumpy配列
+        """
+        # ボードをまとめてテンソルに変換 (batch, 6, size, size)
+        board_tensor = self._boards_to_input(boards)
         
         self.nnet.eval()
-        with torch.no_grad():
-            pi, v = self.nnet(board_tensor)
+        model = self.model if self.infer_model is None else self.infer_model
+        with torch.inference_mode(), self._inference_autocast():
+            pi, v = model(board_tensor)
         
-        # 確率に変換（log_softmax -> softmax）
-        pi = torch.exp(pi).cpu().numpy()[0]
-        v = v.cpu().numpy()[0][0]
+        # ロジットを確率に変換。FP16の出力はFP32に戻してから扱う
+        pis = torch.softmax(pi.float(), dim=1).cpu().numpy()
+        vs = v.float().cpu().numpy()[:, 0]
         
-        return pi, v
+        return pis, vs
+    
+    def prealloc_eval_buffer(self, max_batch):
+        """
+        推論入力のバッファを最初にまとめて確保する（CUDA使用時のみ）
+        
+        MCTSは1回に数盤面ずつ何度も推論するので、そのたびに入力テンソルを作らず、
+        GPU上のバッファと転送元のピン留めメモリに書き込んで使い回す。
+        max_batch より多い盤面を渡された場合は、これまでどおりその都度作る
+        
+        Args:
+            max_batch: 1回の推論でまとめる盤面数の上限（MCTSバッチサイズ）
+        """
+        if not self.args['cuda']:
+            return
+        
+        max_batch = max(int(max_batch), 1)
+        self._eval_buf = torch.empty((max_batch, 6, self.board_x, self.board_y), device='cuda',
+                                     memory_format=self.memory_format)
+        self._blocks_buf = torch.empty((max_batch, 2), device='cuda')
+        self._planes_host = torch.empty((max_batch, 4, self.board_x, self.board_y),
+                                        dtype=torch.uint8, pin_memory=True)
+        self._blocks_host = torch.empty((max_batch, 2), pin_memory=True)
+    
+    def warmup(self, batch_sizes):
+        """
+        CUDAとcuDNNのウォームアップ（CUDA使用時のみ）
+        
+        使う入力の形ごとにダミーの推論を1回ずつ行う。
+        cuDNNのアルゴリズム選択（cudnn.benchmarkは __init__ で有効にしてある）とCUDAの初期化を最初に済ませておき、
+        最初のイテレーションの時間（と残り時間の見積もり）が乱れないようにする。
+        評価モードで推論するだけなので、BatchNormの統計などの重みは変わらない
+        
+        Args:
+            batch_sizes: 推論するバッチサイズの並び
+        """
+        if not self.args['cuda']:
+            return
+        
+        self.nnet.eval()
+        with torch.inference_mode(), self._inference_autocast():
+            for batch_size in sorted(set(batch_sizes)):
+                # 実際の入力と同じメモリ配置で流す（cuDNNのアルゴリズムは配置ごとに選ばれる）
+                self.model(torch.zeros((batch_size, 6, self.board_x, self.board_y), device='cuda',
+                                       memory_format=self.memory_format))
+        torch.cuda.synchronize()
+    
+    def _boards_to_input(self, boards):
+        """
+        盤面のリストを推論用の入力テンソル (batch, 6, size, size) にする
+        
+        盤面ごとの配列を作って結合せず、確保した配列に直接書き込む。
+        CUDAの場合は、0/1の盤面4チャンネルをuint8、盤面全体で同じ値の
+        残りブロック2チャンネルを (batch, 2) のまま転送し、GPU上でfloat32に戻して
+        広げる（転送量が約1/5になる。ネットワークへの入力は同じ）
+        
+        Args:
+            boards: WataruToGameオブジェクトのリスト
+        
+        Returns:
+            入力テンソル（CUDA使用時はGPU上）
+        """
+        if not self.args['cuda']:
+            board_tensor = np.empty((len(boards), 6, self.board_x, self.board_y), dtype=np.float32)
+            for i, board in enumerate(boards):
+                self.game._fill_board_tensor(board, board_tensor[i])
+            return torch.from_numpy(board_tensor)
+        
+        batch = len(boards)
+        if self._eval_buf is not None and batch <= self._eval_buf.shape[0]:
+            # ピン留めメモリに書き込み、確保済みのGPUバッファへ非同期に転送する
+            # （前回の転送は推論結果を .cpu() で受け取った時点で終わっているので上書きしてよい）
+            planes = self._planes_host.numpy()
+            blocks = self._blocks_host.numpy()
+            for i, board in enumerate(boards):
+                self.game._fill_board_planes(board, planes[i])
+                blocks[i] = self.game._blocks_features(board)
+            
+            board_tensor = self._eval_buf[:batch]
+            board_tensor[:, :4].copy_(self._planes_host[:batch], non_blocking=True)
+            blocks_gpu = self._blocks_buf[:batch]
+            blocks_gpu.copy_(self._blocks_host[:batch], non_blocking=True)
+            board_tensor[:, 4:].copy_(blocks_gpu[:, :, None, None].expand(-1, -1, self.board_x, self.board_y))
+            return board_tensor
+        
+        planes = np.empty((len(boards), 4, self.board_x, self.board_y), dtype=np.uint8)
+        blocks = np.empty((len(boards), 2), dtype=np.float32)
+        for i, board in enumerate(boards):
+            self.game._fill_board_planes(board, planes[i])
+            blocks[i] = self.game._blocks_features(board)
+        
+        planes = torch.from_numpy(planes).cuda().float()
+        blocks = torch.from_numpy(blocks).cuda()
+        blocks = blocks[:, :, None, None].expand(-1, -1, self.board_x, self.board_y)
+        return torch.cat([planes, blocks], dim=1).contiguous(memory_format=self.memory_format)
+    
+    def _inference_autocast(self):
+        """
+        推論用のautocastコンテキスト
+        
+        fp16_inferenceが有効でCUDAを使う場合だけ、畳み込みと全結合をFP16（inference_dtypeが
+        'bfloat16'ならBF16）で計算する
+        （重みはFP32のまま保持し、BatchNormやsoftmaxはautocastがFP32で計算する）
+        """
+        enabled = bool(self.args['cuda'] and self.args.get('fp16_inference', False))
+        dtype = torch.bfloat16 if self.args.get('inference_dtype') == 'bfloat16' else torch.float16
+        return torch.autocast('cuda', dtype=dtype, enabled=enabled)
     
     def loss_pi(self, targets, outputs):
         """
         方策の損失（クロスエントロピー）
         
+        log_softmaxと目標方策との積和を1回の計算で行う
+        
         Args:
             targets: 目標方策（MCTS探索結果）
-            outputs: ネットワーク出力（log確率）
+            outputs: ネットワーク出力（ロジット）
         
         Returns:
             損失
         """
-        return -torch.sum(targets * outputs) / targets.size(0)
+        return F.cross_entropy(outputs, targets)
     
     def loss_v(self, targets, outputs):
         """
@@ -266,27 +501,45 @@ class NNetWrapper:
         """
         filepath = os.path.join(folder, filename)
         
+        # 複数プロセスの学習では重みは全プロセスで同じなので、ランク0だけが書き、
+        # ほかのプロセスは書き終わるのを待つ（直後に同じファイルを読み込めるように）
+        if self._is_distributed() and dist.get_rank() != 0:
+            dist.barrier()
+            return
+        
         # フォルダが存在しない場合は作成
         if not os.path.exists(folder):
             os.makedirs(folder)
         
         # モデルの状態を保存（ネットワーク構造情報も含める）
+        meta = {
+            'num_channels': self.args.get('num_channels', 64),
+            'num_res_blocks': self.args.get('num_res_blocks', 4),
+        }
         torch.save({
             'state_dict': self.nnet.state_dict(),
             'args': self.args,
-            'num_channels': self.args.get('num_channels', 64),
-            'num_res_blocks': self.args.get('num_res_blocks', 4),
+            **meta,
         }, filepath)
         
+        # 構造情報だけを読めるよう、小さなJSONにも書いておく（load_checkpoint_meta() で使う）
+        with open(filepath + '.meta.json', 'w') as f:
+            json.dump(meta, f)
+        
         print(f"✅ モデル保存: {filepath}")
+        
+        if self._is_distributed():
+            dist.barrier()
     
-    def load_checkpoint(self, folder='models', filename='checkpoint.pth.tar'):
+    def load_checkpoint(self, folder='models', filename='checkpoint.pth.tar', inference=False):
         """
         モデルの読み込み
         
         Args:
             folder: 読み込み元フォルダ
             filename: ファイル名
+            inference: 推論専用の読み込みか（Trueならテンソルと基本型だけを読む
+                weights_only で、ファイルをmmapして読み、学習用の値は読み込まない）
         """
         filepath = os.path.join(folder, filename)
         
@@ -295,12 +548,89 @@ class NNetWrapper:
         
         # CPUとCUDA両対応の読み込み
         map_location = None if self.args['cuda'] else 'cpu'
-        checkpoint = torch.load(filepath, map_location=map_location)
-        
-        self.nnet.load_state_dict(checkpoint['state_dict'])
+        self.infer_model = None
+        if not inference:
+            checkpoint = torch.load(filepath, map_location=map_location)
+            self.nnet.load_state_dict(checkpoint['state_dict'])
+        else:
+            try:
+                checkpoint = torch.load(filepath, map_location=map_location, mmap=True, weights_only=True)
+            except TypeError:
+                # mmap に対応していない古いPyTorch
+                checkpoint = torch.load(filepath, map_location=map_location)
+            
+            # BatchNormの num_batches_tracked は学習時にしか使わないので読み込まない
+            state_dict = {k: v for k, v in checkpoint['state_dict'].items()
+                          if not k.endswith('num_batches_tracked')}
+            missing, unexpected = self.nnet.load_state_dict(state_dict, strict=False)
+            
+            # 読み飛ばしてよいのは num_batches_tracked だけ（構造の違うモデルを一部だけ読み込まない）
+            missing = [k for k in missing if not k.endswith('num_batches_tracked')]
+            if missing or unexpected:
+                raise RuntimeError(
+                    f"モデルの構造が一致しません: {filepath}\n"
+                    f"  足りない重み: {missing}\n"
+                    f"  余分な重み: {unexpected}"
+                )
         
         print(f"✅ モデル読み込み: {filepath}")
     
+    def quantize_for_inference(self, int8_state_dict=None):
+        """
+        現在の重みをINT8に量子化した推論専用のモデルを作る（CPU推論のみ）
+        
+        predict() / predict_batch() はこのモデルを使うようになる。学習用の self.nnet はFP32のまま
+        残し、train() や load_checkpoint() で重みが変わると量子化したモデルは捨てる。
+        量子化するのは全結合層だけ（PyTorchの動的量子化は畳み込みとCUDAには対応していない）
+        
+        Args:
+            int8_state_dict: 保存しておいた量子化済みの重み（Noneなら self.nnet の重みを量子化する）
+        """
+        if self.args['cuda']:
+            return
+        
+        model = WataruToNNet(
+            self.game,
+            num_channels=self.args['num_channels'],
+            num_res_blocks=self.args['num_res_blocks'],
+            dropout=self.args['dropout']
+        )
+        if int8_state_dict is None:
+            model.load_state_dict(self.nnet.state_dict())
+        model.eval()
+        self.infer_model = torch.ao.quantization.quantize_dynamic(model, {nn.Linear}, dtype=torch.qint8)
+        if int8_state_dict is not None:
+            self.infer_model.load_state_dict(int8_state_dict)
+    
+    def load_int8_checkpoint(self, folder='models', filename='checkpoint.pth.tar'):
+        """
+        チェックポイントを読み込み、推論をINT8に量子化したモデルで行うようにする（CPU推論のみ）
+        
+        量子化は quantize_for_inference() で行い、self.nnet にはFP32の重みを読み込んでおく。
+        量子化した重みは <名前>.int8.pth に保存しておき、元のチェックポイントより新しければ
+        次回からはそれを推論用のモデルに読み込む
+        
+        Args:
+            folder: 読み込み元フォルダ
+            filename: ファイル名（FP32のチェックポイント）
+        """
+        if self.args['cuda']:
+            raise ValueError("INT8の量子化モデルはCPU推論でのみ使えます（cuda=False にしてください）")
+        
+        filepath = os.path.join(folder, filename)
+        base = filepath[:-len('.pth.tar')] if filepath.endswith('.pth.tar') else filepath
+        int8_path = base + '.int8.pth'
+        
+        self.load_checkpoint(folder, filename, inference=True)
+        
+        if os.path.exists(int8_path) and os.path.getmtime(int8_path) >= os.path.getmtime(filepath):
+            self.quantize_for_inference(torch.load(int8_path, map_location='cpu'))
+            print(f"✅ INT8モデル読み込み: {int8_path}")
+        else:
+            self.quantize_for_inference()
+            torch.save(self.infer_model.state_dict(), int8_path)
+            print(f"✅ INT8モデル作成: {int8_path}")
+    
     def board_to_tensor(self, board):
         """
         盤面をテンソル形式に変換
@@ -313,25 +643,38 @@ class NNetWrapper:
                    チャンネル0-3: 盤面（P1層1, P1層2, P-1層1, P-1層2）
                    チャンネル4-5: 残りブロック情報
         """
-        # 盤面の基本テンソル（4チャンネル）
-        board_tensor = board.get_board_as_tensor()  # (4, size, size)
-        board_tensor = np.array(board_tensor, dtype=np.float32)
-        
-        # 残りブロック情報（2チャンネル）を追加
-        blocks_channel = np.zeros((2, self.board_x, self.board_y), dtype=np.float32)
-        
-        # プレイヤー1の残りブロック情報
-        p1_blocks = board.player_blocks[1]
-        blocks_channel[0, :, :] = (p1_blocks.size4 + p1_blocks.size5) / 2.0
-        
-        # プレイヤー-1の残りブロック情報
-        p_neg1_blocks = board.player_blocks[-1]
-        blocks_channel[1, :, :] = (p_neg1_blocks.size4 + p_neg1_blocks.size5) / 2.0
-        
-        # 結合 (6, size, size)
-        full_tensor = np.concatenate([board_tensor, blocks_channel], axis=0)
-        
-        return full_tensor
+        # 変換はゲームラッパー（学習データの作成と同じ処理）に任せる
+        return self.game._board_to_tensor(board)
+
+
+def load_checkpoint_meta(filepath):
+    """
+    チェックポイントのネットワーク構造情報（チャンネル数・残差ブロック数）だけを読む
+    
+    保存時に書いたJSON（<filepath>.meta.json）がチェックポイントより新しければそれを読む。
+    なければチェックポイントをmmapで開き、重みのテンソルをメモリに読み込まずに取り出す
+    
+    Args:
+        filepath: チェックポイントのパス
+    
+    Returns:
+        {'num_channels': ..., 'num_res_blocks': ...}（記録がなければ値はNone）
+    """
+    meta_path = filepath + '.meta.json'
+    if os.path.exists(meta_path) and os.path.getmtime(meta_path) >= os.path.getmtime(filepath):
+        with open(meta_path) as f:
+            meta = json.load(f)
+    else:
+        try:
+            meta = torch.load(filepath, map_location='cpu', mmap=True, weights_only=True)
+        except TypeError:
+            # mmap に対応していない古いPyTorch
+            meta = torch.load(filepath, map_location='cpu')
+    
+    return {
+        'num_channels': meta.get('num_channels'),
+        'num_res_blocks': meta.get('num_res_blocks'),
+    }
 
 
 def test_wrapper():
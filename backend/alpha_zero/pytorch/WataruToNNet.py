@@ -135,7 +135,7 @@ class WataruToNNet(nn.Module):
                形状: (batch_size, 6, board_size, board_size)
         
         Returns:
-            pi: 方策（log確率）
+            pi: 方策（softmax前のロジット。確率にするのは損失関数・推論側で行う）
                 形状: (batch_size, action_size)
             v: 価値
                形状: (batch_size, 1)
@@ -152,19 +152,20 @@ class WataruToNNet(nn.Module):
         
         # ========== 方策ヘッド ==========
         pi = F.relu(self.bn_policy(self.conv_policy(s)))
-        pi = pi.view(-1, 16 * self.board_x * self.board_y)
+        # channels_lastの配置でもそのまま平坦化できるよう、viewではなくreshapeを使う
+        pi = pi.reshape(-1, 16 * self.board_x * self.board_y)
         pi = self.dropout(pi)
         pi = self.fc_policy(pi)
         
         # ========== 価値ヘッド ==========
         v = F.relu(self.bn_value(self.conv_value(s)))
-        v = v.view(-1, 16 * self.board_x * self.board_y)
+        v = v.reshape(-1, 16 * self.board_x * self.board_y)
         v = self.dropout(v)
         v = F.relu(self.fc_value1(v))
         v = self.fc_value2(v)
         
-        # 方策はlog_softmax、価値はtanhで正規化
-        return F.log_softmax(pi, dim=1), torch.tanh(v)
+        # 方策はロジットのまま返し（損失はcross_entropyでlog_softmaxとまとめて計算する）、価値はtanhで正規化
+        return pi, torch.tanh(v)
 
 
 def test_network():
@@ -208,7 +209,7 @@ def test_network():
     print(f"価値出力形状: {v.shape}")
     
     # 方策の確率への変換
-    probs = torch.exp(pi)
+    probs = torch.softmax(pi, dim=1)
     print(f"\n方策の合計（各バッチ）: {probs.sum(dim=1)}")
     print(f"価値の範囲: [{v.min().item():.3f}, {v.max().item():.3f}]")
     
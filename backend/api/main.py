@@ -34,6 +34,7 @@ def get_alpha_zero_player():
     - ALPHAZERO_MODEL_PATH: ローカルモデルファイルのパス
     - ALPHAZERO_MODEL_URL: リモートモデルのダウンロードURL
     - ALPHAZERO_MCTS_SIMS: MCTSシミュレーション回数（デフォルト: 50）
+    - ALPHAZERO_MCTS_BATCH: MCTSの葉をまとめて評価する数（デフォルト: 8）
     """
     global _alpha_zero_player
     if _alpha_zero_player is None:
@@ -42,13 +43,15 @@ def get_alpha_zero_player():
             
             # 環境変数からMCTSシミュレーション回数を取得
             num_sims = int(os.getenv('ALPHAZERO_MCTS_SIMS', '50'))
+            mcts_batch_size = int(os.getenv('ALPHAZERO_MCTS_BATCH', '8'))
             
             # model_path=None にすることで、ModelLoaderが自動的にパスを解決
             # （ローカル検索 → 環境変数 → ダウンロード）
             _alpha_zero_player = AlphaZeroPlayer(
                 model_path=None,  # 自動解決
                 num_mcts_sims=num_sims,
-                board_size=9
+                board_size=9,
+                mcts_batch_size=mcts_batch_size
             )
             print(f"[OK] Alpha Zero AIプレイヤー初期化完了 (MCTS sims: {num_sims})")
         except Exception as e:
@@ -83,8 +86,50 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+class GameSession:
+    """
+    ゲームセッション
+    
+    フロントエンドは状態や合法手を繰り返し取得（ポーリング）するので、
+    get_state() などの結果を手が進むまで使い回す。
+    ゲームを変更したら invalidate() を呼ぶこと
+    """
+    
+    def __init__(self, game: WataruToGame):
+        self.game = game
+        self.version = 0  # ゲームを変更するたびに増える
+        self.state_cache: Optional[Dict] = None
+        self.info_cache: Optional[Dict] = None
+        self.legal_cache: Optional[List[Dict]] = None
+    
+    def invalidate(self) -> None:
+        """ゲームを変更した後に呼び、キャッシュを捨てる"""
+        self.version += 1
+        self.state_cache = None
+        self.info_cache = None
+        self.legal_cache = None
+    
+    def state(self) -> Dict:
+        """game.get_state() の結果（キャッシュ付き）"""
+        if self.state_cache is None:
+            self.state_cache = self.game.get_state()
+        return self.state_cache
+    
+    def info(self) -> Dict:
+        """game.get_game_info() の結果（キャッシュ付き）"""
+        if self.info_cache is None:
+            self.info_cache = self.game.get_game_info()
+        return self.info_cache
+    
+    def legal_moves(self) -> List[Dict]:
+        """合法手を辞書にしたリスト（キャッシュ付き）"""
+        if self.legal_cache is None:
+            self.legal_cache = [move.to_dict() for move in self.game.get_legal_moves()]
+        return self.legal_cache
+
+
 # ゲームセッションを保存する辞書（本番環境ではRedisなどを使用）
-game_sessions: Dict[str, WataruToGame] = {}
+game_sessions: Dict[str, GameSession] = {}
 
 
 # === Pydantic Models ===
@@ -188,12 +233,12 @@ async def create_new_game(request: NewGameRequest):
         ゲームIDと初期状態
     """
     game_id = str(uuid.uuid4())
-    game = WataruToGame(board_size=request.board_size)
-    game_sessions[game_id] = game
+    session = GameSession(WataruToGame(board_size=request.board_size))
+    game_sessions[game_id] = session
     
     return NewGameResponse(
         game_id=game_id,
-        state=game.get_state()
+        state=session.state()
     )
 
 
@@ -211,12 +256,12 @@ async def get_game_state(game_id: str):
     if game_id not in game_sessions:
         raise HTTPException(status_code=404, detail="Game not found")
     
-    game = game_sessions[game_id]
+    session = game_sessions[game_id]
     
     return GameStateResponse(
         game_id=game_id,
-        state=game.get_state(),
-        info=game.get_game_info()
+        state=session.state(),
+        info=session.info()
     )
 
 
@@ -234,7 +279,8 @@ async def apply_move(request: ApplyMoveRequest):
     if request.game_id not in game_sessions:
         raise HTTPException(status_code=404, detail="Game not found")
     
-    game = game_sessions[request.game_id]
+    session = game_sessions[request.game_id]
+    game = session.game
     
     # MoveModelをMoveオブジェクトに変換
     try:
@@ -260,16 +306,18 @@ async def apply_move(request: ApplyMoveRequest):
         is_valid, error_msg = game.is_valid_move(move)
         return ApplyMoveResponse(
             success=False,
-            state=game.get_state(),
+            state=session.state(),
             message=f"Failed to apply move: {error_msg}"
         )
     
+    session.invalidate()
+    
     # 勝者チェック
     winner = game.check_winner()
     
     return ApplyMoveResponse(
         success=True,
-        state=game.get_state(),
+        state=session.state(),
         winner=winner,
         message="Move applied successfully"
     )
@@ -289,12 +337,11 @@ async def get_legal_moves(game_id: str):
     if game_id not in game_sessions:
         raise HTTPException(status_code=404, detail="Game not found")
     
-    game = game_sessions[game_id]
-    legal_moves = game.get_legal_moves()
+    legal_moves = game_sessions[game_id].legal_moves()
     
     return LegalMovesResponse(
         game_id=game_id,
-        legal_moves=[move.to_dict() for move in legal_moves],
+        legal_moves=legal_moves,
         count=len(legal_moves)
     )
 
@@ -313,7 +360,7 @@ async def get_ai_move(request: AIMovesRequest):
     if request.game_id not in game_sessions:
         raise HTTPException(status_code=404, detail="Game not found")
     
-    game = game_sessions[request.game_id]
+    game = game_sessions[request.game_id].game
     
     # 現在のプレイヤーチェック
     if game.current_player != request.player:
@@ -375,7 +422,7 @@ async def get_alpha_zero_move(request: AIMovesRequest):
     if request.game_id not in game_sessions:
         raise HTTPException(status_code=404, detail="Game not found")
     
-    game = game_sessions[request.game_id]
+    game = game_sessions[request.game_id].game
     
     # 現在のプレイヤーチェック
     if game.current_player != request.player:
@@ -439,12 +486,13 @@ async def reset_game(game_id: str):
     if game_id not in game_sessions:
         raise HTTPException(status_code=404, detail="Game not found")
     
-    game = game_sessions[game_id]
-    game.reset()
+    session = game_sessions[game_id]
+    session.game.reset()
+    session.invalidate()
     
     return {
         "game_id": game_id,
-        "state": game.get_state(),
+        "state": session.state(),
         "message": "Game reset successfully"
     }
 
@@ -463,15 +511,17 @@ async def undo_move(game_id: str):
     if game_id not in game_sessions:
         raise HTTPException(status_code=404, detail="Game not found")
     
-    game = game_sessions[game_id]
-    success = game.undo_last_move()
+    session = game_sessions[game_id]
+    success = session.game.undo_last_move()
     
     if not success:
         raise HTTPException(status_code=400, detail="No moves to undo")
     
+    session.invalidate()
+    
     return {
         "game_id": game_id,
-        "state": game.get_state(),
+        "state": session.state(),
         "message": "Move undone successfully"
     }
 
@@ -508,10 +558,10 @@ async def list_games():
     """
     games_info = []
     
-    for game_id, game in game_sessions.items():
+    for game_id, session in game_sessions.items():
         games_info.append({
             "game_id": game_id,
-            "info": game.get_game_info()
+            "info": session.info()
         })
     
     return {
@@ -534,8 +584,7 @@ async def export_game_record(game_id: str):
     if game_id not in game_sessions:
         raise HTTPException(status_code=404, detail="Game not found")
     
-    game = game_sessions[game_id]
-    record = game.export_game_record()
+    record = game_sessions[game_id].game.export_game_record()
     
     return {
         "game_id": game_id,
@@ -4,8 +4,41 @@
 ゲームの盤面状態を管理するクラスを提供します。
 """
 
-from typing import List, Tuple, Literal, Optional
-import copy
+from typing import TYPE_CHECKING, Dict, List, Tuple, Literal, Optional
+import random
+
+if TYPE_CHECKING:
+    from .move import Position
+
+
+# Zobristハッシュ用の乱数表（盤面サイズごとに1度だけ生成して共有）
+_ZOBRIST_TABLES: Dict[int, List[Tuple[int, int, int]]] = {}
+
+
+def get_zobrist_table(size: int) -> List[Tuple[int, int, int]]:
+    """
+    盤面サイズに対応するZobrist乱数表を取得
+    
+    table[(row * size + col) * 2 + layer][value] でキーを引く。
+    各要素は (0, 水色のキー, ピンクのキー) のタプルなので、
+    value=1 は index 1、value=-1 は末尾（index 2）、空(0)は0になる。
+    
+    Args:
+        size: 盤面のサイズ
+    
+    Returns:
+        Zobrist乱数表
+    """
+    table = _ZOBRIST_TABLES.get(size)
+    if table is None:
+        # プロセス間でも同じハッシュになるよう、サイズを種にした固定乱数で生成
+        rng = random.Random(size)
+        table = [
+            (0, rng.getrandbits(64), rng.getrandbits(64))
+            for _ in range(size * size * 2)
+        ]
+        _ZOBRIST_TABLES[size] = table
+    return table
 
 
 class Board:
@@ -24,6 +57,27 @@ class Board:
         self.board: List[List[List[int]]] = [
             [[0, 0] for _ in range(size)] for _ in range(size)
         ]
+        # 盤面のZobristハッシュ（set_cell()で差分更新する）
+        self._zobrist_table = get_zobrist_table(size)
+        self.zobrist_hash = 0
+    
+    def compute_zobrist_hash(self) -> int:
+        """
+        盤面全体からZobristハッシュを計算し直す
+        
+        Returns:
+            盤面のZobristハッシュ
+        """
+        table = self._zobrist_table
+        size = self.size
+        h = 0
+        for row in range(size):
+            for col in range(size):
+                layer1, layer2 = self.board[row][col]
+                index = (row * size + col) * 2
+                h ^= table[index][layer1] ^ table[index + 1][layer2]
+        self.zobrist_hash = h
+        return h
     
     def get_cell(self, row: int, col: int) -> Tuple[int, int]:
         """
@@ -60,7 +114,32 @@ class Board:
         if value not in [0, 1, -1]:
             raise ValueError(f"Invalid value: {value}")
         
-        self.board[row][col][layer] = value
+        cell = self.board[row][col]
+        keys = self._zobrist_table[(row * self.size + col) * 2 + layer]
+        self.zobrist_hash ^= keys[cell[layer]] ^ keys[value]
+        cell[layer] = value
+    
+    def set_path(self, path: List["Position"], value: Literal[0, 1, -1]) -> None:
+        """
+        手のマスにまとめて値を設定（検証済みの手用の高速版）
+        
+        set_cell() の範囲・値チェックを省き、Zobristハッシュの差分更新だけを行う
+        
+        Args:
+            path: 設定するマスのリスト（row, col, layer を持つ Position）
+            value: 設定する値（0: 空, 1: 水色, -1: ピンク）
+        """
+        board = self.board
+        table = self._zobrist_table
+        size = self.size
+        h = self.zobrist_hash
+        for pos in path:
+            layer = pos.layer
+            cell = board[pos.row][pos.col]
+            keys = table[(pos.row * size + pos.col) * 2 + layer]
+            h ^= keys[cell[layer]] ^ keys[value]
+            cell[layer] = value
+        self.zobrist_hash = h
     
     def is_valid_position(self, row: int, col: int) -> bool:
         """位置が盤面内かどうかをチェック"""
@@ -127,53 +206,133 @@ class Board:
         """
         プレイヤーが橋を完成させたかチェック（勝利判定）
         
+        プレイアウトでは手を打つたびに呼ばれる最も重い処理なので、
+        メソッド呼び出しを使わず盤面を直接参照する
+        
         Args:
             player: プレイヤー（1: 水色は上下、-1: ピンクは左右）
             
         Returns:
             橋が完成している場合True
         """
-        visited = [[False] * self.size for _ in range(self.size)]
+        size = self.size
+        board = self.board
+        last = size - 1
+        
+        # ゴール側の端に自分の色がなければ橋は完成しえない（大半の局面はここで判定できる）
+        if player == 1:
+            goal_row = board[last]
+            if not any(cell[0] == player or cell[1] == player for cell in goal_row):
+                return False
+        else:
+            if not any(row[last][0] == player or row[last][1] == player for row in board):
+                return False
+        
+        # 訪問済みフラグは row * size + col の1次元リストで持つ
+        visited = [False] * (size * size)
         stack = []
         
         # スタート地点を探す
         if player == 1:
             # 水色は上の端（row=0）からスタート
-            for col in range(self.size):
-                if self.has_player_color(0, col, player):
+            for col, cell in enumerate(board[0]):
+                if cell[0] == player or cell[1] == player:
                     stack.append((0, col))
-                    visited[0][col] = True
+                    visited[col] = True
         else:
             # ピンクは左の端（col=0）からスタート
-            for row in range(self.size):
-                if self.has_player_color(row, 0, player):
+            for row in range(size):
+                cell = board[row][0]
+                if cell[0] == player or cell[1] == player:
                     stack.append((row, 0))
-                    visited[row][0] = True
+                    visited[row * size] = True
         
         # 深さ優先探索で反対側まで到達できるかチェック
-        directions = [(1, 0), (-1, 0), (0, 1), (0, -1)]  # 下、上、右、左
-        
         while stack:
             row, col = stack.pop()
             
             # ゴール判定
-            if player == 1 and row == self.size - 1:
-                return True  # 水色: 下端に到達
-            if player == -1 and col == self.size - 1:
+            if player == 1:
+                if row == last:
+                    return True  # 水色: 下端に到達
+            elif col == last:
                 return True  # ピンク: 右端に到達
             
-            # 4方向を探索
-            for dr, dc in directions:
-                nr, nc = row + dr, col + dc
+            # 4方向（下、上、右、左）を探索
+            index = row * size + col
+            if row < last and not visited[index + size]:
+                cell = board[row + 1][col]
+                if cell[0] == player or cell[1] == player:
+                    visited[index + size] = True
+                    stack.append((row + 1, col))
+            if row > 0 and not visited[index - size]:
+                cell = board[row - 1][col]
+                if cell[0] == player or cell[1] == player:
+                    visited[index - size] = True
+                    stack.append((row - 1, col))
+            if col < last and not visited[index + 1]:
+                cell = board[row][col + 1]
+                if cell[0] == player or cell[1] == player:
+                    visited[index + 1] = True
+                    stack.append((row, col + 1))
+            if col > 0 and not visited[index - 1]:
+                cell = board[row][col - 1]
+                if cell[0] == player or cell[1] == player:
+                    visited[index - 1] = True
+                    stack.append((row, col - 1))
+        
+        return False
+    
+    def get_max_span(self, player: Literal[1, -1]) -> int:
+        """
+        プレイヤーの連結したマスのまとまりが、勝利方向に何行（何列）分広がっているか
+        
+        水色は上下（行方向）、ピンクは左右（列方向）の広がりを数える。
+        check_bridge() と同じ4近傍の連結で、盤面サイズと等しければ橋が完成している
+        
+        Args:
+            player: プレイヤー（1: 水色は上下、-1: ピンクは左右）
+            
+        Returns:
+            最も広がったまとまりの行数（列数）。マスがなければ0
+        """
+        size = self.size
+        board = self.board
+        visited = [[False] * size for _ in range(size)]
+        axis = 0 if player == 1 else 1  # 水色は行、ピンクは列の範囲を見る
+        max_span = 0
+        
+        for start_row in range(size):
+            for start_col in range(size):
+                if visited[start_row][start_col]:
+                    continue
+                layer1, layer2 = board[start_row][start_col]
+                if layer1 != player and layer2 != player:
+                    continue
                 
-                if (self.is_valid_position(nr, nc) and 
-                    not visited[nr][nc] and 
-                    self.has_player_color(nr, nc, player)):
+                # 深さ優先探索でまとまりの範囲を求める
+                visited[start_row][start_col] = True
+                stack = [(start_row, start_col)]
+                low = high = (start_row, start_col)[axis]
+                while stack:
+                    row, col = stack.pop()
+                    coordinate = (row, col)[axis]
+                    if coordinate < low:
+                        low = coordinate
+                    elif coordinate > high:
+                        high = coordinate
                     
-                    visited[nr][nc] = True
-                    stack.append((nr, nc))
+                    for nr, nc in ((row + 1, col), (row - 1, col), (row, col + 1), (row, col - 1)):
+                        if 0 <= nr < size and 0 <= nc < size and not visited[nr][nc]:
+                            cell = board[nr][nc]
+                            if cell[0] == player or cell[1] == player:
+                                visited[nr][nc] = True
+                                stack.append((nr, nc))
+                
+                if high - low + 1 > max_span:
+                    max_span = high - low + 1
         
-        return False
+        return max_span
     
     def get_neighbors(self, row: int, col: int) -> List[Tuple[int, int]]:
         """
@@ -240,12 +399,17 @@ class Board:
         """辞書から盤面を復元"""
         board = cls(size=data["size"])
         board.board = [[cell[:] for cell in row] for row in data["board"]]
+        board.compute_zobrist_hash()
         return board
     
     def clone(self) -> "Board":
         """盤面のディープコピーを作成"""
-        new_board = Board(self.size)
-        new_board.board = copy.deepcopy(self.board)
+        # 空盤面の生成とdeepcopyの汎用処理を避け、セルのリストだけを複製する
+        new_board = Board.__new__(Board)
+        new_board.size = self.size
+        new_board.board = [[cell[:] for cell in row] for row in self.board]
+        new_board._zobrist_table = self._zobrist_table
+        new_board.zobrist_hash = self.zobrist_hash
         return new_board
     
     def reset(self) -> None:
@@ -253,6 +417,7 @@ class Board:
         self.board = [
             [[0, 0] for _ in range(self.size)] for _ in range(self.size)
         ]
+        self.zobrist_hash = 0
     
     def count_tiles(self, player: Literal[1, -1]) -> dict:
         """
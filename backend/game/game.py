@@ -98,6 +98,10 @@ class WataruToGame:
             # 合法手キャッシュ
             self._legal_moves_cache: Optional[List[Move]] = None
             self._cache_valid = False
+            # キャッシュを生成したときの手番（current_playerを直接書き換えた場合に誤用しないため）
+            self._cache_player: Optional[int] = None
+            # apply_move前の合法手キャッシュ（undo_last_moveで復元する）
+            self._cache_history: List[Optional[List[Move]]] = []
     
     def _load_state(self, state: Dict) -> None:
         """状態を読み込む"""
@@ -113,6 +117,8 @@ class WataruToGame:
         # 合法手キャッシュの初期化
         self._legal_moves_cache: Optional[List[Move]] = None
         self._cache_valid = False
+        self._cache_player: Optional[int] = None
+        self._cache_history: List[Optional[List[Move]]] = []
     
     def get_state(self) -> Dict:
         """現在の状態を取得"""
@@ -136,6 +142,26 @@ class WataruToGame:
             "legal_moves": [m.to_dict() for m in self.get_legal_moves()]
         }
     
+    @property
+    def zobrist_hash(self) -> int:
+        """
+        局面のハッシュ値（置換表のキー）
+        
+        盤面のZobristハッシュ（Board側で差分更新）に手番とブロック在庫を合成する。
+        手順が違っても同じ局面なら同じ値になる。
+        
+        Returns:
+            局面のハッシュ値
+        """
+        blocks1 = self.player_blocks[1]
+        blocks2 = self.player_blocks[-1]
+        return hash((
+            self.board.zobrist_hash,
+            self.current_player,
+            blocks1.size4, blocks1.size5,
+            blocks2.size4, blocks2.size5
+        ))
+    
     def get_board_as_tensor(self) -> List[List[List[int]]]:
         """盤面をテンソル形式で取得（Alpha Zero用）"""
         return self.board.to_tensor()
@@ -153,8 +179,9 @@ class WataruToGame:
             合法手のリスト
         """
         # キャッシュが有効ならそれを返す
-        # ただし、filter_openingフラグが異なる場合はキャッシュを使わない
-        if self._cache_valid and self._legal_moves_cache is not None and not filter_opening:
+        # ただし、filter_openingフラグが異なる場合や、手番が書き換えられた場合はキャッシュを使わない
+        if (self._cache_valid and self._legal_moves_cache is not None and not filter_opening
+                and self._cache_player == self.current_player):
             return self._legal_moves_cache
         
         if self.winner is not None:
@@ -163,111 +190,80 @@ class WataruToGame:
         moves: List[Move] = []
         player = self.current_player
         size = self.board.size
+        board = self.board.board  # get_cell()を介さず直接参照（境界チェックは自前で行う）
         timestamp = datetime.now().timestamp()  # 1回だけ生成して使い回す
         
+        # ブロックサイズごとの在庫有無を事前に計算（3マスは無限）
+        blocks = self.player_blocks[player]
+        has_block = (False, False, False, True, blocks.size4 > 0, blocks.size5 > 0)
+        
         # 各マスを起点として探索
         for row in range(size):
+            board_row = board[row]
             for col in range(size):
-                layer1, layer2 = self.board.get_cell(row, col)
+                layer1, layer2 = board_row[col]
                 
                 # レイヤー2が埋まっている場合はスキップ
                 if layer2 != 0:
                     continue
                 
                 # 起点として配置可能かチェック
-                start_layers = []
+                # レイヤー1が空ならレイヤー1に配置、自分の色なら橋モード（レイヤー2）
                 if layer1 == 0:
-                    start_layers.append(0)  # レイヤー1に配置
-                if layer1 == player:
-                    start_layers.append(1)  # レイヤー2に配置（橋モード）
-                
-                if not start_layers:
+                    start_layer = 0
+                elif layer1 == player:
+                    start_layer = 1
+                else:
                     continue
                 
-                # 各レイヤーで探索
-                for start_layer in start_layers:
-                    # 2方向に探索（正方向のみ、逆方向は重複なので除外）
-                    directions = [(0, 1), (1, 0)]  # 右、下のみ
+                # 2方向に探索（正方向のみ、逆方向は重複なので除外）: 右、下
+                for dr, dc in ((0, 1), (1, 0)):
+                    # 3マス、4マス、5マスの手を生成
+                    path = [Position(row, col, start_layer)]
+                    current_row, current_col = row, col
                     
-                    for dr, dc in directions:
-                        # 3マス、4マス、5マスの手を生成
-                        path = [Position(row, col, start_layer)]
-                        current_row, current_col = row, col
+                    # 最大5マスまで探索
+                    for _ in range(4):
+                        current_row += dr
+                        current_col += dc
                         
-                        # 最大5マスまで探索
-                        for length in range(1, 5):
-                            current_row += dr
-                            current_col += dc
-                            
-                            # 盤面外チェック
-                            if not self.board.is_valid_position(current_row, current_col):
-                                break
-                            
-                            next_layer1, next_layer2 = self.board.get_cell(current_row, current_col)
-                            
-                            # レイヤー2が埋まっている場合は配置不可
-                            if next_layer2 != 0:
+                        # 盤面外チェック
+                        if current_row >= size or current_col >= size:
+                            break
+                        
+                        next_layer1, next_layer2 = board[current_row][current_col]
+                        
+                        # レイヤー2が埋まっている場合は配置不可
+                        if next_layer2 != 0:
+                            break
+                        
+                        if start_layer == 0:
+                            # レイヤー1モード: 空白のマスにのみ伸ばせる
+                            if next_layer1 != 0:
                                 break
                             
-                            # 配置可能なレイヤーを決定
-                            target_layer = -1
-                            if start_layer == 0:
-                                # レイヤー1モード
-                                if next_layer1 == 0:
-                                    target_layer = 0
-                                else:
-                                    break  # 配置不可
-                            else:
-                                # レイヤー2モード（橋渡し）
-                                if next_layer1 == 0:
-                                    # 空白の場合は常にOK
-                                    target_layer = 1
-                                elif next_layer1 == player:
-                                    # 自分のマスの場合、3マス目以降（終点候補）のみOK
-                                    # len(path) >= 2 は「起点 + 2マス目」なので、これから追加するのが3マス目
-                                    if len(path) >= 2:
-                                        target_layer = 1
-                                        # 自分の既存マスに到達したので、これが終点
-                                        # これ以上先には進めない
-                                        path.append(Position(current_row, current_col, target_layer))
-                                        # この手を追加して、ループを抜ける
-                                        if len(path) >= 3:
-                                            if self.player_blocks[player].has_block(len(path)):
-                                                moves.append(Move(player=player, path=path.copy(), timestamp=datetime.now().timestamp()))
-                                        break
-                                    else:
-                                        # 2マス目（間のマス）には自分のマスがあってはダメ
-                                        break
-                                else:
-                                    # 相手の色の場合は配置不可
-                                    break
+                            path.append(Position(current_row, current_col, 0))
                             
-                            path.append(Position(current_row, current_col, target_layer))
+                            # 3マス以上で合法手として追加（ブロック数チェック）
+                            block_size = len(path)
+                            if block_size >= 3 and has_block[block_size]:
+                                moves.append(Move(player=player, path=path[:], timestamp=timestamp))
+                        else:
+                            # レイヤー2モード（橋渡し）
+                            if next_layer1 == 0:
+                                # 空白の場合は間のマスとして伸ばせる
+                                # （終点は自分の既存マスである必要があるので、ここでは手にならない）
+                                path.append(Position(current_row, current_col, 1))
+                                continue
                             
-                            # 3マス以上で合法手として追加
-                            if len(path) >= 3:
-                                # 橋モードの場合、終点チェック
-                                if start_layer == 1:
-                                    end_layer1, _ = self.board.get_cell(current_row, current_col)
-                                    if end_layer1 != player:
-                                        continue  # 終点が既存マスでない場合はスキップ
-                                
-                                # ブロック数チェック
-                                block_size = len(path)
-                                if not self.player_blocks[player].has_block(block_size):
-                                    continue
-                                
-                                # 手を追加
-                                try:
-                                    move = Move(
-                                        player=player,
-                                        path=path[:],  # シャローコピーで十分
-                                        timestamp=timestamp  # 使い回し
-                                    )
-                                    moves.append(move)
-                                except ValueError:
-                                    # 無効な手はスキップ
-                                    continue
+                            # 自分のマスの場合、3マス目以降（終点）のみOK
+                            # 2マス目（間のマス）に自分のマスがある場合や相手の色の場合は配置不可
+                            if next_layer1 == player and len(path) >= 2:
+                                # 自分の既存マスに到達したので、これが終点
+                                path.append(Position(current_row, current_col, 1))
+                                if has_block[len(path)]:
+                                    moves.append(Move(player=player, path=path, timestamp=timestamp))
+                            break
         
         # 初手フィルタリングが有効な場合、そのプレイヤーの初手なら方向を絞る
         if filter_opening:
@@ -285,9 +281,90 @@ class WataruToGame:
         if not filter_opening:
             self._legal_moves_cache = moves
             self._cache_valid = True
+            self._cache_player = player
         
         return moves
     
+    def get_legal_placements(self) -> List[Tuple[int, int, int, int, int]]:
+        """
+        現在のプレイヤーの合法手を、Moveを作らずに (方向, サイズ, レイヤー, 行, 列) で取得
+        
+        get_legal_moves(filter_opening=False) と同じ手を同じ順に列挙するが、
+        Position/Moveオブジェクトは作らない（手の種類だけが要るAlpha Zeroの合法手マスク用）
+        
+        Returns:
+            (方向, サイズ, レイヤー, 開始行, 開始列) のリスト
+            方向: 0=縦（vertical）, 1=横（horizontal）
+            サイズ: 3, 4, 5
+            レイヤー: 0=レイヤー1, 1=レイヤー2（橋渡し）
+        """
+        if self.winner is not None:
+            return []  # ゲーム終了後は手なし
+        
+        placements: List[Tuple[int, int, int, int, int]] = []
+        player = self.current_player
+        size = self.board.size
+        board = self.board.board
+        
+        # ブロックサイズごとの在庫有無を事前に計算（3マスは無限）
+        blocks = self.player_blocks[player]
+        has_block = (False, False, False, True, blocks.size4 > 0, blocks.size5 > 0)
+        
+        # 探索の順序・条件は get_legal_moves() と同じ
+        for row in range(size):
+            board_row = board[row]
+            for col in range(size):
+                layer1, layer2 = board_row[col]
+                
+                if layer2 != 0:
+                    continue
+                
+                if layer1 == 0:
+                    start_layer = 0
+                elif layer1 == player:
+                    start_layer = 1
+                else:
+                    continue
+                
+                # 右（横）、下（縦）の順
+                for direction, dr, dc in ((1, 0, 1), (0, 1, 0)):
+                    length = 1
+                    current_row, current_col = row, col
+                    
+                    for _ in range(4):
+                        current_row += dr
+                        current_col += dc
+                        
+                        if current_row >= size or current_col >= size:
+                            break
+                        
+                        next_layer1, next_layer2 = board[current_row][current_col]
+                        
+                        if next_layer2 != 0:
+                            break
+                        
+                        if start_layer == 0:
+                            # レイヤー1モード: 空白のマスにのみ伸ばせる
+                            if next_layer1 != 0:
+                                break
+                            
+                            length += 1
+                            if length >= 3 and has_block[length]:
+                                placements.append((direction, length, 0, row, col))
+                        else:
+                            # レイヤー2モード（橋渡し）: 空白は間のマス、自分のマスは終点
+                            if next_layer1 == 0:
+                                length += 1
+                                continue
+                            
+                            if next_layer1 == player and length >= 2:
+                                length += 1
+                                if has_block[length]:
+                                    placements.append((direction, length, 1, row, col))
+                            break
+        
+        return placements
+    
     def is_valid_move(self, move: Move) -> Tuple[bool, str]:
         """
         手が有効かどうかを検証
@@ -315,21 +392,25 @@ class WataruToGame:
             player_blocks_dict
         )
     
-    def apply_move(self, move: Move) -> bool:
+    def apply_move(self, move: Move, validate: bool = True) -> bool:
         """
         手を適用
         
         Args:
             move: 適用する手
+            validate: 手の妥当性を検証するか
+                False: get_legal_moves() で得た手など、合法だと分かっている手を
+                       検証なしで適用する（MCTSのプレイアウトなどの高速化用）
             
         Returns:
             成功した場合True
         """
         # 手の妥当性チェック
-        is_valid, error_msg = self.is_valid_move(move)
-        if not is_valid:
-            print(f"Invalid move: {error_msg}")
-            return False
+        if validate:
+            is_valid, error_msg = self.is_valid_move(move)
+            if not is_valid:
+                print(f"Invalid move: {error_msg}")
+                return False
         
         # ブロックを使用
         if not self.player_blocks[move.player].use_block(move.block_size):
@@ -337,8 +418,11 @@ class WataruToGame:
             return False
         
         # 盤面に手を適用
-        for pos in move.path:
-            self.board.set_cell(pos.row, pos.col, pos.layer, move.player)
+        if validate:
+            for pos in move.path:
+                self.board.set_cell(pos.row, pos.col, pos.layer, move.player)
+        else:
+            self.board.set_path(move.path, move.player)
         
         # 履歴に追加
         self.move_history.append(move)
@@ -352,6 +436,10 @@ class WataruToGame:
             self.current_player = -self.current_player  # type: ignore
         
         # キャッシュを無効化（盤面が変わったので）
+        # 取り消し時に再計算しなくて済むよう、直前のキャッシュを退避しておく
+        self._cache_history.append(
+            self._legal_moves_cache if self._cache_valid and self._cache_player == move.player else None
+        )
         self._cache_valid = False
         
         return True
@@ -378,16 +466,52 @@ class WataruToGame:
         
         return None
     
+    def evaluate(self) -> float:
+        """
+        局面の簡易評価値（水色視点）
+        
+        各プレイヤーの連結したまとまりが勝利方向（水色=上下、ピンク=左右）に
+        どれだけ広がっているかの差を盤面サイズで正規化する。
+        プレイアウトを途中で打ち切ったときの勝敗の見積もりに使う
+        
+        Returns:
+            -1.0〜1.0 の評価値（正なら水色有利、負ならピンク有利）
+        """
+        if self.winner is not None:
+            return float(self.winner)
+        
+        span_blue = self.board.get_max_span(1)
+        span_pink = self.board.get_max_span(-1)
+        return (span_blue - span_pink) / self.board.size
+    
     def is_game_over(self) -> bool:
         """ゲームが終了しているか"""
         return self.winner is not None
     
     def clone(self) -> "WataruToGame":
-        """ゲーム状態のコピーを作成"""
-        return WataruToGame(
-            board_size=self.board.size,
-            initial_state=self.get_state()
-        )
+        """
+        ゲーム状態のコピーを作成
+        
+        get_state() による辞書への変換・復元（履歴の全手のto_dict/from_dict）を経由せず、
+        盤面だけを複製して他の状態は直接コピーする
+        """
+        new_game = WataruToGame.__new__(WataruToGame)
+        new_game.board = self.board.clone()
+        new_game.current_player = self.current_player
+        new_game.player_blocks = {
+            1: self.player_blocks[1].clone(),
+            -1: self.player_blocks[-1].clone()
+        }
+        # Moveは適用後に書き換えないので、履歴はリストだけ複製して共有する
+        new_game.move_history = list(self.move_history)
+        new_game.winner = self.winner
+        
+        # 合法手キャッシュは盤面が同じなので引き継ぐ（リストは読み取り専用として共有）
+        new_game._legal_moves_cache = self._legal_moves_cache if self._cache_valid else None
+        new_game._cache_valid = self._cache_valid
+        new_game._cache_player = self._cache_player
+        new_game._cache_history = []
+        return new_game
     
     def reset(self) -> None:
         """ゲームをリセット"""
@@ -402,6 +526,7 @@ class WataruToGame:
         
         # キャッシュを無効化
         self._cache_valid = False
+        self._cache_history = []
     
     def export_game_record(self) -> str:
         """
@@ -463,6 +588,9 @@ class WataruToGame:
         """
         最後の手を取り消す
         
+        apply_move() と対で使うことで、clone() せずに盤面上で手を試して
+        元に戻すことができる（MCTSのプレイアウトなど）
+        
         Returns:
             成功した場合True
         """
@@ -472,9 +600,8 @@ class WataruToGame:
         # 最後の手を取得
         last_move = self.move_history.pop()
         
-        # 盤面から削除
-        for pos in last_move.path:
-            self.board.set_cell(pos.row, pos.col, pos.layer, 0)
+        # 盤面から削除（一度適用できた手なので検証は不要）
+        self.board.set_path(last_move.path, 0)
         
         # ブロックを戻す
         if last_move.block_size == 4:
@@ -486,6 +613,12 @@ class WataruToGame:
         self.current_player = last_move.player
         self.winner = None
         
+        # 合法手キャッシュを手を打つ前の状態に戻す
+        previous_cache = self._cache_history.pop() if self._cache_history else None
+        self._legal_moves_cache = previous_cache
+        self._cache_valid = previous_cache is not None
+        self._cache_player = self.current_player
+        
         return True
     
     def __str__(self) -> str:
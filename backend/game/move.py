@@ -9,9 +9,10 @@ from dataclasses import dataclass
 from datetime import datetime
 
 
-@dataclass
+@dataclass(slots=True)
 class Position:
     """盤面上の位置を表すクラス"""
+    # 合法手生成で大量に作られるため、__slots__ でインスタンスを小さくする
     row: int
     col: int
     layer: int  # 0: レイヤー1, 1: レイヤー2
@@ -35,9 +36,15 @@ class Position:
         )
 
 
-@dataclass
+# Move.pack() の方向コード（右, 下, 左, 上）
+_PACK_STEPS = ((0, 1), (1, 0), (0, -1), (-1, 0))
+_PACK_STEP_CODES = {step: code for code, step in enumerate(_PACK_STEPS)}
+
+
+@dataclass(slots=True)
 class Move:
     """ゲーム内の手を表すクラス"""
+    # Positionと同じく __slots__ を使う（MCTSの未試行手リストに大量に保持される）
     player: Literal[1, -1]  # 1: 水色プレイヤー, -1: ピンクプレイヤー
     path: List[Position]  # 配置するマスのリスト
     timestamp: float  # タイムスタンプ
@@ -114,6 +121,52 @@ class Move:
             timestamp=datetime.now().timestamp()
         )
     
+    def pack(self) -> int:
+        """
+        手を1つの整数に詰める（辞書のキーやプロセス間の受け渡し用）
+        
+        ビット配置: row(16-23) | col(8-15) | 長さ(4-6) | 方向(2-3) | レイヤー(1) | プレイヤー(0)
+        一直線・同一レイヤーの手（合法手）を前提とし、timestampは含まない
+        
+        Returns:
+            パックされた整数
+        """
+        start = self.path[0]
+        second = self.path[1]
+        step = _PACK_STEP_CODES[(second.row - start.row, second.col - start.col)]
+        return (
+            (start.row << 16)
+            | (start.col << 8)
+            | (len(self.path) << 4)
+            | (step << 2)
+            | (start.layer << 1)
+            | (1 if self.player == -1 else 0)
+        )
+    
+    @classmethod
+    def unpack(cls, packed: int, timestamp: float = 0.0) -> "Move":
+        """
+        pack() で詰めた整数から手を復元
+        
+        Args:
+            packed: パックされた整数
+            timestamp: 復元した手に設定するタイムスタンプ
+        
+        Returns:
+            復元された手
+        """
+        row = (packed >> 16) & 0xFF
+        col = (packed >> 8) & 0xFF
+        length = (packed >> 4) & 0x7
+        dr, dc = _PACK_STEPS[(packed >> 2) & 0x3]
+        layer = (packed >> 1) & 0x1
+        player = -1 if packed & 0x1 else 1
+        return cls(
+            player=player,
+            path=[Position(row + dr * i, col + dc * i, layer) for i in range(length)],
+            timestamp=timestamp
+        )
+    
     def validate_path(self) -> bool:
         """パスの妥当性を検証"""
         if len(self.path) < 3 or len(self.path) > 5:
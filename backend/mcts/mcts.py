@@ -5,11 +5,16 @@
 UCB1を使った選択と、ランダムプレイアウトによるシミュレーションを実装。
 """
 
-import math
+import gc
+import logging
+import multiprocessing
+import os
 import random
 import time
-from typing import Optional, List, Dict
+from collections import Counter, deque
+from typing import Optional, List, Dict, Tuple, Union
 from dataclasses import dataclass
+from math import log, sqrt
 
 import sys
 from pathlib import Path
@@ -19,6 +24,19 @@ sys.path.insert(0, str(backend_path))
 from game.game import WataruToGame
 from game.move import Move
 
+logger = logging.getLogger(__name__)
+
+
+# UCB1の探索項 sqrt(log(N) / n) = sqrt(log(N)) * (1 / sqrt(n)) を表引きするためのテーブル
+# 訪問回数はほとんどが小さい整数なので、この範囲だけ事前計算しておく（範囲外は都度計算）
+_UCB_TABLE_SIZE = 1 << 16
+_SQRT_LOG_TABLE = [0.0] + [sqrt(log(n)) for n in range(1, _UCB_TABLE_SIZE)]
+_INV_SQRT_TABLE = [0.0] + [1.0 / sqrt(n) for n in range(1, _UCB_TABLE_SIZE)]
+
+
+# 勝者（1=水色, 0=引き分け, -1=ピンク）で引く水色の勝ち点（-1は末尾の要素）
+_RESULT_VALUES = (0.5, 1.0, 0.0)
+
 
 def visualize_board(game_state: WataruToGame, title: str = "盤面状態") -> str:
     """
@@ -92,35 +110,88 @@ class MCTSStats:
 class MCTSNode:
     """MCTSのノード（ゲーム状態）を表すクラス"""
     
+    # ノードは大量に生成されるため、インスタンスごとの__dict__を持たせない
+    # （メモリ削減と属性アクセスの高速化）
+    __slots__ = (
+        'game_state', 'parent', 'move', 'children', 'child_moves', 'filter_opening',
+        '_untried_moves', 'rng', 'visits', 'wins', 'player'
+    )
+    
     def __init__(
         self, 
         game_state: WataruToGame, 
         parent: Optional['MCTSNode'] = None,
         move: Optional[Move] = None,
-        filter_opening: bool = False
+        filter_opening: bool = False,
+        rng: Optional[random.Random] = None
     ):
         """
         Args:
             game_state: このノードのゲーム状態
-            parent: 親ノード
-            move: 親からこのノードへの手
+            parent: 親ノード（置換表で共有される場合は最初に到達した親）
+            move: 親からこのノードへの手（同上）
             filter_opening: 初手フィルタリングを有効にするか
+            rng: 未試行の手のシャッフルに使う乱数生成器（Noneならrandomモジュール）
         """
         self.game_state = game_state
         self.parent = parent
         self.move = move  # 親からこのノードへの手
         
         self.children: List['MCTSNode'] = []
-        self.untried_moves: List[Move] = game_state.get_legal_moves(filter_opening=filter_opening)
+        # children と同じ順の、このノードから各子に進む手
+        # （置換表で共有された子の move は、最初に到達した別の親からの手のことがある）
+        self.child_moves: List[Move] = []
+        # 未試行の手は初めて必要になったときに生成する（get_untried_moves()）
+        # 展開されるだけで再訪問されないノードでは合法手生成を丸ごと省ける
+        self.filter_opening = filter_opening
+        self._untried_moves: Optional[List[Move]] = None
+        self.rng = rng if rng is not None else random
         
         # 統計
         self.visits = 0
-        self.wins = 0.0  # このノードから見た勝利数
-        self.player = game_state.current_player  # このノードのプレイヤー
+        self.wins = 0.0  # このノードに至る手を打ったプレイヤーから見た勝利数
+        # このノードに至る手を打ったプレイヤー（ルートでは手番の相手）
+        # 親は子の wins/visits を「自分が打つ手の勝率」としてそのまま比較できる
+        # （勝利手を打った終端ノードでは current_player が交代しないため、手番から逆算しない）
+        self.player = move.player if move is not None else -game_state.current_player
     
-    def is_fully_expanded(self) -> bool:
-        """すべての子ノードが展開されているか"""
-        return len(self.untried_moves) == 0
+    def get_untried_moves(self) -> List[Move]:
+        """
+        未試行の手のリストを取得（初回呼び出し時に合法手を生成してメモ化）
+        
+        Returns:
+            未試行の手のリスト
+        """
+        if self._untried_moves is None:
+            # get_legal_moves()はキャッシュ済みのリストを返すことがあるため、
+            # expand()でpopしてもゲーム状態側のキャッシュが壊れないようコピーする
+            self._untried_moves = list(
+                self.game_state.get_legal_moves(filter_opening=self.filter_opening)
+            )
+            # 一度だけシャッフルしておけば、末尾からpopするだけで一様ランダムに選べる
+            self.rng.shuffle(self._untried_moves)
+        return self._untried_moves
+    
+    def is_fully_expanded(self, widening: Optional[Tuple[float, float]] = None) -> bool:
+        """
+        すべての子ノードが展開されているか
+        
+        Args:
+            widening: プログレッシブワイドニングの係数 (C, alpha)
+                指定すると子ノード数を int(C * visits^alpha) + 1 までに制限し、
+                上限に達していれば未試行の手が残っていても展開済みとみなす
+        
+        Returns:
+            これ以上展開しない場合True
+        """
+        untried_moves = self.get_untried_moves()
+        if not untried_moves:
+            return True
+        if widening is None:
+            return False
+        
+        constant, exponent = widening
+        return len(self.children) >= int(constant * self.visits ** exponent) + 1
     
     def is_terminal(self) -> bool:
         """終端ノード（ゲーム終了）か"""
@@ -140,52 +211,127 @@ class MCTSNode:
             return float('inf')
         
         exploitation = self.wins / self.visits
-        exploration = exploration_weight * math.sqrt(
-            math.log(self.parent.visits) / self.visits
+        exploration = exploration_weight * sqrt(
+            log(self.parent.visits) / self.visits
         )
         
         return exploitation + exploration
     
-    def select_child(self) -> 'MCTSNode':
-        """UCB1スコアが最大の子ノードを選択"""
-        return max(self.children, key=lambda child: child.ucb1())
+    def select_child(self, exploration_weight: float = 1.41) -> 'MCTSNode':
+        """
+        UCB1スコアが最大の子ノードを選択
+        
+        log(親の訪問回数) は全ての子で共通なので1回だけ計算し、
+        子ごとのucb1()呼び出しを避けてループ内で直接スコアを求める
+        
+        Args:
+            exploration_weight: 探索の重み
+        
+        Returns:
+            UCB1スコアが最大の子ノード（未訪問の子があればそれを優先）
+        """
+        log_parent = log(self.visits)
+        best_child = None
+        best_score = float('-inf')
+        
+        for child in self.children:
+            visits = child.visits
+            if visits == 0:
+                return child
+            score = child.wins / visits + exploration_weight * sqrt(log_parent / visits)
+            if score > best_score:
+                best_score = score
+                best_child = child
+        
+        return best_child
     
-    def expand(self) -> 'MCTSNode':
+    def expand(self, tt: Optional[Dict[int, 'MCTSNode']] = None) -> 'MCTSNode':
         """
         未展開の手を1つ選んで子ノードを作成
         
+        置換表が渡された場合、手順違いで同じ局面に到達したノードがあれば
+        新しく作らずにそれを子として共有する（探索木はDAGになる）
+        
+        Args:
+            tt: 置換表（局面のZobristハッシュ → ノード）
+        
         Returns:
-            新しく作成された子ノード
+            子ノード（新規作成または置換表から取得）
         """
-        if not self.untried_moves:
+        untried_moves = self.get_untried_moves()
+        if not untried_moves:
             raise ValueError("No untried moves to expand")
         
-        # ランダムに未試行の手を選択
-        move = self.untried_moves.pop(random.randint(0, len(self.untried_moves) - 1))
+        # 未試行の手を選択（生成時にシャッフル済みなので末尾からO(1)で取り出す）
+        move = untried_moves.pop()
         
         # 新しいゲーム状態を作成
         new_state = self.game_state.clone()
-        new_state.apply_move(move)
+        new_state.apply_move(move, validate=False)
         
-        # 子ノードを作成
-        child = MCTSNode(new_state, parent=self, move=move)
+        # 子ノードを作成（置換表に同じ局面があれば再利用）
+        if tt is None:
+            child = MCTSNode(new_state, parent=self, move=move, rng=self.rng)
+        else:
+            state_hash = new_state.zobrist_hash
+            child = tt.get(state_hash)
+            if child is None:
+                child = MCTSNode(new_state, parent=self, move=move, rng=self.rng)
+                tt[state_hash] = child
         self.children.append(child)
+        self.child_moves.append(move)
         
         return child
     
-    def backpropagate(self, result: float):
+    def move_to(self, child: 'MCTSNode') -> Move:
+        """
+        このノードから子ノードに進む手を取得
+        
+        Args:
+            child: このノードの子ノード
+        
+        Returns:
+            子ノードに進む手
+        """
+        return self.child_moves[self.children.index(child)]
+    
+    def backpropagate(self, winner: Union[int, List[int]], path: Optional[List['MCTSNode']] = None):
         """
         シミュレーション結果を親ノードに伝播
         
+        再帰呼び出しを避け、親をたどるループで更新する
+        （深い木でもPythonのフレーム生成コストや再帰上限の影響を受けない）
+        各ノードは自分の player から見た結果を足すので、階層ごとに結果を反転させる必要はない
+        
         Args:
-            result: 勝利=1.0, 引き分け=0.5, 敗北=0.0
+            winner: プレイアウトの勝者（1, -1, 0=引き分け）
+                複数回のプレイアウトの勝者のリストを渡すと、まとめて1回で伝播する
+            path: ルートからこのノードまでの選択経路
+                置換表でノードが複数の親に共有される場合は、parentではなく
+                実際にたどった経路に沿って伝播する
         """
-        self.visits += 1
-        self.wins += result
+        if path is None:
+            path = []
+            node = self
+            while node is not None:
+                path.append(node)
+                node = node.parent
+        else:
+            path = reversed(path)
+        
+        # 水色から見た得点を表引きで求めておき、ピンクのノードには (回数 - 得点) を足す
+        # （1回のプレイアウトの得点は両者の合計が常に1になる）
+        if isinstance(winner, int):
+            count = 1
+            blue_value = _RESULT_VALUES[winner]
+        else:
+            count = len(winner)
+            blue_value = sum(_RESULT_VALUES[w] for w in winner)
+        pink_value = count - blue_value
         
-        if self.parent:
-            # 親視点では結果が反転
-            self.parent.backpropagate(1.0 - result)
+        for node in path:
+            node.visits += count
+            node.wins += blue_value if node.player == 1 else pink_value
 
 
 class MCTS:
@@ -200,7 +346,16 @@ class MCTS:
         use_tactical_heuristics: bool = True,
         debug_playout: bool = False,
         debug_playout_count: int = 1,
-        filter_opening: bool = True
+        filter_opening: bool = True,
+        seed: Optional[int] = None,
+        progressive_widening: bool = False,
+        widening_constant: float = 2.0,
+        widening_exponent: float = 0.5,
+        reuse_tree: bool = True,
+        playout_depth: int = 100,
+        evaluation_threshold: float = 0.1,
+        num_workers: int = 1,
+        playouts_per_leaf: int = 1
     ):
         """
         Args:
@@ -216,6 +371,24 @@ class MCTS:
             filter_opening: 初手フィルタリングを有効にするか
                 True: 盤面が空の場合、プレイヤーに有利な方向のみ探索
                       （水色=縦、ピンク=横）
+            seed: 乱数シード（指定すると探索結果を再現できる）
+            progressive_widening: プログレッシブワイドニングを有効にするか
+                True: ノードの子の数を int(C * 訪問回数^alpha) + 1 までに制限し、
+                      合法手が多い局面で浅く広がりすぎないようにする
+            widening_constant: ワイドニングの係数C
+            widening_exponent: ワイドニングの指数alpha
+            reuse_tree: 前回の探索木を次の手番で再利用するか
+                True: 現在の局面が前回の木に含まれていれば、その部分木を
+                      ルートにしてシミュレーション結果を引き継ぐ
+            playout_depth: プレイアウトの最大手数
+                決着がつかないまま打ち切った場合は WataruToGame.evaluate() で勝敗を見積もる
+            evaluation_threshold: 打ち切り時に勝ちとみなす評価値の閾値
+                評価値がこれを超えれば水色、-閾値を下回ればピンクの勝ち、その間は引き分け
+            num_workers: search() で使うプロセス数
+                2以上ならプロセスごとに独立した木を作るルート並列化で探索する
+            playouts_per_leaf: 1回のシミュレーションで葉ノードから行うプレイアウト数
+                2以上にすると結果をまとめて伝播する（リーフ並列化）。
+                訪問回数はプレイアウト数で数える
         """
         self.exploration_weight = exploration_weight
         self.time_limit = time_limit
@@ -225,149 +398,441 @@ class MCTS:
         self.debug_playout = debug_playout
         self.debug_playout_count = debug_playout_count
         self.filter_opening = filter_opening
+        self.seed = seed
+        self.widening: Optional[Tuple[float, float]] = (
+            (widening_constant, widening_exponent) if progressive_widening else None
+        )
+        # 探索専用の乱数生成器（モジュールのrandom.choiceより呼び出しが軽く、シードで再現可能）
+        self._rng = random.Random(seed)
         self.stats = MCTSStats()
         self._simulation_count = 0  # 現在のシミュレーション回数
+        # 置換表（局面のZobristハッシュ → ノード）。search()ごとに作り直す
+        self.tt: Dict[int, MCTSNode] = {}
+        # 前回の探索木のルート（reuse_treeが有効な場合に次の探索で引き継ぐ）
+        self.reuse_tree = reuse_tree
+        self.playout_depth = playout_depth
+        self.evaluation_threshold = evaluation_threshold
+        self.num_workers = num_workers
+        self.playouts_per_leaf = max(1, playouts_per_leaf)
+        self.root: Optional[MCTSNode] = None
     
     def search(self, game_state: WataruToGame) -> Optional[Move]:
         """
         MCTSで最良の手を探索
         
+        num_workers が2以上ならプロセス並列（search_parallel()）で探索する
+        
+        Args:
+            game_state: 現在のゲーム状態
+        
+        Returns:
+            最良の手（合法手がない場合はNone）
+        """
+        if self.num_workers > 1:
+            return self.search_parallel(game_state, self.num_workers)
+        return self._search_single(game_state)
+    
+    def _search_single(self, game_state: WataruToGame) -> Optional[Move]:
+        """
+        1プロセスでMCTS探索
+        
         Args:
             game_state: 現在のゲーム状態
         
         Returns:
             最良の手（合法手がない場合はNone）
         """
-        start_time = time.time()
+        start_time = time.monotonic()
         self.stats = MCTSStats()
         self._simulation_count = 0  # リセット
         
-        # ルートノードを作成（初手フィルタリングを適用）
-        root = MCTSNode(game_state.clone(), filter_opening=self.filter_opening)
-        
         # 合法手がない場合
-        if not root.untried_moves and not root.children:
+        if not game_state.get_legal_moves(filter_opening=self.filter_opening):
             return None
         
         # Tactical MCTSモードの場合、王手への即座の対応
         if self.use_tactical_heuristics:
-            current_player = game_state.current_player
-            opponent = -current_player
-            test_game = game_state.clone()
-            test_game.current_player = opponent
-            opponent_moves = test_game.get_legal_moves()
+            tactical_move = self._tactical_precheck(game_state, start_time)
+            if tactical_move is not None:
+                return tactical_move
+        
+        root = self._build_tree(game_state, start_time)
+        
+        # 統計情報を更新
+        self.stats.time_elapsed = time.monotonic() - start_time
+        # 置換表には探索木の全ノードが1つずつ登録されているので、木を走査せずに数えられる
+        self.stats.nodes_explored = len(self.tt)
+        
+        best_child = self._select_best_child(root, game_state.current_player)
+        if best_child is None:
+            return None
+        
+        self.stats.best_move_visits = best_child.visits
+        self.stats.best_move_win_rate = best_child.wins / best_child.visits if best_child.visits > 0 else 0.0
+        
+        if self.verbose:
+            self._print_stats(root)
+        
+        return root.move_to(best_child)
+    
+    def search_parallel(self, game_state: WataruToGame, n_workers: Optional[int] = None) -> Optional[Move]:
+        """
+        ルート並列化でMCTS探索（複数プロセスで独立した木を作り、訪問回数を合算）
+        
+        純Pythonの探索はGILのためスレッドでは並列化できないので、プロセスごとに
+        別のシードで独立に探索し、ルートの子の訪問回数を手ごとに足し合わせて
+        最も訪問された手を選ぶ（プロセス間の同期は不要）
+        
+        Args:
+            game_state: 現在のゲーム状態
+            n_workers: ワーカープロセス数（Noneなら os.cpu_count()）
+        
+        Returns:
+            最良の手（合法手がない場合はNone）
+        """
+        if n_workers is None:
+            n_workers = os.cpu_count() or 1
+        if n_workers <= 1:
+            return self._search_single(game_state)
+        
+        start_time = time.monotonic()
+        self.stats = MCTSStats()
+        self._simulation_count = 0
+        
+        if not game_state.get_legal_moves(filter_opening=self.filter_opening):
+            return None
+        
+        # 王手への即応はどのワーカーでも同じ結果になるので親プロセスで1回だけ行う
+        if self.use_tactical_heuristics:
+            tactical_move = self._tactical_precheck(game_state, start_time)
+            if tactical_move is not None:
+                return tactical_move
+        
+        # ゲーム状態は辞書（get_state()）で渡し、ワーカー側で復元する
+        config = {
+            "exploration_weight": self.exploration_weight,
+            "time_limit": self.time_limit,
+            "max_simulations": self.max_simulations,
+            "use_tactical_heuristics": self.use_tactical_heuristics,
+            "filter_opening": self.filter_opening,
+            "progressive_widening": self.widening is not None,
+            "playout_depth": self.playout_depth,
+            "evaluation_threshold": self.evaluation_threshold,
+            "playouts_per_leaf": self.playouts_per_leaf,
+        }
+        if self.widening is not None:
+            config["widening_constant"], config["widening_exponent"] = self.widening
+        base_seed = self._rng.randrange(2 ** 31)
+        tasks = [
+            (base_seed + i, game_state.board.size, game_state.get_state(), config)
+            for i in range(n_workers)
+        ]
+        # forkが使える環境ではモジュールの再importを避けるためforkで起動する
+        if "fork" in multiprocessing.get_all_start_methods():
+            context = multiprocessing.get_context("fork")
+        else:
+            context = multiprocessing.get_context()
+        with context.Pool(n_workers) as pool:
+            results = pool.map(_search_worker, tasks)
+        
+        # 手ごとに訪問回数・勝利数を合算（手はMove.pack()した整数で受け取る）
+        total_visits: Counter = Counter()
+        total_wins: Counter = Counter()
+        for child_stats, simulations, nodes in results:
+            self.stats.simulations_run += simulations
+            self.stats.nodes_explored += nodes
+            for packed_move, visits, wins in child_stats:
+                total_visits[packed_move] += visits
+                total_wins[packed_move] += wins
+        
+        self.stats.time_elapsed = time.monotonic() - start_time
+        if not total_visits:
+            return None
+        
+        best_key = max(total_visits, key=total_visits.get)
+        self.stats.best_move_visits = total_visits[best_key]
+        self.stats.best_move_win_rate = total_wins[best_key] / total_visits[best_key] if total_visits[best_key] > 0 else 0.0
+        
+        if self.verbose:
+            print("\n" + "=" * 60)
+            print(f"MCTS統計情報（ルート並列: {n_workers}プロセス）")
+            print("=" * 60)
+            print(f"シミュレーション回数: {self.stats.simulations_run}")
+            print(f"探索ノード数: {self.stats.nodes_explored}")
+            print(f"探索時間: {self.stats.time_elapsed:.2f}秒")
+            print(f"\n最良手の訪問回数: {self.stats.best_move_visits}")
+            print(f"最良手の勝率: {self.stats.best_move_win_rate * 100:.1f}%")
+            print("=" * 60 + "\n")
+        
+        return Move.unpack(best_key, timestamp=time.time())
+    
+    def _build_tree(self, game_state: WataruToGame, start_time: float) -> MCTSNode:
+        """
+        時間制限またはシミュレーション回数制限まで探索木を成長させる
+        
+        Args:
+            game_state: 現在のゲーム状態
+            start_time: 探索開始時刻（time.monotonic()）
+        
+        Returns:
+            探索木のルートノード
+        """
+        # 前回の探索木に現在の局面があれば再利用し、なければルートノードを作成（初手フィルタリングを適用）
+        root = self._reuse_subtree(game_state)
+        if root is None:
+            root = MCTSNode(game_state.clone(), filter_opening=self.filter_opening, rng=self._rng)
+            self.tt = {root.game_state.zobrist_hash: root}
+        self.root = root
+        
+        # シミュレーション回数をカウント
+        simulation_count = 0
+        
+        # 時刻の取得は毎回ではなく check_stride 回ごとにまとめて行う
+        # （Pure MCTSのように1回が軽い場合に効く。Tacticalのように1回が重い場合は
+        #   制限時間を超過しないよう、実測の速度から間隔を決める）
+        deadline = start_time + self.time_limit
+        loop_start = time.monotonic()
+        check_stride = 1
+        next_check = 0
+        
+        # 探索中は循環参照GCを止める
+        # （木のノード・手・盤面など大量の長寿命オブジェクトを世代GCが何度も走査するのを避ける。
+        #   探索中に作られる循環参照は探索後にGCを再開すれば回収される）
+        gc_was_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            # 時間制限またはシミュレーション回数制限まで実行
+            while True:
+                # 時間制限チェック
+                if simulation_count >= next_check:
+                    now = time.monotonic()
+                    if now > deadline:
+                        break
+                    if simulation_count > 0:
+                        # 約10ミリ秒ごと（最大64回ごと）に時刻を確認する
+                        seconds_per_simulation = (now - loop_start) / simulation_count
+                        check_stride = max(1, min(64, int(0.01 / seconds_per_simulation))) if seconds_per_simulation > 0 else 64
+                    next_check = simulation_count + check_stride
+                
+                # シミュレーション回数制限チェック
+                if self.max_simulations and simulation_count >= self.max_simulations:
+                    break
+                
+                # 1回のシミュレーション
+                self._simulate_once(root)
+                simulation_count += 1
+        finally:
+            if gc_was_enabled:
+                gc.enable()
+        
+        self.stats.simulations_run = simulation_count
+        return root
+    
+    def _reuse_subtree(self, game_state: WataruToGame) -> Optional[MCTSNode]:
+        """
+        前回の探索木から現在の局面のノードを探し、新しいルートとして切り出す
+        
+        自分の手と相手の手を経た局面も置換表（Zobristハッシュ）で直接引けるので、
+        相手の手を指定しなくても見つけられる。ルートから辿れないノードは置換表から外す
+        
+        Args:
+            game_state: 現在のゲーム状態
+        
+        Returns:
+            再利用するノード（見つからない場合はNone）
+        """
+        if not self.reuse_tree or self.root is None:
+            return None
+        
+        # 初手フィルタリングが効く局面では、フィルタなしで展開された子を使い回せない
+        current_player = game_state.current_player
+        if self.filter_opening and not any(move.player == current_player for move in game_state.move_history):
+            return None
+        
+        root = self.tt.get(game_state.zobrist_hash)
+        if root is None:
+            return None
+        
+        self._prune_to(root)
+        return root
+    
+    def notify_move(self, move: Move) -> bool:
+        """
+        実際に打たれた手を通知し、保持している探索木をその手の先の部分木に切り詰める
+        
+        search() が返した自分の手と、続いて相手が打った手の両方を順に通知する。
+        通知しなくても次の search() で置換表から局面を探すが、通知しておけば
+        相手の手番の間に不要な木を解放できる
+        
+        Args:
+            move: 打たれた手
+        
+        Returns:
+            部分木を引き継げた場合True（木に含まれない手なら木を破棄してFalse）
+        """
+        if not self.reuse_tree or self.root is None:
+            return False
+        
+        packed = move.pack()
+        for child, child_move in zip(self.root.children, self.root.child_moves):
+            if child_move.pack() == packed:
+                self._prune_to(child)
+                self.root = child
+                return True
+        
+        # 展開されていない手が打たれたら、前回の木はもう使えない
+        self.root = None
+        self.tt = {}
+        return False
+    
+    def _prune_to(self, root: MCTSNode) -> None:
+        """
+        指定したノードを新しいルートとし、そこから辿れない部分を置換表と木から切り離す
+        
+        Args:
+            root: 新しいルートノード
+        """
+        # 新しいルートから辿れる部分木だけを置換表に残す
+        tt: Dict[int, MCTSNode] = {}
+        queue = deque([root])
+        while queue:
+            node = queue.popleft()
+            state_hash = node.game_state.zobrist_hash
+            if state_hash in tt:
+                continue
+            tt[state_hash] = node
+            queue.extend(node.children)
+        
+        # 切り捨てた親への参照を外して、不要になった木をGCで回収できるようにする
+        retained = {id(node) for node in tt.values()}
+        for node in tt.values():
+            if node.parent is not None and id(node.parent) not in retained:
+                node.parent = None
+        root.parent = None
+        root.move = None
+        
+        self.tt = tt
+    
+    def _tactical_precheck(self, game_state: WataruToGame, start_time: float) -> Optional[Move]:
+        """
+        相手の勝利手（王手）があれば、探索せずに防御手を選ぶ
+        
+        Args:
+            game_state: 現在のゲーム状態
+            start_time: 探索開始時刻（統計用）
+        
+        Returns:
+            即座に打つべき手（王手がない、または手が見つからない場合はNone）
+        """
+        current_player = game_state.current_player
+        opponent = -current_player
+        test_game = game_state.clone()
+        test_game.current_player = opponent
+        opponent_moves = test_game.get_legal_moves()
+        
+        # 相手の勝利手をチェック（手を打って判定し、すぐ取り消す）
+        opponent_winning_moves = []
+        for opp_move in opponent_moves:
+            test_game.apply_move(opp_move, validate=False)
+            if test_game.winner == opponent:
+                opponent_winning_moves.append(opp_move)
+            test_game.undo_last_move()
+        
+        # 王手がある場合、即座に防御手を探して返す
+        if opponent_winning_moves:
+            # 探索のたびに標準出力へ書き出さないよう、ログ出力は logging に任せる
+            # （引数は出力するときだけ文字列に整形される）
+            logger.info(
+                "[緊急王手] %sが%sに王手！ 相手の勝利手: %d通り、防御手を優先的に選択します",
+                "水色" if opponent == 1 else "ピンク",
+                "水色" if current_player == 1 else "ピンク",
+                len(opponent_winning_moves),
+            )
             
-            # 相手の勝利手をチェック
-            has_opponent_winning_move = False
-            opponent_winning_moves = []
-            for opp_move in opponent_moves:
-                test_game2 = test_game.clone()
-                test_game2.apply_move(opp_move)
-                if test_game2.winner == opponent:
-                    has_opponent_winning_move = True
-                    opponent_winning_moves.append(opp_move)
+            # 防御手を探す（verboseはFalse、すでに上で出力済み）
+            legal_moves = game_state.get_legal_moves()
+            # 調べ済みの相手の勝利手を渡して、同じ列挙を繰り返さない
+            blocking_move = self._find_blocking_move(
+                game_state, legal_moves, verbose=False,
+                opponent_winning_moves=opponent_winning_moves
+            )
             
-            # 王手がある場合、即座に防御手を探して返す
-            if has_opponent_winning_move:
-                opponent_name = "水色" if opponent == 1 else "ピンク"
-                current_name = "水色" if current_player == 1 else "ピンク"
-                print(f"\n{'='*60}")
-                print(f"[緊急王手] {opponent_name}が{current_name}に王手！")
-                print(f"[危険度] 相手の勝利手: {len(opponent_winning_moves)}通り")
-                print(f"[即応] 防御手を優先的に選択します")
-                print(f"{'='*60}\n")
+            if blocking_move:
+                logger.info("[防御選択] %s", blocking_move)
+                
+                # 統計情報を簡易的に設定
+                self.stats.simulations_run = 0
+                self.stats.time_elapsed = time.monotonic() - start_time
+                self.stats.nodes_explored = 1
+                self.stats.best_move_visits = 1
+                self.stats.best_move_win_rate = 1.0
                 
-                # 防御手を探す（verboseはFalse、すでに上で出力済み）
+                if self.verbose:
+                    print("=" * 60)
+                    print("防御手を即座に選択（探索スキップ）")
+                    print("=" * 60 + "\n")
+                
+                return blocking_move
+            else:
+                logger.info("[詰み確定] 防御不可能、相手の勝利手を最も減らす手を選択します")
+                
+                # 詰みの場合：各手を試して、相手の勝利手が最も少なくなる手を選ぶ
                 legal_moves = game_state.get_legal_moves()
-                blocking_move = self._find_blocking_move(game_state, legal_moves, verbose=False)
+                best_move = None
+                min_opponent_winning_moves = float('inf')
+                test_game = game_state.clone()
                 
-                if blocking_move:
-                    print(f"[防御選択] {blocking_move}")
-                    print(f"{'='*60}\n")
+                for my_move in legal_moves:
+                    test_game.apply_move(my_move, validate=False)
                     
-                    # 統計情報を簡易的に設定
-                    self.stats.simulations_run = 0
-                    self.stats.time_elapsed = time.time() - start_time
-                    self.stats.nodes_explored = 1
-                    self.stats.best_move_visits = 1
-                    self.stats.best_move_win_rate = 1.0
-                    
-                    if self.verbose:
-                        print("=" * 60)
-                        print("防御手を即座に選択（探索スキップ）")
-                        print("=" * 60 + "\n")
+                    # この手を打った後、相手の勝利手の数を数える
+                    opponent_moves_after = test_game.get_legal_moves()
+                    opponent_winning_count = 0
                     
-                    return blocking_move
-                else:
-                    print(f"[詰み確定] 防御不可能")
-                    print(f"[戦術] 相手の勝利手を最も減らす手を選択します")
-                    print(f"{'='*60}\n")
+                    for opp_move in opponent_moves_after:
+                        test_game.apply_move(opp_move, validate=False)
+                        if test_game.winner == opponent:
+                            opponent_winning_count += 1
+                        test_game.undo_last_move()
                     
-                    # 詰みの場合：各手を試して、相手の勝利手が最も少なくなる手を選ぶ
-                    legal_moves = game_state.get_legal_moves()
-                    best_move = None
-                    min_opponent_winning_moves = float('inf')
+                    test_game.undo_last_move()
                     
-                    for my_move in legal_moves:
-                        test_game = game_state.clone()
-                        test_game.apply_move(my_move)
-                        
-                        # この手を打った後、相手の勝利手の数を数える
-                        opponent_moves_after = test_game.get_legal_moves()
-                        opponent_winning_count = 0
-                        
-                        for opp_move in opponent_moves_after:
-                            test_game2 = test_game.clone()
-                            test_game2.apply_move(opp_move)
-                            
-                            if test_game2.winner == opponent:
-                                opponent_winning_count += 1
-                        
-                        # 相手の勝利手が最も少ない手を記録
-                        if opponent_winning_count < min_opponent_winning_moves:
-                            min_opponent_winning_moves = opponent_winning_count
-                            best_move = my_move
+                    # 相手の勝利手が最も少ない手を記録
+                    if opponent_winning_count < min_opponent_winning_moves:
+                        min_opponent_winning_moves = opponent_winning_count
+                        best_move = my_move
+                
+                if best_move:
+                    logger.info(
+                        "[詰み対応] 相手の勝利手を %d通り → %d通りに削減、選択手: %s",
+                        len(opponent_winning_moves), min_opponent_winning_moves, best_move,
+                    )
                     
-                    if best_move:
-                        print(f"[詰み対応] 相手の勝利手を {len(opponent_winning_moves)}通り → {min_opponent_winning_moves}通りに削減")
-                        print(f"[選択手] {best_move}")
-                        print(f"{'='*60}\n")
-                        
-                        # 統計情報を簡易的に設定
-                        self.stats.simulations_run = 0
-                        self.stats.time_elapsed = time.time() - start_time
-                        self.stats.nodes_explored = 1
-                        self.stats.best_move_visits = 1
-                        self.stats.best_move_win_rate = 0.0  # 詰みなので0%
-                        
-                        return best_move
+                    # 統計情報を簡易的に設定
+                    self.stats.simulations_run = 0
+                    self.stats.time_elapsed = time.monotonic() - start_time
+                    self.stats.nodes_explored = 1
+                    self.stats.best_move_visits = 1
+                    self.stats.best_move_win_rate = 0.0  # 詰みなので0%
                     
-                    # 手が見つからない場合は通常のMCTS探索を続行
-                    print(f"[フォールバック] 通常探索を実行します")
-                    print(f"{'='*60}\n")
-        
-        # シミュレーション回数をカウント
-        simulation_count = 0
+                    return best_move
+                
+                # 手が見つからない場合は通常のMCTS探索を続行
+                logger.info("[フォールバック] 通常探索を実行します")
         
-        # 時間制限またはシミュレーション回数制限まで実行
-        while True:
-            # 時間制限チェック
-            if time.time() - start_time > self.time_limit:
-                break
-            
-            # シミュレーション回数制限チェック
-            if self.max_simulations and simulation_count >= self.max_simulations:
-                break
-            
-            # 1回のシミュレーション
-            self._simulate_once(root)
-            simulation_count += 1
+        return None
+    
+    def _select_best_child(self, root: MCTSNode, current_player: int) -> Optional[MCTSNode]:
+        """
+        最終的に指す子ノードを選択
         
-        # 統計情報を更新
-        self.stats.simulations_run = simulation_count
-        self.stats.time_elapsed = time.time() - start_time
-        self.stats.nodes_explored = self._count_nodes(root)
+        Args:
+            root: 探索木のルートノード
+            current_player: 手番のプレイヤー
         
+        Returns:
+            最良の子ノード（子がない場合はNone）
+        """
         # 最も訪問回数が多い子ノードを選択（同率の場合は方向性を考慮）
         if not root.children:
             return None
@@ -396,8 +861,6 @@ class MCTS:
         
         # 同程度の候補がある場合、方向性を考慮
         if len(similar_win_rate_candidates) > 1:
-            current_player = game_state.current_player
-            
             def get_direction_score(move: Move) -> int:
                 """
                 手の方向性スコアを計算
@@ -431,18 +894,13 @@ class MCTS:
             
             # 方向性スコアでソート（高い順）、同じならvisitsで決定
             similar_win_rate_candidates.sort(
-                key=lambda child: (get_direction_score(child.move), child.visits),
+                key=lambda child: (get_direction_score(root.move_to(child)), child.visits),
                 reverse=True
             )
         
         best_child = similar_win_rate_candidates[0] if similar_win_rate_candidates else candidates[0]
-        self.stats.best_move_visits = best_child.visits
-        self.stats.best_move_win_rate = best_child.wins / best_child.visits if best_child.visits > 0 else 0.0
         
-        if self.verbose:
-            self._print_stats(root)
-        
-        return best_child.move
+        return best_child
     
     def _simulate_once(self, root: MCTSNode):
         """1回のシミュレーションを実行"""
@@ -456,41 +914,79 @@ class MCTS:
             print(f"{'#'*60}")
         
         # 1. Selection: UCB1で葉ノードまで選択
+        # 置換表で親が複数になりうるので、たどった経路を記録しておく
+        # is_terminal() / is_fully_expanded() / select_child() と同じ処理をループ内に展開し、
+        # 木の深さごとのメソッド呼び出しを省く（各メソッドは外部からの利用向けに残してある）
+        widening = self.widening
+        exploration_weight = self.exploration_weight
+        sqrt_log_table = _SQRT_LOG_TABLE
+        inv_sqrt_table = _INV_SQRT_TABLE
+        table_size = _UCB_TABLE_SIZE
         node = root
+        path = [root]
         selection_depth = 0
-        while not node.is_terminal() and node.is_fully_expanded() and node.children:
-            node = node.select_child()
+        while node.game_state.winner is None and node.children:
+            # 子がある時点で未試行の手は生成済み
+            if widening is None:
+                if node._untried_moves:
+                    break
+            elif not node.is_fully_expanded(widening):
+                break
+            
+            # UCB1が最大の子を選択（未訪問の子があればそれを優先）
+            # 探索項は exploration_weight * sqrt(log(N)) を親で1回だけ求め、
+            # 子ごとには 1/sqrt(n) を表引きして掛けるだけにする
+            parent_visits = node.visits
+            if parent_visits < table_size:
+                exploration = exploration_weight * sqrt_log_table[parent_visits]
+            else:
+                exploration = exploration_weight * sqrt(log(parent_visits))
+            best_child = None
+            best_score = float('-inf')
+            for child in node.children:
+                visits = child.visits
+                if visits == 0:
+                    best_child = child
+                    break
+                if visits < table_size:
+                    score = child.wins / visits + exploration * inv_sqrt_table[visits]
+                else:
+                    score = child.wins / visits + exploration / sqrt(visits)
+                if score > best_score:
+                    best_score = score
+                    best_child = child
+            
+            node = best_child
+            path.append(node)
             selection_depth += 1
         
         if should_debug:
             print(f"\n[Selection] 深さ {selection_depth} のノードまで選択")
         
         # 2. Expansion: 未展開のノードがあれば展開
-        if not node.is_terminal() and not node.is_fully_expanded():
-            node = node.expand()
+        if not node.is_terminal() and not node.is_fully_expanded(widening):
+            node = node.expand(self.tt)
+            path.append(node)
             if should_debug:
                 print(f"[Expansion] 新しいノードを展開: {node.move}")
         
-        # 3. Simulation: ランダムプレイアウト
-        result = self._simulate_random_playout(node.game_state.clone(), debug=should_debug)
+        # 3. Simulation: ランダムプレイアウト（ノードの盤面上で実行し、終了後に元に戻す）
+        result = self._simulate_random_playout(node.game_state, debug=should_debug)
+        if self.playouts_per_leaf > 1:
+            # 同じ葉から追加でプレイアウトし、選択・展開のコストを複数回分で分け合う
+            results = [result]
+            for _ in range(self.playouts_per_leaf - 1):
+                results.append(self._simulate_random_playout(node.game_state))
         
         # 4. Backpropagation: 結果を伝播
-        # resultは勝者視点（1=勝利, -1=敗北, 0=引き分け）
-        # ノード視点の結果に変換
-        if result == node.player:
-            node_result = 1.0  # 勝利
-        elif result == 0:
-            node_result = 0.5  # 引き分け
-        else:
-            node_result = 0.0  # 敗北
-        
+        # resultは勝者（1=水色, -1=ピンク, 0=引き分け）。各ノードが自分の player 視点に変換する
         if should_debug:
-            result_str = "勝利" if node_result == 1.0 else "引き分け" if node_result == 0.5 else "敗北"
+            result_str = "勝利" if result == node.player else "引き分け" if result == 0 else "敗北"
             winner_name = "水色🔵" if result == 1 else "ピンク🔴" if result == -1 else "引き分け"
-            print(f"\n[Backpropagation] プレイアウト結果: {winner_name} (ノード視点: {result_str})")
+            print(f"\n[Backpropagation] プレイアウト結果: {winner_name} (ノードに至る手を打った側: {result_str})")
             print(f"{'#'*60}\n")
         
-        node.backpropagate(node_result)
+        node.backpropagate(result if self.playouts_per_leaf == 1 else results, path)
         self._simulation_count += 1
     
     def _find_winning_move(self, game_state: WataruToGame, legal_moves: List[Move], max_check: int = 30) -> Optional[Move]:
@@ -512,17 +1008,24 @@ class MCTS:
         
         for i in range(check_count):
             move = legal_moves[i]
-            # 手を試す
-            test_game = game_state.clone()
-            test_game.apply_move(move)
+            # 手を試す（clone()せずに盤面上で打って、判定後に取り消す）
+            game_state.apply_move(move, validate=False)
+            is_winning = game_state.winner == current_player
+            game_state.undo_last_move()
             
             # 勝利判定
-            if test_game.winner == current_player:
+            if is_winning:
                 return move
         
         return None
     
-    def _find_blocking_move(self, game_state: WataruToGame, legal_moves: List[Move], verbose: bool = False) -> Optional[Move]:
+    def _find_blocking_move(
+        self,
+        game_state: WataruToGame,
+        legal_moves: List[Move],
+        verbose: bool = False,
+        opponent_winning_moves: Optional[List[Move]] = None
+    ) -> Optional[Move]:
         """
         相手の勝利手を防ぐ手を探す（効率的版）
         
@@ -535,6 +1038,8 @@ class MCTS:
             game_state: 現在のゲーム状態
             legal_moves: 合法手のリスト
             verbose: デバッグ情報を出力するか（デフォルト: False）
+            opponent_winning_moves: 呼び出し側で調べ済みの相手の勝利手
+                指定すると手順1を省略する
         
         Returns:
             防御手があればその手、なければNone
@@ -542,24 +1047,21 @@ class MCTS:
         current_player = game_state.current_player
         opponent = -current_player
         
-        # まず、現在の状態で相手に勝利手があるかチェック
-        test_game = game_state.clone()
-        test_game.current_player = opponent
-        
-        opponent_moves = test_game.get_legal_moves()
-        has_opponent_winning_move = False
-        winning_moves_list = []
-        
-        for opp_move in opponent_moves:
-            test_game2 = test_game.clone()
-            test_game2.apply_move(opp_move)
+        # まず、現在の状態で相手に勝利手があるかチェック（調べ済みなら再計算しない）
+        if opponent_winning_moves is None:
+            test_game = game_state.clone()
+            test_game.current_player = opponent
             
-            if test_game2.winner == opponent:
-                has_opponent_winning_move = True
-                winning_moves_list.append(opp_move)
+            opponent_winning_moves = []
+            for opp_move in test_game.get_legal_moves():
+                test_game.apply_move(opp_move, validate=False)
+                if test_game.winner == opponent:
+                    opponent_winning_moves.append(opp_move)
+                test_game.undo_last_move()
+        winning_moves_list = opponent_winning_moves
         
         # 相手に勝利手がない場合は防御不要
-        if not has_opponent_winning_move:
+        if not winning_moves_list:
             return None
         
         # 王手を検知！コンソールに表示（verboseモードの場合のみ）
@@ -574,22 +1076,36 @@ class MCTS:
         
         # 相手に勝利手がある場合、それを防ぐ手を探す
         # 各自分の手を試して、その後相手が勝てなくなるかチェック
+        # （1つのコピー上で手を打っては取り消し、候補ごとのclone()を避ける）
+        test_game = game_state.clone()
         for my_move in legal_moves:
-            test_game = game_state.clone()
-            test_game.apply_move(my_move)
+            test_game.apply_move(my_move, validate=False)
+            
+            # 自分が勝つ手なら相手の手番は来ない
+            if test_game.winner == current_player:
+                if verbose:
+                    print(f"[防御成功] 勝利手で応じます: {my_move}")
+                    print(f"{'='*60}\n")
+                return my_move
+            
+            # まず既知の勝利手がまだ通るかだけを調べる（ほとんどの手はここで除外できる）
+            if self._any_move_wins(test_game, winning_moves_list, opponent):
+                test_game.undo_last_move()
+                continue
             
-            # この手を打った後、相手に勝利手があるかチェック
+            # この手を打った後、相手に（新たな）勝利手があるかチェック
             opponent_moves_after = test_game.get_legal_moves()
             opponent_can_still_win = False
             
             for opp_move in opponent_moves_after:
-                test_game2 = test_game.clone()
-                test_game2.apply_move(opp_move)
-                
-                if test_game2.winner == opponent:
-                    opponent_can_still_win = True
+                test_game.apply_move(opp_move, validate=False)
+                opponent_can_still_win = test_game.winner == opponent
+                test_game.undo_last_move()
+                if opponent_can_still_win:
                     break
             
+            test_game.undo_last_move()
+            
             # この手で相手の勝利を防げる
             if not opponent_can_still_win:
                 if verbose:
@@ -604,6 +1120,28 @@ class MCTS:
             print(f"{'='*60}\n")
         return None
     
+    def _any_move_wins(self, game_state: WataruToGame, moves: List[Move], player: int) -> bool:
+        """
+        指定した手のうち、現在の局面でまだ打てて、かつ即座に勝てる手があるか
+        
+        Args:
+            game_state: 調べる局面（player の手番）
+            moves: 調べる手（以前の局面で見つけた勝利手など）
+            player: 手を打つプレイヤー
+        
+        Returns:
+            勝てる手が1つでもあればTrue
+        """
+        for move in moves:
+            if not game_state.is_valid_move(move)[0]:
+                continue
+            game_state.apply_move(move, validate=False)
+            is_winning = game_state.winner == player
+            game_state.undo_last_move()
+            if is_winning:
+                return True
+        return False
+    
     def _simulate_pure_random_playout(self, game_state: WataruToGame, debug: bool = False) -> int:
         """
         Pure MCTSモード: 完全ランダムプレイアウト
@@ -615,8 +1153,11 @@ class MCTS:
         Returns:
             勝者（1, -1, 0=引き分け）
         """
-        max_moves = 100  # 無限ループ防止
+        max_moves = self.playout_depth  # 打ち切り手数（無限ループ防止も兼ねる）
         move_count = 0
+        # random.choice() は内部で整数の乱数を棄却法で引くため、
+        # [0, 1) の乱数を合法手の数倍して添字にする方が速い
+        rng_random = self._rng.random
         
         if debug:
             print(visualize_board(game_state, f"プレイアウト開始 (Pure Random)"))
@@ -628,14 +1169,14 @@ class MCTS:
                 break
             
             # 完全ランダムに選択
-            move = random.choice(legal_moves)
+            move = legal_moves[int(rng_random() * len(legal_moves))]
             
             if debug:
                 player_name = "水色🔵" if move.player == 1 else "ピンク🔴"
                 print(f"\n[手 {move_count + 1}] {player_name} が打った手: {move}")
                 print(f"  合法手の数: {len(legal_moves)}")
             
-            game_state.apply_move(move)
+            game_state.apply_move(move, validate=False)
             move_count += 1
             
             if debug and move_count % 5 == 0:  # 5手ごとに盤面表示
@@ -646,7 +1187,7 @@ class MCTS:
         
         # 勝者を返す
         if game_state.winner is None:
-            return 0  # 引き分け（タイムアウト）
+            return 0  # 引き分け（合法手なし・打ち切り）
         
         return game_state.winner
     
@@ -676,9 +1217,10 @@ class MCTS:
         
         for i in range(check_count):
             opp_move = opponent_moves[i]
-            test_game2 = test_game.clone()
-            test_game2.apply_move(opp_move)
-            if test_game2.winner == opponent:
+            test_game.apply_move(opp_move, validate=False)
+            is_winning = test_game.winner == opponent
+            test_game.undo_last_move()
+            if is_winning:
                 return True
         
         return False
@@ -699,8 +1241,11 @@ class MCTS:
         Returns:
             勝者（1, -1, 0=引き分け）
         """
-        max_moves = 100  # 無限ループ防止
+        max_moves = self.playout_depth  # 打ち切り手数（無限ループ防止も兼ねる）
         move_count = 0
+        # random.choice() は内部で整数の乱数を棄却法で引くため、
+        # [0, 1) の乱数を合法手の数倍して添字にする方が速い
+        rng_random = self._rng.random
         
         if debug:
             print(visualize_board(game_state, f"プレイアウト開始 (Tactical)"))
@@ -719,19 +1264,19 @@ class MCTS:
                     print(f"\n[手 {move_count + 1}] {player_name} が勝利手を発見！: {winning_move}")
                     print(f"  合法手の数: {len(legal_moves)}")
                 
-                game_state.apply_move(winning_move)
+                game_state.apply_move(winning_move, validate=False)
                 move_count += 1
                 continue
             
             # 2. ランダムに選択（防御チェックはスキップして高速化）
-            move = random.choice(legal_moves)
+            move = legal_moves[int(rng_random() * len(legal_moves))]
             
             if debug:
                 player_name = "水色🔵" if move.player == 1 else "ピンク🔴"
                 print(f"\n[手 {move_count + 1}] {player_name} が打った手: {move}")
                 print(f"  合法手の数: {len(legal_moves)}")
             
-            game_state.apply_move(move)
+            game_state.apply_move(move, validate=False)
             move_count += 1
             
             if debug and move_count % 5 == 0:  # 5手ごとに盤面表示
@@ -742,7 +1287,7 @@ class MCTS:
         
         # 勝者を返す
         if game_state.winner is None:
-            return 0  # 引き分け（タイムアウト）
+            return 0  # 引き分け（合法手なし・打ち切り）
         
         return game_state.winner
     
@@ -750,24 +1295,43 @@ class MCTS:
         """
         ランダムプレイアウトを実行（モードに応じて切り替え）
         
+        clone()せずに game_state 上で直接手を進め、終了後に
+        undo_last_move() で打った手をすべて取り消して元の状態に戻す
+        playout_depth 手で決着しなかった場合は評価関数で勝敗を見積もる
+        
         Args:
-            game_state: シミュレーション開始状態
+            game_state: シミュレーション開始状態（終了後は元の状態に戻る）
             debug: デバッグ情報を出力するか
         
         Returns:
             勝者（1, -1, 0=引き分け）
         """
-        if self.use_tactical_heuristics:
-            return self._simulate_tactical_playout(game_state, debug=debug)
-        else:
-            return self._simulate_pure_random_playout(game_state, debug=debug)
-    
-    def _count_nodes(self, node: MCTSNode) -> int:
-        """探索木のノード数をカウント"""
-        count = 1
-        for child in node.children:
-            count += self._count_nodes(child)
-        return count
+        start_move_count = len(game_state.move_history)
+        
+        # 途中で例外が起きても、木のノードが持つ盤面を必ず元に戻す
+        try:
+            if self.use_tactical_heuristics:
+                result = self._simulate_tactical_playout(game_state, debug=debug)
+            else:
+                result = self._simulate_pure_random_playout(game_state, debug=debug)
+            
+            # 打ち切った場合は終盤までランダムに打つ代わりに局面を評価する
+            if game_state.winner is None and len(game_state.move_history) - start_move_count >= self.playout_depth:
+                score = game_state.evaluate()
+                if score > self.evaluation_threshold:
+                    result = 1
+                elif score < -self.evaluation_threshold:
+                    result = -1
+                else:
+                    result = 0
+                if debug:
+                    print(f"[打ち切り] 評価値 {score:+.2f} → 勝者: {result}")
+        finally:
+            # プレイアウトで打った手を逆順に取り消す
+            for _ in range(len(game_state.move_history) - start_move_count):
+                game_state.undo_last_move()
+        
+        return result
     
     def _print_stats(self, root: MCTSNode):
         """統計情報を出力"""
@@ -787,10 +1351,33 @@ class MCTS:
         for i, child in enumerate(sorted_children[:5], 1):
             win_rate = child.wins / child.visits if child.visits > 0 else 0
             print(f"  {i}. 訪問: {child.visits:4d}  勝率: {win_rate*100:5.1f}%  "
-                  f"手: {child.move}")
+                  f"手: {root.move_to(child)}")
         print("=" * 60 + "\n")
 
 
+def _search_worker(task: tuple) -> tuple:
+    """
+    search_parallel() のワーカー（プロセスプールからpickleで呼ばれるためトップレベルに置く）
+    
+    Args:
+        task: (シード, 盤面サイズ, ゲーム状態の辞書, MCTSの設定)
+    
+    Returns:
+        ([(Move.pack()した手, 訪問回数, 勝利数), ...], シミュレーション回数, ノード数)
+    """
+    seed, board_size, state, config = task
+    
+    game_state = WataruToGame(board_size=board_size, initial_state=state)
+    engine = MCTS(verbose=False, seed=seed, **config)
+    root = engine._build_tree(game_state, time.monotonic())
+    
+    child_stats = [
+        (move.pack(), child.visits, child.wins)
+        for child, move in zip(root.children, root.child_moves)
+    ]
+    return child_stats, engine.stats.simulations_run, len(engine.tt)
+
+
 # デフォルトのMCTSエンジンを作成
 def create_mcts_engine(
     time_limit: float = 10.0,
@@ -800,7 +1387,9 @@ def create_mcts_engine(
     use_tactical_heuristics: bool = True,
     debug_playout: bool = False,
     debug_playout_count: int = 1,
-    filter_opening: bool = True
+    filter_opening: bool = True,
+    seed: Optional[int] = None,
+    num_workers: int = 1
 ) -> MCTS:
     """
     MCTSエンジンを作成するヘルパー関数
@@ -817,6 +1406,8 @@ def create_mcts_engine(
         debug_playout_count: デバッグ表示するプレイアウトの回数
         filter_opening: 初手フィルタリングを有効にするか
             True: 盤面が空の場合、プレイヤーに有利な方向のみ探索
+        seed: 乱数シード（指定すると探索結果を再現できる）
+        num_workers: 探索に使うプロセス数（2以上でルート並列化）
     
     Returns:
         MCTSエンジンインスタンス
@@ -829,5 +1420,7 @@ def create_mcts_engine(
         use_tactical_heuristics=use_tactical_heuristics,
         debug_playout=debug_playout,
         debug_playout_count=debug_playout_count,
-        filter_opening=filter_opening
+        filter_opening=filter_opening,
+        seed=seed,
+        num_workers=num_workers
     )
\ No newline at end of file
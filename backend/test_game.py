@@ -148,10 +148,139 @@ def test_bridge_detection():
     print()
 
 
+def test_apply_undo_roundtrip():
+    """apply_move → undo_last_move で状態と合法手が完全に戻るかのテスト"""
+    print("\n=== 手の適用・取り消しの往復テスト ===\n")
+    
+    game = WataruToGame(board_size=9)
+    game.apply_move(game.get_legal_moves()[0])
+    
+    state_before = game.get_state()
+    moves_before = list(game.get_legal_moves())
+    
+    # 複数手を進めてから逆順に取り消す
+    applied = 0
+    for _ in range(3):
+        moves = game.get_legal_moves()
+        if not moves or game.winner is not None:
+            break
+        game.apply_move(moves[-1])
+        applied += 1
+    for _ in range(applied):
+        game.undo_last_move()
+    
+    assert game.get_state() == state_before, "状態が元に戻っていません"
+    assert game.get_legal_moves() == moves_before, "合法手が元に戻っていません"
+    print(f"✓ {applied}手進めて取り消し: 状態・合法手ともに一致")
+    print()
+
+
+def test_zobrist_hash():
+    """手順違いで同じ局面になったときにZobristハッシュが一致するかのテスト"""
+    print("\n=== Zobristハッシュのテスト ===\n")
+    
+    def line(player, row, col, vertical):
+        return Move(
+            player=player,
+            path=[
+                Position(row=row + i if vertical else row, col=col if vertical else col + i, layer=0)
+                for i in range(3)
+            ],
+            timestamp=0.0
+        )
+    
+    blue_a, blue_b = line(1, 0, 0, True), line(1, 0, 4, True)
+    pink_a, pink_b = line(-1, 6, 0, False), line(-1, 8, 4, False)
+    
+    game1 = WataruToGame(board_size=9)
+    game2 = WataruToGame(board_size=9)
+    initial_hash = game1.zobrist_hash
+    for move in [blue_a, pink_a, blue_b, pink_b]:
+        assert game1.apply_move(move)
+    for move in [blue_b, pink_b, blue_a, pink_a]:
+        assert game2.apply_move(move)
+    
+    assert game1.zobrist_hash == game2.zobrist_hash, "手順違いの同一局面でハッシュが異なります"
+    assert game1.board.zobrist_hash == game1.board.compute_zobrist_hash(), "差分更新したハッシュが再計算と一致しません"
+    assert game1.clone().zobrist_hash == game1.zobrist_hash, "クローンのハッシュが異なります"
+    print("✓ 手順違いの同一局面・クローンでハッシュが一致")
+    
+    for _ in range(4):
+        game1.undo_last_move()
+    assert game1.zobrist_hash == initial_hash, "取り消し後にハッシュが元に戻っていません"
+    print("✓ すべて取り消すと初期局面のハッシュに戻る")
+    print()
+
+
+def test_move_pack():
+    """Move.pack() / Move.unpack() の往復テスト"""
+    print("\n=== 手のパック・アンパックのテスト ===\n")
+    
+    game = WataruToGame(board_size=18)
+    checked = 0
+    for _ in range(6):
+        moves = game.get_legal_moves()
+        if not moves or game.winner is not None:
+            break
+        packed = set()
+        for move in moves:
+            restored = Move.unpack(move.pack(), timestamp=move.timestamp)
+            assert restored == move, f"復元結果が一致しません: {move}"
+            packed.add(move.pack())
+            checked += 1
+        assert len(packed) == len(moves), "異なる手が同じ整数になりました"
+        game.apply_move(moves[len(moves) // 2])
+    
+    print(f"✓ {checked}手をパックして復元: すべて一致")
+    print()
+
+
+def test_legal_moves_cache_player():
+    """手番を書き換えたときに、別プレイヤーの合法手キャッシュが返らないかのテスト"""
+    print("\n=== 合法手キャッシュと手番のテスト ===\n")
+    
+    game = WataruToGame(board_size=9)
+    game.apply_move(game.get_legal_moves()[0])
+    assert all(m.player == -1 for m in game.get_legal_moves())
+    
+    # 相手の手を調べるためにクローンの手番を入れ替える（MCTSの戦術チェックと同じ使い方）
+    test_game = game.clone()
+    test_game.current_player = 1
+    assert all(m.player == 1 for m in test_game.get_legal_moves()), "別プレイヤーのキャッシュが返されました"
+    print("✓ 手番を入れ替えたクローンでは手番のプレイヤーの合法手が生成される")
+    print()
+
+
+def test_legal_placements():
+    """get_legal_placements() が get_legal_moves() と同じ手を同じ順に返すかのテスト"""
+    print("\n=== 合法手の種類のみの列挙テスト ===\n")
+    
+    game = WataruToGame(board_size=7)
+    for _ in range(8):
+        moves = game.get_legal_moves()
+        expected = [
+            (0 if m.direction == 'vertical' else 1, m.block_size, m.path[0].layer, m.path[0].row, m.path[0].col)
+            for m in moves
+        ]
+        assert game.get_legal_placements() == expected, "合法手が一致しません"
+        if not moves or game.winner is not None:
+            break
+        # 橋渡しの手があればそれを優先して、レイヤー2の手も確認する
+        bridges = [m for m in moves if m.is_bridge_mode]
+        game.apply_move(bridges[0] if bridges else moves[len(moves) // 2])
+    print(f"✓ {len(game.move_history)}手分の局面で一致")
+    print()
+
+
 if __name__ == "__main__":
     test_basic_game()
     test_specific_move()
     test_bridge_detection()
+    test_apply_undo_roundtrip()
+    test_zobrist_hash()
+    test_move_pack()
+    test_legal_moves_cache_player()
+    test_legal_placements()
     
     print("\n✅ すべてのテストが完了しました！")
 
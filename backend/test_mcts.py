@@ -69,6 +69,7 @@ def play_game_mcts_vs_random(board_size=9, time_limit=5.0, verbose=False, show_b
             if verbose:
                 print(f"  手の適用に失敗！")
             break
+        mcts.notify_move(move)  # 探索木を次の手番に引き継ぐ
         move_count += 1
         
         # 手を打った後の盤面を表示
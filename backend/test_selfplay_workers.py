@@ -0,0 +1,88 @@
+"""
+自己対戦ワーカーのスモークテストスクリプト
+
+小さなネットワークと盤面で、numWorkers=2 の自己対戦（spawnのプロセスプール）を
+1イテレーション分だけ実行し、学習例が正しく返ってくるか確認します。
+PyTorchとalpha-zero-generalが必要です。
+"""
+
+import sys
+import os
+import pickle
+import time
+from pathlib import Path
+
+# パス設定
+backend_path = Path(__file__).parent
+sys.path.insert(0, str(backend_path))
+sys.path.append(os.path.join(backend_path, 'alpha-zero-general'))
+
+import numpy as np
+
+from alpha_zero.DepthLimitedCoach import DepthLimitedCoach
+from alpha_zero.WataruToGame import WataruToGame
+from alpha_zero.pytorch.NNet import NNetWrapper
+from utils import dotdict
+
+
+def test_selfplay_workers(board_size=5, num_workers=2, num_eps=4):
+    """
+    ワーカープロセスで自己対戦を実行
+    
+    Args:
+        board_size: 盤面サイズ
+        num_workers: ワーカープロセス数
+        num_eps: 対戦数
+    
+    Returns:
+        成功した場合True
+    """
+    print("=" * 60)
+    print(f"自己対戦ワーカーのテスト（{num_workers}ワーカー, {num_eps}対戦）")
+    print("=" * 60)
+    
+    args = dotdict({
+        'numEps': num_eps,
+        'numMCTSSims': 8,
+        'mcts_batch_size': 4,
+        'tempThreshold': 5,
+        'cpuct': 1.0,
+        'max_depth': 20,
+        'numWorkers': num_workers,
+        'cuda': False,
+        'num_channels': 8,
+        'num_res_blocks': 1,
+        'dropout': 0.3,
+        'checkpoint': './models/',
+    })
+    
+    game = WataruToGame(board_size=board_size)
+    nnet = NNetWrapper(game, args)
+    coach = DepthLimitedCoach(game, nnet, args)
+    
+    # 親プロセスの局面キャッシュはワーカーに送られない
+    coach.executeEpisode()
+    print(f"\n親プロセスの局面キャッシュ: {len(game._leaf_cache)}件")
+    print(f"ワーカーに送るゲームの大きさ: {len(pickle.dumps(game))}バイト")
+    
+    start = time.time()
+    episodes = coach._self_play(num_workers)
+    elapsed = time.time() - start
+    
+    action_size = game.getActionSize()
+    ok = len(episodes) == num_eps
+    for X, Pi, V in episodes:
+        ok &= X.shape[1:] == (6, board_size, board_size)
+        ok &= Pi.shape == (len(V), action_size)
+        ok &= bool(np.allclose(Pi.sum(axis=1), 1.0, atol=1e-4))
+    
+    print(f"\n対戦数: {len(episodes)}")
+    print(f"学習例の数: {sum(len(V) for _, _, V in episodes)}")
+    print(f"時間: {elapsed:.1f}秒")
+    print(f"結果: {'✅ OK' if ok else '❌ NG'}")
+    return ok
+
+
+if __name__ == "__main__":
+    success = test_selfplay_workers()
+    sys.exit(0 if success else 1)